@@ -0,0 +1,6 @@
+"""
+:synopsis:
+    Benchmarks for the asset engine. Run each module from the repository root,
+    e.g. ``python -m benchmarks.bench_get_paths``.
+
+"""
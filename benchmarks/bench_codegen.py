@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:synopsis:
+    Benchmark: generated formula resolvers
+
+:description:
+    Times CompiledFormula.resolve per call with the interpreted resolver and with
+    the generated one (PIPE_CODEGEN / path_lib.set_codegen), over the same rows,
+    and checks both produce identical paths.
+
+    python -m benchmarks.bench_codegen --rows 200000
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import time
+import argparse
+import path_lib
+from pipe_utils import IO
+from benchmarks.synthetic import make_rows
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def _time(compiled, rows, codegen):
+    previous = path_lib.CODEGEN
+    path_lib.set_codegen(codegen)
+    try:
+        resolve = compiled.resolve
+        paths = []
+        append = paths.append
+        start = time.perf_counter()
+        for row in rows:
+            append(resolve(row))
+        return time.perf_counter() - start, paths
+    finally:
+        path_lib.set_codegen(previous)
+
+
+def run(formulas=('pr_base_dir', 'as_base_dir', 'as_thumb_file'), rows=200000, drive='/pipeline'):
+    """
+    Run the benchmark and return a result dict
+    :param formulas: formulas to resolve
+    :param rows: number of rows resolved per formula and mode
+    :param drive: pipeline base drive
+    :return: dict
+    """
+    context_rows = make_rows(rows)
+    for row in context_rows:
+        row['drive'] = drive
+
+    results = {}
+    for formula in formulas:
+        compiled = path_lib.get_registry().get_compiled(formula)
+        compiled.generated()
+        interpreted, expected = _time(compiled, context_rows, False)
+        generated, paths = _time(compiled, context_rows, True)
+        if paths != expected:
+            raise AssertionError("Generated resolver for '%s' does not match" % formula)
+        results[formula] = {
+            'slots': len(compiled.slots),
+            'interpreted_ns_per_call': interpreted / rows * 1e9,
+            'generated_ns_per_call': generated / rows * 1e9,
+            'speedup': interpreted / generated,
+        }
+    return {'rows': rows, 'formulas': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1].strip())
+    parser.add_argument('--formula', action='append', dest='formulas')
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    result = run(tuple(args.formulas or ('pr_base_dir', 'as_base_dir', 'as_thumb_file')), args.rows)
+    IO.info("Generated resolvers: %d rows per formula", result['rows'])
+    for formula, timing in result['formulas'].items():
+        IO.block("%-16s %2d slots  interpreted %6.0f ns  generated %6.0f ns  x%.2f",
+                 formula, timing['slots'], timing['interpreted_ns_per_call'],
+                 timing['generated_ns_per_call'], timing['speedup'])
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:synopsis:
+    Benchmark: cold start with and without the on-disk formula cache
+
+:description:
+    Starts fresh Python processes that load a formula registry and resolve one
+    formula, once parsing the cfgs and once loading the compiled cache file.
+    --formulas adds a synthetic formula file to measure larger formula sets.
+
+    python -m benchmarks.bench_cold_start --formulas 5000
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import subprocess
+import statistics
+import path_lib
+from pipe_utils import IO
+from benchmarks.synthetic import write_chain_formulas
+
+SNIPPET = """
+import time
+import path_lib
+start = time.perf_counter()
+registry = path_lib.FormulaRegistry(%r, cache_file=%r)
+registry.get_compiled(%r)
+print(time.perf_counter() - start)
+"""
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def time_start(formula_dir, cache_file, formula):
+    """Return the seconds a fresh process takes to load the registry and resolve a formula"""
+    root = os.path.dirname(os.path.abspath(path_lib.__file__))
+    output = subprocess.check_output([sys.executable, '-c', SNIPPET % (formula_dir, cache_file, formula)],
+                                     cwd=root)
+    return float(output)
+
+
+def run(formulas=0, repeat=5, formula='as_thumb_file'):
+    """
+    Run the benchmark and return a result dict
+    :param formulas: synthetic formulas added to the stock formula set
+    :param repeat: process starts per mode
+    :param formula: formula resolved once the registry is loaded
+    :return: dict
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        formula_dir = os.path.join(temp_dir, 'formulas')
+        shutil.copytree(path_lib.FORMULA_DIR, formula_dir)
+        if formulas:
+            write_chain_formulas(formula_dir, formulas)
+        cache_file = formula_dir + path_lib.CACHE_EXT
+
+        parse = [time_start(formula_dir, False, formula) for _ in range(repeat)]
+        time_start(formula_dir, cache_file, formula)
+        cached = [time_start(formula_dir, cache_file, formula) for _ in range(repeat)]
+    finally:
+        shutil.rmtree(temp_dir)
+
+    parse_sec = statistics.median(parse)
+    cached_sec = statistics.median(cached)
+    return {
+        'formulas': len(path_lib.get_registry().compiled_formulas()) + formulas,
+        'parse_sec': parse_sec,
+        'cached_sec': cached_sec,
+        'saved_sec': parse_sec - cached_sec,
+        'speedup': parse_sec / cached_sec if cached_sec else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold start with and without the formula cache")
+    parser.add_argument('--formulas', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    result = run(args.formulas, args.repeat)
+    IO.info("Cold start: %d formulas", result['formulas'])
+    IO.block("parse cfgs  : %.4fs", result['parse_sec'])
+    IO.block("load cache  : %.4fs", result['cached_sec'])
+    IO.block("saved       : %.4fs (%.1fx)", result['saved_sec'], result['speedup'])
+    return result
+
+
+if __name__ == '__main__':
+    main()
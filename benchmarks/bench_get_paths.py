@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:synopsis:
+    Benchmark: batch path resolution
+
+:description:
+    Times PipeContext.get_paths over a large number of context rows (1M by default)
+    against a sample of per-row PipeContext.get_path calls.
+
+    python -m benchmarks.bench_get_paths --rows 1000000
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import io
+import time
+import argparse
+import contextlib
+from pipe_utils import IO
+from pipe_context import PipeContext as PC
+from benchmarks.synthetic import make_rows, make_columns
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def run(formula='as_thumb_file', rows=1000000, sample=10000, drive='/pipeline'):
+    """
+    Run the benchmark and return a result dict
+    :param formula: formula to resolve
+    :param rows: number of rows resolved through get_paths
+    :param sample: number of rows resolved through single get_path calls
+    :param drive: pipeline base drive
+    :return: dict
+    """
+    context_rows = make_rows(rows)
+    columns = make_columns(context_rows)
+
+    start = time.perf_counter()
+    for _ in PC.get_paths(formula, context_rows, drive=drive):
+        pass
+    batch_rows = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in PC.get_paths(formula, columns, drive=drive):
+        pass
+    batch_columns = time.perf_counter() - start
+
+    sample_rows = context_rows[:sample]
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for row in sample_rows:
+            PC.get_path(formula, drive=drive, **row)
+        single = time.perf_counter() - start
+
+    return {
+        'formula': formula,
+        'rows': rows,
+        'batch_rows_sec': batch_rows,
+        'batch_columns_sec': batch_columns,
+        'batch_rows_per_sec': rows / batch_rows,
+        'batch_columns_per_sec': rows / batch_columns,
+        'single_per_sec': len(sample_rows) / single,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1].strip())
+    parser.add_argument('--formula', default='as_thumb_file')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--sample', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    result = run(args.formula, args.rows, args.sample)
+    IO.info("Batch path resolution: %s x %d", result['formula'], result['rows'])
+    IO.block("get_paths (rows)    : %.2fs  %12.0f paths/s", result['batch_rows_sec'],
+             result['batch_rows_per_sec'])
+    IO.block("get_paths (columns) : %.2fs  %12.0f paths/s", result['batch_columns_sec'],
+             result['batch_columns_per_sec'])
+    IO.block("get_path  (single)  :         %12.0f paths/s", result['single_per_sec'])
+    return result
+
+
+if __name__ == '__main__':
+    main()
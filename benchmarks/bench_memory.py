@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:synopsis:
+    Benchmark: memory per cached path
+
+:description:
+    Measures with tracemalloc the bytes held per resolved path in a ResolutionCache,
+    against the previous layout of the cache (item-pair keys, (path, expires)
+    entries, no interning), the bytes per path of a PathSet against a list of
+    path strings, plus the bytes per live PipeContext and per CompiledFormula.
+
+    python -m benchmarks.bench_memory --rows 200000
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import gc
+import argparse
+import tracemalloc
+from collections import OrderedDict
+import path_lib
+import path_cache
+import path_set
+from pipe_utils import IO
+from pipe_context import PipeContext as PC
+from benchmarks.synthetic import make_rows
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def _measure(build):
+    """Return (object, bytes allocated and still held by build())"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        gc.collect()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def _fresh_rows(count, drive):
+    """Context rows whose strings are all separate objects, as if read from a file"""
+    rows = make_rows(count)
+    for row in rows:
+        row['drive'] = ''.join(drive)
+    return rows
+
+
+def _legacy_cache(formula, compiled, rows):
+    entries = OrderedDict()
+    for row in rows:
+        values = {var: row[var] for var in compiled.variables}
+        entries[(formula, tuple(values.items()))] = (compiled.resolve(values), None)
+    return entries
+
+
+def _cache(formula, compiled, rows):
+    cache = path_cache.ResolutionCache(maxsize=len(rows))
+    for row in rows:
+        values = {var: row[var] for var in compiled.variables}
+        cache.put(path_cache.make_key(formula, values), compiled.resolve(values))
+    return cache
+
+
+def run(formula='as_thumb_file', rows=200000, drive='/pipeline'):
+    """
+    Run the benchmark and return a result dict
+    :param formula: formula resolved into the caches
+    :param rows: number of cached paths
+    :param drive: pipeline base drive
+    :return: dict
+    """
+    compiled = path_lib.get_registry().get_compiled(formula)
+
+    legacy, legacy_bytes = _measure(lambda: _legacy_cache(formula, compiled, _fresh_rows(rows, drive)))
+    del legacy
+    cache, cache_bytes = _measure(lambda: _cache(formula, compiled, _fresh_rows(rows, drive)))
+    del cache
+
+    paths, list_bytes = _measure(lambda: list(compiled.resolve_rows(_fresh_rows(rows, drive))))
+    del paths
+    paths, set_bytes = _measure(
+        lambda: path_set.PathSet(compiled.resolve_rows(_fresh_rows(rows, drive))).compact())
+    del paths
+
+    contexts, context_bytes = _measure(lambda: [PC(**row) for row in make_rows(10000)])
+    del contexts
+    formulas, formula_bytes = _measure(
+        lambda: path_lib.compile_formulas(path_lib.get_registry().formulas()))
+
+    return {
+        'formula': formula,
+        'rows': rows,
+        'legacy_bytes_per_path': legacy_bytes / rows,
+        'bytes_per_path': cache_bytes / rows,
+        'reduction': 1 - cache_bytes / legacy_bytes,
+        'list_bytes_per_path': list_bytes / rows,
+        'path_set_bytes_per_path': set_bytes / rows,
+        'bytes_per_context': context_bytes / 10000,
+        'bytes_per_compiled_formula': formula_bytes / len(formulas),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1].strip())
+    parser.add_argument('--formula', default='as_thumb_file')
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    result = run(args.formula, args.rows)
+    IO.info("Memory per cached path: %s x %d", result['formula'], result['rows'])
+    IO.block("cache (previous layout) : %8.0f bytes/path", result['legacy_bytes_per_path'])
+    IO.block("cache                   : %8.0f bytes/path  (-%.0f%%)",
+             result['bytes_per_path'], result['reduction'] * 100)
+    IO.block("list of paths           : %8.0f bytes/path", result['list_bytes_per_path'])
+    IO.block("PathSet                 : %8.0f bytes/path", result['path_set_bytes_per_path'])
+    IO.block("PipeContext             : %8.0f bytes", result['bytes_per_context'])
+    IO.block("CompiledFormula         : %8.0f bytes", result['bytes_per_compiled_formula'])
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:synopsis:
+    Benchmark: concurrent path resolution
+
+:description:
+    Times PipeContext.get_path on one thread, then on a thread pool sharing the
+    registry and resolution cache while another thread force-reloads the
+    formulas, and reports the threaded rate as a ratio of the single-thread one.
+    Reads take no lock, so the ratio should stay well above 0.5.
+
+    python -m benchmarks.bench_threads --threads 32 --rows 2000
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import os
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import path_lib
+from pipe_utils import IO
+from pipe_context import PipeContext as PC
+from benchmarks.synthetic import make_rows
+
+DRIVE = os.path.join(os.path.sep, 'mnt', 'pipeline')
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def _resolve(rows, formula):
+    return [PC.get_path(formula, drive=DRIVE, **row) for row in rows]
+
+
+def run(threads=32, rows=2000, formula='as_base_dir', reload_interval=0.01):
+    """
+    Run the benchmark and return a result dict
+    :param threads: threads resolving the rows concurrently
+    :param rows: rows each thread resolves
+    :param formula: formula to resolve
+    :param reload_interval: seconds between forced registry reloads, None for none
+    :return: dict
+    """
+    context_rows = make_rows(rows)
+    start = time.perf_counter()
+    expected = _resolve(context_rows, formula)
+    single = rows / (time.perf_counter() - start)
+
+    registry = path_lib.get_registry()
+    stop = threading.Event()
+    reloads = [0]
+
+    def reload():
+        while not stop.wait(reload_interval):
+            registry.refresh(force=True)
+            reloads[0] += 1
+
+    reloader = threading.Thread(target=reload)
+    if reload_interval is not None:
+        reloader.start()
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(_resolve, [context_rows] * threads, [formula] * threads))
+        threaded = rows * threads / (time.perf_counter() - start)
+    finally:
+        stop.set()
+        if reloader.is_alive():
+            reloader.join()
+    if any(paths != expected for paths in results):
+        raise AssertionError("Threaded resolution of '%s' does not match" % formula)
+    return {'formula': formula, 'threads': threads, 'rows': rows, 'reloads': reloads[0],
+            'single_per_sec': single, 'threaded_per_sec': threaded, 'ratio': threaded / single}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent path resolution throughput")
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--rows', type=int, default=2000, help="rows resolved per thread")
+    parser.add_argument('--formula', default='as_base_dir')
+    args = parser.parse_args(argv)
+
+    result = run(args.threads, args.rows, args.formula)
+    IO.info("Concurrent get_path: %d threads, %d rows each, %d reloads",
+            result['threads'], result['rows'], result['reloads'])
+    IO.block("single thread : %10.0f paths/s", result['single_per_sec'])
+    IO.block("threaded      : %10.0f paths/s", result['threaded_per_sec'])
+    IO.block("ratio         : %10.2f", result['ratio'])
+    return result
+
+
+if __name__ == '__main__':
+    main()
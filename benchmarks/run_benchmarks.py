@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:synopsis:
+    Benchmark suite over synthetic pipeline trees
+
+:description:
+    Times single and batch path resolution, formula loading (with extra synthetic
+    formula chains), reverse examine_path lookups and directory materialization
+    at a configurable scale, and writes the results as JSON so runs can be
+    compared across commits.
+
+    python -m benchmarks.run_benchmarks --projects 100 --assets 50000 -o HEAD.json
+    python -m benchmarks.run_benchmarks --compare HEAD~1.json
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import io
+import os
+import sys
+import json
+import time
+import itertools
+import shutil
+import platform
+import argparse
+import tempfile
+import contextlib
+import subprocess
+import path_lib
+import path_cache
+from pipe_utils import IO
+from pipe_enums import PIPELINE
+from pipe_context import PipeContext as PC
+from benchmarks import synthetic
+
+DRIVE = os.path.join(os.path.sep, 'mnt', 'pipeline')
+FORMULAS = ['pr_base_dir', 'as_base_dir', 'as_tex_dir', 'as_geo_abc_dir', 'as_thumb_file']
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def timed(func, *args, **kwargs):
+    """Return the seconds func takes to run"""
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def consume(iterable):
+    for _ in iterable:
+        pass
+
+
+def bench_get_path(rows, formula='as_thumb_file'):
+    """Single PipeContext.get_path calls, cold and warm resolution cache"""
+    cache = path_cache.get_resolution_cache()
+    cache.clear()
+
+    def _run(rows):
+        for row in rows:
+            PC.get_path(formula, drive=DRIVE, **row)
+
+    # Warm calls repeat rows that fit in the resolution cache
+    hot_rows = rows[:cache.maxsize]
+    with contextlib.redirect_stdout(io.StringIO()):
+        cold = timed(_run, rows)
+        _run(hot_rows)
+        warm = timed(_run, hot_rows)
+    return {'formula': formula, 'calls': len(rows),
+            'cold_per_sec': len(rows) / cold, 'warm_per_sec': len(hot_rows) / warm,
+            'cache': cache.stats()}
+
+
+def bench_get_paths(projects, assets, sample):
+    """
+    Batch PipeContext.get_paths per formula: rows streamed from the synthetic tree,
+    and a columnar mapping built over a bounded sample of rows
+    :param projects: synthetic projects
+    :param assets: assets per project
+    :param sample: rows held in memory for the columnar form
+    """
+    total = projects * assets
+    columns = synthetic.make_columns(sample)
+    results = {}
+    for formula in FORMULAS:
+        row_sec = timed(consume, PC.get_paths(formula, synthetic.iter_rows(projects, assets), drive=DRIVE))
+        column_sec = timed(consume, PC.get_paths(formula, columns, drive=DRIVE))
+        columns_per_sec = len(sample) / column_sec
+        results[formula] = {'rows': total, 'column_rows': len(sample),
+                            'rows_per_sec': total / row_sec,
+                            'columns_per_sec': columns_per_sec,
+                            # Time the columnar form would take over every row, at the sampled rate
+                            'columns_estimated_sec': total / columns_per_sec}
+    return results
+
+
+def bench_formula_load(formulas, depth, repeat=5):
+    """Parse and compile a synthetic formula set, then resolve its deepest formula"""
+    temp_dir = tempfile.mkdtemp()
+    try:
+        formula_dir = os.path.join(temp_dir, 'formulas')
+        deepest = synthetic.write_formula_dir(formula_dir, formulas, depth) or 'as_thumb_file'
+        registry = path_lib.FormulaRegistry(formula_dir, check_interval=None, cache_file=False)
+        load = min(timed(registry.refresh, force=True) for _ in range(repeat))
+
+        previous = path_lib.set_registry(registry)
+        try:
+            manager = path_lib.FormulaManager()
+            get_formula = min(timed(manager.get_formula, deepest) for _ in range(repeat))
+            row = synthetic.make_rows(1)[0]
+            calls = 10000
+            path_cache.get_resolution_cache().clear()
+            deep = timed(lambda: [PC.get_path(deepest, drive=DRIVE, **row) for _ in range(calls)])
+        finally:
+            path_lib.set_registry(previous or path_lib.FormulaRegistry())
+    finally:
+        shutil.rmtree(temp_dir)
+    return {'formulas': len(registry.compiled_formulas()), 'depth': depth, 'deepest': deepest,
+            'load_sec': load, 'get_formula_sec': get_formula,
+            'deep_get_path_per_sec': calls / deep}
+
+
+def bench_examine_path(rows):
+    """Reverse resolve the paths of every formula, with a known and an inferred drive"""
+    paths = []
+    for formula in FORMULAS:
+        paths.extend(PC.get_paths(formula, rows, drive=DRIVE))
+    pc = PC()
+    known = timed(lambda: [pc.examine_path(path, pipe_base_dir=DRIVE) for path in paths])
+    inferred = timed(lambda: [pc.examine_path(path) for path in paths])
+    return {'paths': len(paths), 'known_drive_per_sec': len(paths) / known,
+            'inferred_drive_per_sec': len(paths) / inferred}
+
+
+def bench_materialize(rows):
+    """Materialize the standard asset layout, then again over the existing tree"""
+    temp_dir = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        report = synthetic.build_tree(temp_dir, rows, PIPELINE.LAYOUT.ASSET)
+        create = time.perf_counter() - start
+        start = time.perf_counter()
+        existing = synthetic.build_tree(temp_dir, rows, PIPELINE.LAYOUT.ASSET)
+        recreate = time.perf_counter() - start
+    finally:
+        shutil.rmtree(temp_dir)
+    return {'assets': len(rows), 'created': len(report.created), 'create_sec': create,
+            'existing': len(existing.existing), 'recreate_sec': recreate}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(path_lib.__file__))
+                                       ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(projects=10, assets=1000, single=20000, formulas=1000, depth=16, materialize=200):
+    """
+    Run every benchmark and return a result dict
+    :param projects: synthetic projects
+    :param assets: assets per project
+    :param single: rows resolved through single get_path calls
+    :param formulas: synthetic formulas added for the formula loading benchmark
+    :param depth: length of the synthetic formula chains
+    :param materialize: assets materialized on disk
+    """
+    # Only the rows the bounded benchmarks use are held in memory, get_paths streams the rest
+    rows = list(itertools.islice(synthetic.iter_rows(projects, assets), max(single, materialize)))
+    params = {'projects': projects, 'assets': assets, 'single': single,
+              'formulas': formulas, 'depth': depth, 'materialize': materialize}
+    return {
+        'meta': {'commit': git_commit(), 'version': PIPELINE.VERSION,
+                 'python': platform.python_version(), 'platform': platform.platform(),
+                 'time': time.time(), 'params': params},
+        'results': {
+            'get_path': bench_get_path(rows[:single]),
+            'get_paths': bench_get_paths(projects, assets, rows[:single]),
+            'formula_load': bench_formula_load(formulas, depth),
+            'examine_path': bench_examine_path(rows[:single]),
+            'materialize': bench_materialize(rows[:materialize]),
+        },
+    }
+
+
+def flatten(results, prefix=''):
+    """Flatten nested results into {'a.b.c': number}"""
+    flat = {}
+    for key, value in results.items():
+        name = prefix + str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline, current):
+    """
+    Print the ratio current / baseline of every timing and throughput, and whether
+    it is an improvement: lower is better for *_sec timings, higher for *_per_sec rates
+    """
+    before = flatten(baseline['results'])
+    after = flatten(current['results'])
+    IO.info("Compared with %s", baseline['meta'].get('commit') or 'baseline')
+    for name in sorted(after):
+        if name not in before or not before[name]:
+            continue
+        ratio = after[name] / before[name]
+        if name.endswith('_per_sec'):
+            direction, improved = 'higher', ratio > 1
+        elif name.endswith('_sec'):
+            direction, improved = 'lower', ratio < 1
+        else:
+            continue
+        label = 'same' if ratio == 1 else 'better' if improved else 'worse'
+        IO.block("%-55s %8.2fx  %-6s (%s is better)", name, ratio, label, direction)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Asset engine benchmark suite")
+    parser.add_argument('--projects', type=int, default=10)
+    parser.add_argument('--assets', type=int, default=1000, help="assets per project")
+    parser.add_argument('--single', type=int, default=20000, help="single get_path calls")
+    parser.add_argument('--formulas', type=int, default=1000, help="synthetic formulas")
+    parser.add_argument('--depth', type=int, default=16, help="synthetic formula chain depth")
+    parser.add_argument('--materialize', type=int, default=200, help="assets created on disk")
+    parser.add_argument('-o', '--output', default='-', help="JSON results file, '-' for stdout")
+    parser.add_argument('--compare', default=None, help="JSON results of a previous run")
+    args = parser.parse_args(argv)
+
+    result = run(args.projects, args.assets, args.single, args.formulas, args.depth,
+                 args.materialize)
+    text = json.dumps(result, indent=2)
+    if args.output == '-':
+        sys.stdout.write(text + '\n')
+    else:
+        with open(args.output, 'w') as fh:
+            fh.write(text + '\n')
+    if args.compare:
+        with open(args.compare) as fh:
+            compare(json.load(fh), result)
+    return result
+
+
+if __name__ == '__main__':
+    main()
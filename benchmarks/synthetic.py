@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:synopsis:
+    Synthetic pipeline trees and formula sets for benchmarks
+
+:description:
+    Generates context rows for N projects x M assets, the matching formula paths,
+    on-disk directory trees, and formula directories with extra chains of
+    configurable depth on top of the stock formulas.
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import os
+import shutil
+import path_lib
+
+ASSET_TYPES = ('architecture', 'characters', 'foliage', 'massive', 'props', 'vehicles')
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def iter_rows(projects=10, assets=1000, asset_types=ASSET_TYPES):
+    """
+    Yield a kwargs dict per asset
+    :param projects: number of projects
+    :param assets: assets per project
+    :param asset_types: asset types assets are spread over
+    :return: generator of {'project', 'asset_type', 'asset'} dicts
+    """
+    for project in range(projects):
+        project_name = 'project_%03d' % project
+        for asset in range(assets):
+            yield {'project': project_name,
+                   'asset_type': asset_types[asset % len(asset_types)],
+                   'asset': 'asset_%06d' % asset}
+
+
+def make_rows(count, projects=100, asset_types=ASSET_TYPES):
+    """Return a list of count kwargs dicts spread over projects and asset types"""
+    return [{'project': 'project_%03d' % (index % projects),
+             'asset_type': asset_types[index % len(asset_types)],
+             'asset': 'asset_%06d' % index} for index in range(count)]
+
+
+def make_columns(rows):
+    """Return the columnar {variable: list} form of a list of rows"""
+    return {key: [row[key] for row in rows] for key in rows[0]} if rows else {}
+
+
+def write_chain_formulas(formula_dir, count, depth=8, parent='as_base_dir'):
+    """
+    Write count synthetic formulas to custom_formulas.cfg, in chains of depth hanging
+    off parent, and return the name of the deepest formula
+    """
+    name = parent
+    with open(os.path.join(formula_dir, 'custom_formulas.cfg'), 'w') as fh:
+        for index in range(count):
+            chain_parent = parent if not index % depth else name
+            name = 'as_custom_%d' % index
+            fh.write("%s = ('{%s}', 'custom_%d')\n" % (name, chain_parent, index))
+    return name
+
+
+def write_formula_dir(formula_dir, formulas=0, depth=8):
+    """
+    Copy the stock formulas into formula_dir and add synthetic chains
+    :return: name of the deepest synthetic formula, or None
+    """
+    shutil.copytree(path_lib.FORMULA_DIR, formula_dir)
+    if formulas:
+        return write_chain_formulas(formula_dir, formulas, min(depth, formulas))
+    return None
+
+
+def build_tree(drive, rows, formulas):
+    """Create the directories of formulas for every row under drive"""
+    from pipe_context import PipeContext as PC
+    return PC.create_paths(formulas, rows, drive=drive)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Memoizes resolved formula paths
+
+:description:
+    ResolutionCache is a bounded LRU of resolved paths keyed on a formula name and
+    the variables it was resolved with. Entries can expire after a TTL, be
+    invalidated per formula, and the process-wide cache is cleared automatically
+    whenever the formula registry reloads.
+
+    Keys are flat tuples whose strings are interned when stored, so the project,
+    asset type and drive values shared by millions of entries are held once, and
+    an entry without a TTL is just its path string.
+
+    Lookups take no lock: a hit only marks its key as recently used, and writers
+    (serialized by a lock) give marked entries a second chance before evicting
+    them, which approximates LRU order. Hit and miss counters are best effort
+    under concurrent use.
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import sys
+import time
+import threading
+import path_lib as fm
+
+MISSING = object()
+
+_resolution_cache = None
+_resolution_cache_lock = threading.Lock()
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def make_key(formula, values):
+    """
+    Return a hashable cache key for a formula and its {variable: value} dict
+    :param formula: formula name
+    :param values: {variable: value}, ordered like the formula's variables
+    :return: (formula, value, ...)
+    """
+    return (formula, *values.values())
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def get_resolution_cache():
+    """Return the process-wide ResolutionCache, cleared on every registry reload"""
+    global _resolution_cache
+    if _resolution_cache is None:
+        with _resolution_cache_lock:
+            if _resolution_cache is None:
+                cache = ResolutionCache()
+                fm.get_registry().add_listener(cache.on_reload)
+                _resolution_cache = cache
+    return _resolution_cache
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class ResolutionCache(object):
+    """
+    Bounded LRU cache of resolved paths
+    :param maxsize: maximum number of entries, 0 disables the cache
+    :param ttl: seconds an entry stays valid, None keeps entries until evicted
+    """
+    def __init__(self, maxsize=4096, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Insertion ordered, oldest first; _used marks entries read since their last pass
+        self._entries = {}
+        self._used = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def configure(self, maxsize=None, ttl=MISSING):
+        """Change the size and/or TTL of the cache, evicting entries as needed"""
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not MISSING:
+                self.ttl = ttl
+            while len(self._entries) > self.maxsize:
+                self._evict()
+
+    def get(self, key):
+        """Return the cached path for a key, or MISSING"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if type(entry) is str:
+                self._used[key] = True
+                self.hits += 1
+                return entry
+            path, expires = entry
+            if expires > time.monotonic():
+                self._used[key] = True
+                self.hits += 1
+                return path
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                    self._used.pop(key, None)
+        self.misses += 1
+        return MISSING
+
+    def put(self, key, path):
+        """Store a resolved path, evicting the least recently used entry when full"""
+        if not self.maxsize:
+            return
+        entry = path
+        if self.ttl is not None:
+            entry = (path, time.monotonic() + self.ttl)
+        if type(key) is tuple:
+            key = tuple(map(_intern, key))
+        with self._lock:
+            # Re-inserting moves the key to the young end
+            self._entries.pop(key, None)
+            self._used.pop(key, None)
+            self._entries[key] = entry
+            if len(self._entries) > self.maxsize:
+                self._evict()
+            if len(self._used) > 2 * self.maxsize:
+                # Drop marks that lock-free readers left on already evicted keys; walk
+                # _entries, which only changes under the lock, as readers write to _used
+                self._used = {key: True for key in self._entries if key in self._used}
+
+    def _evict(self):
+        """Drop the oldest entry not used since it was last passed over; call with the lock held"""
+        entries = self._entries
+        used = self._used
+        while True:
+            key = next(iter(entries))
+            entry = entries.pop(key)
+            if used.pop(key, None) is None:
+                return
+            entries[key] = entry
+
+    def invalidate(self, formula=None):
+        """Drop every entry of a formula, or every entry if formula is None"""
+        with self._lock:
+            if formula is None:
+                self._entries = {}
+                self._used = {}
+                return
+            self._entries = {key: entry for key, entry in self._entries.items()
+                             if key[0] != formula}
+            self._used = {}
+
+    def clear(self):
+        """Drop every entry and reset the hit/miss counters"""
+        with self._lock:
+            self._entries = {}
+            self._used = {}
+            self.hits = 0
+            self.misses = 0
+
+    def on_reload(self, registry):
+        """FormulaRegistry listener: cached paths are stale once formulas reload"""
+        self.invalidate()
+
+    def stats(self):
+        """Return a dict of cache counters"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+        }
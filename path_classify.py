@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Classifies huge filesystem listings with the reverse path index
+
+:description:
+    Streams paths from a `find` listing (one path per line) or a JSONL file
+    (one {"path": ...} object per line), tags each path with its formula and
+    context variables and writes the records, in input order, as JSONL or CSV.
+    Work is sharded in chunks across a multiprocessing pool.
+
+    find /mnt/pipeline -type d | python -m path_classify --jobs 8 -o paths.jsonl
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import os
+import json
+import argparse
+import path_lib as fm
+import path_index
+import pipe_stream
+
+_drive = None
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def init_worker(drive=None):
+    """Build the path index once per worker process"""
+    global _drive
+    _drive = drive
+    path_index.get_path_index()
+
+
+def classify_chunk(lines):
+    """Return a classified record for each input line of a chunk"""
+    index = path_index.get_path_index()
+    records = []
+    for line in lines:
+        line = line.rstrip('\n')
+        path = line
+        if line.lstrip().startswith('{'):
+            try:
+                path = json.loads(line)['path']
+            except (ValueError, KeyError, TypeError) as e:
+                # Keep going, the bad line gets an error record like an unknown path
+                records.append({'path': None, 'formula': None,
+                                'error': 'Unreadable record %r: %s' % (line, e)})
+                continue
+            if not isinstance(path, str):
+                records.append({'path': None, 'formula': None,
+                                'error': "Record 'path' is not a string: %r" % line})
+                continue
+        record = {'path': path, 'formula': None}
+        if path:
+            context = index.examine(path, drive=_drive)
+            if context is not None:
+                record.update(context)
+        records.append(record)
+    return records
+
+
+def classify(lines, drive=None, jobs=1, chunk_size=2000):
+    """
+    Classify an iterable of input lines
+    :param lines: find output lines or JSONL lines
+    :param drive: pipeline base directory, inferred per path when None
+    :param jobs: worker processes
+    :param chunk_size: lines sent to a worker at a time
+    :return: generator of record lists, one per chunk, in input order
+    """
+    chunks = pipe_stream.chunked(lines, chunk_size)
+    return pipe_stream.stream_map(classify_chunk, chunks, jobs, init_worker, (drive,))
+
+
+def record_fields():
+    """Return the CSV columns: path, formula, every formula variable and error"""
+    fields = ['path', 'formula']
+    for compiled in fm.get_registry().compiled_formulas().values():
+        for var in compiled.variables:
+            if var not in fields:
+                fields.append(var)
+    fields.append('error')
+    return fields
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='path_classify',
+                                     description="Tag paths with their formula and context variables")
+    parser.add_argument('input', nargs='?', default='-', help="find listing or JSONL file, '-' for stdin")
+    parser.add_argument('-o', '--output', default='-', help="output file, '-' for stdout")
+    parser.add_argument('-f', '--format', choices=('jsonl', 'csv'), default='jsonl')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    parser.add_argument('--pipe-base-dir', default=None, help="pipeline base directory (drive)")
+    parser.add_argument('--progress', type=float, default=None, metavar='SECONDS',
+                        help="report throughput every SECONDS")
+    args = parser.parse_args(argv)
+
+    meter = pipe_stream.Throughput('lines', args.progress)
+    with pipe_stream.open_input(args.input) as fh_in, pipe_stream.open_output(args.output) as fh_out:
+        writer = pipe_stream.RecordWriter(fh_out, args.format, record_fields())
+        for records in classify(fh_in, args.pipe_base_dir, args.jobs, args.chunk_size):
+            writer.write_many(records)
+            meter.add(len(records))
+    meter.report()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Reverse resolves paths on disk back into a formula and its variables
+
+:description:
+    PathIndex builds a segment trie out of every compiled formula. Each trie level
+    is one path component: a literal ('projects'), a single variable ('{asset}')
+    or a pattern mixing both ('{asset}.jpg'). Examining a path walks the trie one
+    component at a time, so lookups cost time proportional to the path depth and
+    not to the number of formulas. The leading '{drive}' component may span any
+    number of segments and is either given or inferred from the trie.
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import os
+import re
+import threading
+import path_lib as fm
+
+DRIVE = 'drive'
+
+_path_index = None
+_path_index_lock = threading.Lock()
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def split_path(path):
+    """Split a normalized path into its components"""
+    return os.path.normpath(path).split(os.path.sep)
+
+
+def get_path_index():
+    """Return the PathIndex of the process-wide registry, rebuilt after every reload"""
+    global _path_index
+    registry = fm.get_registry()
+    compiled = registry.compiled_formulas()
+    index = _path_index
+    if index is None or index.compiled is not compiled:
+        with _path_index_lock:
+            index = _path_index
+            if index is None or index.compiled is not compiled:
+                index = _path_index = PathIndex(compiled)
+    return index
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class PathNode(object):
+    """One component level of the formula trie"""
+    def __init__(self):
+        self.literals = {}
+        self.variables = {}
+        self.patterns = []
+        self.formula = None
+
+
+class PathIndex(object):
+    """
+    Segment trie over compiled formulas
+    :param compiled: {formula: CompiledFormula}
+    """
+    def __init__(self, compiled):
+        self.compiled = compiled
+        self.root = PathNode()
+        self.drive_root = PathNode()
+        self._patterns = {}
+        for name, formula in compiled.items():
+            self.add(formula)
+
+    def add(self, formula):
+        """Add a CompiledFormula to the trie; the first formula per template wins"""
+        components = os.path.sep.join(formula.pieces).split(os.path.sep)
+        node = self.root
+        if components[0] == '{%s}' % DRIVE:
+            node = self.drive_root
+            components = components[1:]
+        for component in components:
+            if not component or component == '.':
+                continue
+            node = self._child(node, component)
+        if node.formula is None:
+            node.formula = formula.name
+
+    def _child(self, node, component):
+        """Return (creating it if needed) the child node of a formula component"""
+        parts = fm._slot_re.split(component)
+        if len(parts) == 1:
+            return node.literals.setdefault(component, PathNode())
+        if len(parts) == 3 and not parts[0] and not parts[2]:
+            return node.variables.setdefault(parts[1], PathNode())
+        pattern, variables = self._pattern(parts)
+        for existing, _, child in node.patterns:
+            if existing is pattern:
+                return child
+        child = PathNode()
+        node.patterns.append((pattern, variables, child))
+        return child
+
+    def _pattern(self, parts):
+        """Return a (regex, variables) pair matching a mixed literal/variable component"""
+        key = tuple(parts)
+        if key not in self._patterns:
+            regex = ''.join(re.escape(part) if not index % 2 else '(.+?)'
+                            for index, part in enumerate(parts))
+            self._patterns[key] = (re.compile(regex), tuple(parts[1::2]))
+        return self._patterns[key]
+
+    def examine(self, path, drive=None):
+        """
+        Return the context of the most specific formula matching a path
+        :param path: path to examine
+        :param drive: pipeline base directory; inferred when None
+        :return: {'formula': name, variable: value, ...} or None
+        """
+        segments = split_path(path)
+        if drive is not None:
+            drive_segments = split_path(drive)
+            if segments[:len(drive_segments)] != drive_segments:
+                return self._context(self._match(self.root, segments, 0, {}, (0, 0)))
+            values = {DRIVE: os.path.normpath(drive)}
+            remaining = segments[len(drive_segments):]
+            return self._context(self._match(self.drive_root, remaining, 0, values, (0, 0)))
+
+        best = self._match(self.root, segments, 0, {}, (0, 0))
+        # An inferred drive must be followed by at least one formula component,
+        # otherwise any path would match 'pipe_base_dir'.
+        free = self.drive_root.variables or self.drive_root.patterns
+        for split in range(len(segments) - 1, 0, -1):
+            remaining = segments[split:]
+            if not free and remaining[0] not in self.drive_root.literals:
+                continue
+            values = {DRIVE: os.path.sep.join(segments[:split]) or os.path.sep}
+            match = self._match(self.drive_root, remaining, 0, values, (0, 0))
+            if match is not None and (best is None or match[0] > best[0]):
+                best = match
+        return self._context(best)
+
+    def _match(self, node, segments, position, values, score):
+        """
+        Depth-first walk returning the best (score, formula, values) match below a node.
+        Scores count matched literal components, then pattern components.
+        """
+        if position == len(segments):
+            if node.formula is None:
+                return None
+            return (score, node.formula, values)
+
+        segment = segments[position]
+        best = None
+        child = node.literals.get(segment)
+        if child is not None:
+            best = self._match(child, segments, position + 1, values,
+                               (score[0] + 1, score[1]))
+
+        for pattern, variables, child in node.patterns:
+            found = pattern.fullmatch(segment)
+            if found is None:
+                continue
+            bound = self._bind(values, zip(variables, found.groups()))
+            if bound is None:
+                continue
+            match = self._match(child, segments, position + 1, bound, (score[0], score[1] + 1))
+            if match is not None and (best is None or match[0] > best[0]):
+                best = match
+
+        for var, child in node.variables.items():
+            bound = self._bind(values, ((var, segment),))
+            if bound is None:
+                continue
+            match = self._match(child, segments, position + 1, bound, score)
+            if match is not None and (best is None or match[0] > best[0]):
+                best = match
+        return best
+
+    @staticmethod
+    def _bind(values, pairs):
+        """Return values extended with pairs, or None if a variable is bound differently"""
+        bound = None
+        for var, value in pairs:
+            current = values.get(var)
+            if current is None:
+                if bound is None:
+                    bound = dict(values)
+                bound[var] = value
+            elif current != value:
+                return None
+        return values if bound is None else bound
+
+    @staticmethod
+    def _context(match):
+        if match is None:
+            return None
+        score, formula, values = match
+        context = {'formula': formula}
+        context.update(values)
+        return context
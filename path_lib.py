@@ -11,7 +11,17 @@
     Interprets formulas defined via configuration files to generate real paths on disk
 
 :description:
-    FormulaManager 
+    FormulaRegistry parses every formula configuration file once and keeps the
+    result in memory, reparsing only files that changed on disk. On every load the
+    formula graph is expanded in topological order and compiled into flat
+    CompiledFormula templates (literal segments plus variable slots), so resolving
+    a formula is a single pass over its slots.
+
+    Every formula is tagged with the PIPE_DISK it lives on. A formula file line
+    `disk_type = ('config', )` tags the formulas that follow it in that file, and
+    `disk_type = ()` ends the tagging; any other formula inherits the disk of the
+    formula it extends, and root formulas default to the work disk.
+    FormulaManager reads formulas out of the registry.
 
 """
 
@@ -22,185 +32,761 @@
 import re
 import os
 import sys
+import time
+import json
+import hashlib
+import itertools
+import threading
+from operator import add
+from collections import namedtuple
 from pipe_utils import IO
+from pipe_enums import PIPELINE
+import pipe_metrics
 preferences = None
 
+FORMULA_DIR = os.path.normpath(os.path.realpath(__file__) + '/../data/formulas')
+FORMULA_EXT = '.cfg'
+CACHE_EXT = '.cache'
+CACHE_VERSION = 4
+
+# Resolve through generated Python functions instead of walking literals and slots
+CODEGEN = bool(os.environ.get('PIPE_CODEGEN'))
+
+# Formula files merged first (in this order); any other *.cfg follows alphabetically.
+FORMULA_FILE_ORDER = ('pipeline_formulas.cfg', 'project_formulas.cfg', 'asset_formulas.cfg')
+
+# Formula file directive tagging the formulas that follow it with a PIPE_DISK
+DISK_DIRECTIVE = 'disk_type'
+
+# Any reference with one of these prefixes must name a defined formula;
+# every other reference is a variable bound at resolution time.
+FORMULA_PREFIXES = ('pipe_', 'pr_', 'as_')
+
+_ref_re = re.compile(r'\{(.*?)\}')
+_slot_re = re.compile(r'\{(\w+)\}')
+
+_registry = None
+_registry_lock = threading.Lock()
+
 #----------------------------------------------------------------------------------------#
 #--------------------------------------------------------------------------- FUNCTIONS --#
 
+def split_formula(formula_line):
+    """Split a formula line on its equals sign and return the (name, value) pair"""
+    formula_pieces = formula_line.split(' = ', 1)
+    return formula_pieces[0].strip(), formula_pieces[1]
+
+
+def clean_formula(formula_value):
+    """Clean up a formula value from any unused characters"""
+    clean_value = formula_value.replace(',', '')
+    clean_value = clean_value.replace('\'', '')
+    clean_value = clean_value.replace('(', '')
+    clean_value = clean_value.replace(')', '')
+    return clean_value.strip()
+
+
+def content_digest(data):
+    """Return the hex digest the formula cache identifies formula file contents by"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def read_formula_file(file_location, disks=None, digests=None):
+    """
+    Read a formula configuration file and return an ordered {formula: value} dict
+    :param file_location: formula file
+    :param disks: dict filled with {formula: disk} for formulas under a disk_type directive
+    :param digests: dict filled with {file_location: content_digest} of the contents parsed
+    :return: {formula: value}
+    """
+    formulas = {}
+    disk = None
+    with open(file_location, 'rb') as fh:
+        data = fh.read()
+    if digests is not None:
+        digests[file_location] = content_digest(data)
+    for line in data.decode('utf-8').splitlines():
+        line = line.strip()
+        if not line or '#' in line or ' = ' not in line:
+            continue
+        name, value = split_formula(line)
+        value = clean_formula(value)
+        if name == DISK_DIRECTIVE:
+            if value and value not in PIPELINE.DISK.ALL:
+                raise FormulaError("%s: unknown disk type '%s', expected one of %s" % (
+                    os.path.basename(file_location), value, ', '.join(PIPELINE.DISK.ALL)))
+            disk = value or None
+            continue
+        formulas[name] = value
+        if disks is not None and disk is not None:
+            disks[name] = disk
+    return formulas
+
+
+def formula_order(dependencies):
+    """
+    Return formula names in topological order, parents before children
+    :param dependencies: {formula: [referenced formulas]}
+    :return: list of formula names
+    """
+    children = {name: [] for name in dependencies}
+    pending = {}
+    for name, refs in dependencies.items():
+        pending[name] = len(refs)
+        for ref in refs:
+            children[ref].append(name)
+
+    order = [name for name, count in pending.items() if not count]
+    for name in order:
+        for child in children[name]:
+            pending[child] -= 1
+            if not pending[child]:
+                order.append(child)
+
+    if len(order) != len(dependencies):
+        # Walk unresolved references until one repeats to report the cycle
+        trail = [next(name for name, count in pending.items() if count)]
+        while trail.count(trail[-1]) < 2:
+            trail.append(next(ref for ref in dependencies[trail[-1]] if pending[ref]))
+        cycle = trail[trail.index(trail[-1]):]
+        raise FormulaError("Formula cycle: %s" % ' -> '.join(cycle))
+    return order
+
+
+def compile_formulas(formulas, disks=None):
+    """
+    Expand every formula in topological order and compile it into a template
+    :param formulas: {formula: cleaned value}
+    :param disks: {formula: disk} of tagged formulas; the others inherit the disk of
+        the first formula they reference, else PIPE_DISK.DEFAULT
+    :return: {formula: CompiledFormula}
+    """
+    disks = disks or {}
+    dependencies = {}
+    for name, value in formulas.items():
+        refs = []
+        for ref in _ref_re.findall(value):
+            if ref in formulas:
+                if ref not in refs:
+                    refs.append(ref)
+            elif ref.startswith(FORMULA_PREFIXES):
+                raise FormulaError("Formula '%s' references undefined formula '%s'" % (name, ref))
+            elif not ref.isidentifier():
+                raise FormulaError("Formula '%s' has an invalid reference '{%s}'" % (name, ref))
+        dependencies[name] = refs
+
+    compiled = {}
+    for name in formula_order(dependencies):
+        pieces = []
+        for piece in formulas[name].split():
+            refs = [ref for ref in _ref_re.findall(piece) if ref in formulas]
+            if refs and piece == '{%s}' % refs[0]:
+                # Whole-piece reference: inherit the parent's pieces
+                pieces.extend(compiled[refs[0]].pieces)
+                continue
+            for ref in refs:
+                piece = piece.replace('{%s}' % ref, os.path.sep.join(compiled[ref].pieces))
+            pieces.append(piece)
+        disk = disks.get(name)
+        if disk is None:
+            parents = dependencies[name]
+            disk = compiled[parents[0]].disk if parents else PIPELINE.DISK.DEFAULT
+        compiled[name] = CompiledFormula(name, pieces, disk)
+    return compiled
+
+
+def _plain_components(values):
+    """Return True if values can be joined into a normalized path without changing it"""
+    if '' in values or '.' in values or '..' in values:
+        return False
+    joined = ''.join(values)
+    return os.sep not in joined and not (os.altsep and os.altsep in joined)
+
+
+def set_codegen(enabled=True):
+    """
+    Switch CompiledFormula.resolve between generated and interpreted resolvers
+    :param enabled: True to resolve through generated functions
+    """
+    global CODEGEN
+    CODEGEN = bool(enabled)
+
+
+def generate_resolver(compiled):
+    """
+    Generate a function that resolves a formula from a dict of variables in one
+    f-string, e.g. for pr_base_dir::
+
+        def resolve_pr_base_dir(values):
+            return _normpath(f"{values['drive']}" '/projects/' f"{values['project']}")
+
+    Values are expected to be strings, as they are for the interpreted resolver.
+
+    :param compiled: CompiledFormula
+    :return: function(values) -> path
+    """
+    return _generate(compiled, 'values', ["values[%r]" % slot for slot in compiled.slots])
+
+
+def generate_row_resolver(compiled):
+    """
+    Generate a function that resolves a formula from a tuple of values ordered
+    like compiled.variables
+    :param compiled: CompiledFormula
+    :return: function(row) -> path
+    """
+    return _generate(compiled, 'row', ["row[%d]" % compiled.variables.index(slot)
+                                       for slot in compiled.slots])
+
+
+def _generate(compiled, argument, fields):
+    """Build and exec the source of a generated resolver"""
+    parts = [repr(compiled.literals[0])]
+    for field, literal in zip(fields, compiled.literals[1:]):
+        # Adjacent string literals compile into the f-string, a single BUILD_STRING
+        parts.append('f"{%s}"' % field)
+        parts.append(repr(literal))
+    parts = [part for part in parts if part not in ("''", '""')] or ["''"]
+    name = 'resolve_%s' % re.sub(r'\W', '_', compiled.name)
+    source = (
+        "def %s(%s):\n"
+        "    try:\n"
+        "        return _normpath(%s)\n"
+        "    except KeyError as e:\n"
+        "        raise _FormulaError(\"Formula '%%s' needs a value for '%%s'\" %% (_name, e.args[0])) from None\n"
+    ) % (name, argument, ' '.join(parts))
+    namespace = {'_normpath': os.path.normpath, '_FormulaError': FormulaError, '_name': compiled.name}
+    exec(compile(source, '<formula %s>' % compiled.name, 'exec'), namespace)
+    function = namespace[name]
+    function.source = source
+    return function
+
+
+def get_registry():
+    """Return the process-wide FormulaRegistry, creating it on first use"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = FormulaRegistry()
+    return _registry
+
+
+def set_registry(registry):
+    """
+    Replace the process-wide FormulaRegistry, e.g. with one reading another formula
+    directory. Listeners move to the new registry and are notified of the reload.
+    :param registry: FormulaRegistry
+    :return: the previous registry
+    """
+    global _registry
+    with _registry_lock:
+        previous = _registry
+        _registry = registry
+    if previous is not None and previous is not registry:
+        for callback in list(previous._listeners):
+            previous.remove_listener(callback)
+            registry.add_listener(callback)
+            callback(registry)
+    return previous
+
 
 #----------------------------------------------------------------------------------------#
 #----------------------------------------------------------------------------- CLASSES --#
 
+class FormulaError(Exception):
+    """Raised for undefined, cyclic or unresolvable formulas"""
+
+
+class CompiledFormula(object):
+    """
+    A fully expanded formula, precompiled into literal segments and variable slots,
+    and the PIPE_DISK it lives on.
+
+    ``literals`` always holds one more item than ``slots``; a path is the
+    literals interleaved with the slot values, e.g. for ``pr_base_dir``::
+
+        literals = ('', '/projects/', '')
+        slots    = ('drive', 'project')
+    """
+    __slots__ = ('name', 'pieces', 'literals', 'slots', 'variables', 'disk',
+                 '_generated', '_generated_row')
+
+    def __init__(self, name, pieces, disk=PIPELINE.DISK.DEFAULT):
+        # Immutable and interned: every formula sharing a segment shares one string
+        pieces = tuple(map(sys.intern, pieces))
+        parts = [sys.intern(part) for part in _slot_re.split(os.path.sep.join(pieces))]
+        _set = object.__setattr__
+        _set(self, 'name', sys.intern(name))
+        _set(self, 'pieces', pieces)
+        _set(self, 'literals', tuple(parts[0::2]))
+        _set(self, 'slots', tuple(parts[1::2]))
+        _set(self, 'variables', tuple(dict.fromkeys(self.slots)))
+        _set(self, 'disk', sys.intern(disk))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledFormula is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("CompiledFormula is immutable")
+
+    def __reduce__(self):
+        # Generated functions are rebuilt on demand, they can't be pickled
+        return (CompiledFormula, (self.name, self.pieces, self.disk))
+
+    def __repr__(self):
+        return "CompiledFormula(%r, %r)" % (self.name, self.pieces)
+
+    def generated(self):
+        """Return the generated resolver of this formula, creating it on first use"""
+        try:
+            return self._generated
+        except AttributeError:
+            object.__setattr__(self, '_generated', generate_resolver(self))
+            return self._generated
+
+    def generated_row(self):
+        """Return the generated tuple resolver of this formula, creating it on first use"""
+        try:
+            return self._generated_row
+        except AttributeError:
+            object.__setattr__(self, '_generated_row', generate_row_resolver(self))
+            return self._generated_row
+
+    def resolve(self, values):
+        """
+        Return a normalized path by filling each slot from a dict of variables
+        :param values: {variable: value}
+        :return: path
+        """
+        if CODEGEN:
+            return self.generated()(values)
+        literals = self.literals
+        path = [literals[0]]
+        try:
+            for index, slot in enumerate(self.slots, 1):
+                path.append(values[slot])
+                path.append(literals[index])
+        except KeyError as e:
+            raise FormulaError("Formula '%s' needs a value for '%s'" % (self.name, e.args[0])) from None
+        return os.path.normpath(''.join(path))
+
+    def resolve_rows(self, rows, defaults=None):
+        """
+        Yield a normalized path for each dict of variables
+        :param rows: iterable of {variable: value} dicts
+        :param defaults: {variable: value} used when a row has no value
+        :return: generator of paths
+        """
+        defaults = defaults or {}
+        first = self.literals[0]
+        slots = tuple(zip(self.slots, self.literals[1:]))
+        normpath = os.path.normpath
+        for row in rows:
+            path = first
+            for slot, literal in slots:
+                value = row.get(slot)
+                if value is None:
+                    value = defaults.get(slot)
+                    if value is None:
+                        raise FormulaError("Formula '%s' needs a value for '%s'" % (self.name, slot))
+                path += value + literal
+            yield normpath(path)
+
+    def resolve_columns(self, columns, defaults=None):
+        """
+        Yield a normalized path for each row of a columnar mapping
+        :param columns: {variable: sequence of values}, all of the same length
+        :param defaults: {variable: value} for variables without a column
+        :return: generator of paths
+        """
+        defaults = defaults or {}
+        values = []
+        for var in self.variables:
+            if var in columns:
+                values.append(columns[var])
+            elif defaults.get(var) is not None:
+                values.append(itertools.repeat(defaults[var]))
+            else:
+                raise FormulaError("Formula '%s' needs a value for '%s'" % (self.name, var))
+        if CODEGEN:
+            yield from map(self.generated_row(), zip(*values))
+            return
+        first = self.literals[0]
+        slots = tuple(zip([self.variables.index(slot) for slot in self.slots], self.literals[1:]))
+        normpath = os.path.normpath
+        for row in zip(*values):
+            path = first
+            for index, literal in slots:
+                path += row[index] + literal
+            yield normpath(path)
+
+    def bind(self, values):
+        """
+        Partially evaluate the formula with some of its variables
+        :param values: {variable: value} for the bound variables
+        :return: BoundFormula
+        """
+        return BoundFormula(self, values)
+
+
+class BoundFormula(object):
+    """
+    A CompiledFormula specialized for a set of bound variables.
+
+    Every run of literals and bound values is folded into one constant segment,
+    normalized once up front, so resolving costs the concatenation of the
+    remaining free slots. The final normpath is skipped when every free value is
+    a plain path component (no separator, not empty, '.' or '..'), which leaves a
+    normalized template normalized.
+    """
+    __slots__ = ('name', 'compiled', 'bound', 'slots', 'variables', 'literals', 'normalized', 'prefix')
+
+    def __init__(self, compiled, values):
+        self.name = compiled.name
+        self.compiled = compiled
+        self.bound = {var: values[var] for var in compiled.variables if var in values}
+
+        literals = [compiled.literals[0]]
+        slots = []
+        for slot, literal in zip(compiled.slots, compiled.literals[1:]):
+            if slot in self.bound:
+                literals[-1] += self.bound[slot] + literal
+            else:
+                slots.append(slot)
+                literals.append(literal)
+        self.slots = tuple(slots)
+        self.variables = tuple(dict.fromkeys(slots))
+        literals, self.normalized = self._normalize(literals, slots)
+        self.literals = tuple(map(sys.intern, literals))
+        self.prefix = self.literals[0]
+
+    @staticmethod
+    def _normalize(literals, slots):
+        """Return (literals, True) normalized around placeholder slots, or the originals"""
+        marker = '\0'
+        template = literals[0]
+        for index, literal in enumerate(literals[1:]):
+            template += '%s%d%s%s' % (marker, index, marker, literal)
+        parts = os.path.normpath(template).split(marker)
+        if parts[1::2] != [str(index) for index in range(len(slots))]:
+            # Normalizing would consume a slot (e.g. '{asset}/..'), keep normpath per call
+            return tuple(literals), False
+        return tuple(parts[0::2]), True
+
+    def __repr__(self):
+        return "BoundFormula(%r, %r)" % (self.name, self.bound)
+
+    def resolve(self, values):
+        """
+        Return a normalized path by filling the free slots from a dict of variables
+        :param values: {variable: value} for the free variables
+        :return: path
+        """
+        try:
+            filled = [values[slot] for slot in self.slots]
+        except KeyError as e:
+            raise FormulaError("Formula '%s' needs a value for '%s'" % (self.name, e.args[0])) from None
+        path = self.prefix + ''.join(map(add, filled, self.literals[1:]))
+        if self.normalized and _plain_components(filled):
+            return path
+        return os.path.normpath(path)
+
+
+class FormulaFile(object):
+    """
+    A parsed formula configuration file, the stat signature it was parsed at and
+    the digest of its contents
+    """
+    def __init__(self, file_location, signature, formulas, disks=None, digest=None):
+        self.file_location = file_location
+        self.signature = signature
+        self.formulas = formulas
+        self.disks = disks or {}
+        self.digest = digest
+
+
+# One complete, never mutated, state of a FormulaRegistry
+RegistrySnapshot = namedtuple('RegistrySnapshot', ('files', 'formulas', 'file_formulas', 'compiled'))
+
+
+class FormulaRegistry(object):
+    """
+    In-memory store of every formula file in a formula directory.
+
+    Each *.cfg file is parsed once and kept in memory together with its
+    (mtime, size) signature. The directory is re-stat'ed at most once per
+    ``check_interval`` seconds (never, if it is None) and only files whose
+    signature changed are parsed again, so steady-state lookups do no file I/O.
+    Readers always see a complete snapshot; reloads swap it in one assignment.
+
+    The compiled snapshot is also saved as JSON next to the formula directory
+    (data/formulas.cache), keyed by a digest of the formula file contents and the
+    engine version. A fresh process reads and hashes the cfgs, which is cheaper
+    than parsing and compiling them, and loads the snapshot in a single read when
+    they are unchanged. JSON, not pickle: the cache lives in a shared directory
+    and loading it must never run code. Building the CompiledFormula objects
+    dominates either way, so the cache saves the parse and compile step only,
+    about 1.3x on a cold start (benchmarks/bench_cold_start.py). Pass
+    cache_file=False to disable it.
+    """
+    def __init__(self, formula_dir=None, check_interval=2.0, cache_file=None):
+        self.formula_dir = formula_dir or FORMULA_DIR
+        self.check_interval = check_interval
+        if cache_file is None:
+            cache_file = os.path.normpath(self.formula_dir) + CACHE_EXT
+        self.cache_file = cache_file
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._snapshot = RegistrySnapshot({}, {}, {}, {})
+        self._checked = None
+        self._listeners = ()
+
+    # Readers take one reference to the snapshot; reloads replace it as a whole
+    _files = property(lambda self: self._snapshot.files)
+    _formulas = property(lambda self: self._snapshot.formulas)
+    _file_formulas = property(lambda self: self._snapshot.file_formulas)
+    _compiled = property(lambda self: self._snapshot.compiled)
+
+    def add_listener(self, callback):
+        """Register a callable invoked with the registry after every reload"""
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners = self._listeners + (callback,)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            self._listeners = tuple(listener for listener in self._listeners
+                                    if listener != callback)
+
+    def get(self, formula):
+        """Return the cleaned value of a formula, or None if it isn't defined"""
+        self.check(formula)
+        return self._formulas.get(formula)
+
+    def get_compiled(self, formula):
+        """Return the CompiledFormula for a formula, or None if it isn't defined"""
+        self.check(formula)
+        return self._compiled.get(formula)
+
+    def compiled_formulas(self):
+        """Return a {formula: CompiledFormula} dict of every formula"""
+        self.check()
+        return self._compiled
+
+    def resolve(self, formula, values):
+        """Resolve a formula into a path using a dict of variables"""
+        compiled = self.get_compiled(formula)
+        if compiled is None:
+            raise FormulaError("Undefined formula '%s'" % formula)
+        return compiled.resolve(values)
+
+    def formulas(self):
+        """Return a {formula: value} dict of every formula, in file order"""
+        self.check()
+        return self._formulas
+
+    def file_formulas(self, file_name):
+        """Return the {formula: value} dict of a single formula file"""
+        self.check()
+        return self._file_formulas.get(file_name, {})
+
+    def check(self, formula=None):
+        """
+        Refresh the registry if it was never loaded or the check interval elapsed
+        :param formula: formula being looked up, used to label I/O metrics
+        """
+        checked = self._checked
+        if checked is not None:
+            if self.check_interval is None:
+                return False
+            if time.monotonic() - checked < self.check_interval:
+                return False
+            if self._lock.locked():
+                # Another thread is already re-checking; keep reading the current snapshot
+                return False
+        return self.refresh(formula=formula)
+
+    def refresh(self, force=False, formula=None):
+        """
+        Re-stat the formula directory and reparse changed files
+        :param force: reparse every file regardless of its signature
+        :param formula: formula being looked up, used to label I/O metrics
+        :return: True if the registry was reloaded
+        """
+        with self._lock:
+            signatures = []
+            for file_location in self._list_files():
+                st = os.stat(file_location)
+                signatures.append((file_location, (st.st_mtime_ns, st.st_size)))
+            pipe_metrics.count('formula_file_stats', formula, len(signatures) + 1)
+
+            changed = self._checked is None
+            if changed and not force and self._load_cache(signatures, formula):
+                self._checked = time.monotonic()
+                signatures = None
+
+            if signatures is not None:
+                files = {}
+                for file_location, signature in signatures:
+                    file_name = os.path.basename(file_location)
+                    cached = self._files.get(file_name)
+                    if not force and cached is not None and cached.signature == signature:
+                        files[file_name] = cached
+                        continue
+                    disks, digests = {}, {}
+                    formulas = read_formula_file(file_location, disks, digests)
+                    files[file_name] = FormulaFile(file_location, signature, formulas, disks,
+                                                   digests[file_location])
+                    pipe_metrics.count('formula_file_opens', formula)
+                    changed = True
+                if force or set(files) != set(self._files):
+                    changed = True
+                if changed:
+                    self._load(files)
+                    self._save_cache()
+                self._checked = time.monotonic()
+                if not changed:
+                    return False
+        for callback in self._listeners:
+            callback(self)
+        return True
+
+    def cache_key(self, digests):
+        """
+        Return the on-disk cache key for a list of (file name, content digest) pairs
+        in merge order
+        """
+        digest = hashlib.sha1(('%s:%s' % (PIPELINE.VERSION, CACHE_VERSION)).encode())
+        for file_name, content in digests:
+            digest.update(('%s:%s;' % (file_name, content)).encode())
+        return digest.hexdigest()
+
+    def _load_cache(self, signatures, formula=None):
+        """Load the compiled snapshot from the cache file if the cfg contents match its key"""
+        if not self.cache_file:
+            return False
+        pipe_metrics.count('formula_file_opens', formula)
+        try:
+            with open(self.cache_file, 'rb') as fh:
+                data = json.loads(fh.read())
+            digests = []
+            for file_location, _ in signatures:
+                with open(file_location, 'rb') as fh:
+                    digests.append((os.path.basename(file_location), content_digest(fh.read())))
+            if data['key'] != self.cache_key(digests):
+                return False
+            files = {}
+            for (file_location, signature), (file_name, digest) in zip(signatures, digests):
+                cached = data['files'][file_name]
+                files[file_name] = FormulaFile(file_location, signature, cached['formulas'],
+                                               cached['disks'], digest)
+            compiled = {name: CompiledFormula(name, pieces, disk)
+                        for name, (pieces, disk) in data['compiled'].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return False
+        self._load(files, compiled)
+        return True
+
+    def _save_cache(self):
+        """Write the compiled snapshot to the cache file, skipping read-only installs"""
+        if not self.cache_file:
+            return
+        files = self._files
+        data = {
+            'key': self.cache_key([(file_name, formula_file.digest) for file_name, formula_file in files.items()]),
+            'files': {file_name: {'formulas': formula_file.formulas, 'disks': formula_file.disks}
+                      for file_name, formula_file in files.items()},
+            'compiled': {name: [compiled.pieces, compiled.disk] for name, compiled in self._compiled.items()},
+        }
+        temp_file = '%s.%d.tmp' % (self.cache_file, os.getpid())
+        try:
+            with open(temp_file, 'w') as fh:
+                json.dump(data, fh, separators=(',', ':'))
+            os.replace(temp_file, self.cache_file)
+        except OSError:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def _list_files(self):
+        """Return formula file locations in merge order"""
+        names = [entry.name for entry in os.scandir(self.formula_dir)
+                 if entry.name.endswith(FORMULA_EXT) and entry.is_file()]
+        first = [name for name in FORMULA_FILE_ORDER if name in names]
+        rest = sorted(name for name in names if name not in FORMULA_FILE_ORDER)
+        return [os.path.join(self.formula_dir, name) for name in first + rest]
+
+    def _load(self, files, compiled=None):
+        """Compile and swap in a new snapshot built from parsed formula files"""
+        formulas = {}
+        disks = {}
+        file_formulas = {}
+        for file_name, formula_file in files.items():
+            formulas.update(formula_file.formulas)
+            # A formula redefined by a later file takes that file's tagging
+            for name in formula_file.formulas:
+                disks[name] = formula_file.disks.get(name)
+            file_formulas[file_name] = formula_file.formulas
+        if compiled is None:
+            compiled = compile_formulas(formulas, disks)
+        self._snapshot = RegistrySnapshot(files, formulas, file_formulas, compiled)
+        self.generation += 1
+
+
 class FormulaManager(object):
     """
     Logical manager class for all formulas defined in the pipeline
     
     """
-    def __init__(self, user=False):
-        self.all_formulas = []
+    def __init__(self, user=False, registry=None):
+        self.registry = registry or get_registry()
         self.formulas_dict = {}
         self.formula_disk = None
         self.formulas = []
-        self.file_location = os.path.normpath(os.path.realpath(__file__)
-                                              + '/../data/formulas/pipeline_formulas.cfg')
-        self.project_file = os.path.normpath(os.path.realpath(__file__)
-                                             + '/../data/formulas/project_formulas.cfg')
-        self.asset_file = os.path.normpath(os.path.realpath(__file__)
-                                           + '/../data/formulas/asset_formulas.cfg')
                                            
     def get_formula(self, formula=None):
-        """Get a particular formula path by reading the associated formulas from disk"""
+        """Get the fully expanded pieces of a formula from the registry"""
+        started = pipe_metrics.start()
+        try:
+            return self._get_formula(formula)
+        finally:
+            if started is not None:
+                pipe_metrics.observe('formula_manager_get_formula',
+                                     formula if isinstance(formula, str) else None, started)
+
+    def _get_formula(self, formula):
         if formula is not None:
             # Multiple Formulas
             if isinstance(formula, list):
-                form_vals = []
-                for form in formula:
-                    self.read_formulas(formula=form)
-                    form_val = self.parse_formulas(formula=form)
-                    form_vals.append(form_val)
                 # Return Multiple Forumlas
-                return form_vals
+                return [self._get_formula(form) for form in formula]
             # Single Formula
             elif isinstance(formula, str):
-                self.read_formulas(formula=formula)
+                compiled = self.registry.get_compiled(formula)
+                # Return None if Formula isn't in the registry
+                if compiled is None:
+                    return None
                 # Return One Forumla
-                return self.parse_formulas(formula=formula)
+                return list(compiled.pieces)
         # All Formulas
-        elif formula is None:
-            # Return All Forumlas
-            self.read_formulas()
-            return self.parse_formulas()
-        # Return None if Formula isn't in the dictionary:
-        return None
-
-    def read_formulas(self, formula=None):
-        """Conditionally reads formula configuration files based on a passed in formula value"""
-
-        class Formula:
-            
-            pass
-
-
-        def _read(file_location=self.file_location):
-            keep = []
-            with open(file_location, 'r') as fh:
-                for line in fh:
-                    line = line.strip()
-                    if ',' in line:
-                        keep.append(line)
-                        if '#' in line:
-                            keep.remove(line)
-            self.all_formulas = keep
-
-        def _read_projects(file_location=self.project_file):
-            with open(file_location, 'r') as fh:
-                for line in fh:
-                    line = line.strip()
-                    if 'pr_' in line:
-                        self.all_formulas.append(line)
-                        if '#' in line:
-                            self.all_formulas.remove(line)
-            return self.all_formulas
-
-
-        def _read_assets(file_location=self.asset_file):
-            with open(file_location, 'r') as fh:
-                for line in fh:
-                    line = line.strip()
-                    if 'as_' in line:
-                        self.all_formulas.append(line)
-                        if '#' in line:
-                            self.all_formulas.remove(line)
-            return self.all_formulas
-        
-        _read(file_location=self.file_location)
-
-        # Conditionally read other formulas
-        if 'pr_' in formula:
-            _read_projects()
-        if 'as_' in formula:
-            _read_assets()
-        if not formula:
-            _read_projects()
-            _read_assets()
-
-            
-    def parse_formulas(self, formula=None):
-        """Split, clean and expand formulas after they have been read"""
-
-        self.split_formulas()
-        self.clean_formulas()
-        self.expand_formulas()
-        
-        # Return Formula Values
-        if formula:
-            if formula in self.formulas_dict:
-                formula_vals = self.formulas_dict[formula]
-                return formula_vals.split()
-        elif not formula:
-            formula_vals = self.formulas_dict
-            return formula_vals
-
-
-    def split_formulas(self):
-        """Split on equals signs and append the correct pieces"""
-
-        all_formulas = self.all_formulas
-        for formula_line in all_formulas:
-            formula_pieces = formula_line.split(' = ')
-            self.formulas_dict[formula_pieces[0]] = formula_pieces[1]
-            self.formulas.append(formula_pieces[0])
-
-        return self.formulas
-
-
-    def clean_formulas(self):
-        """Clean up the formulas from any unused characters"""
-
-        for formula in self.formulas:
-            clean_formula = self.formulas_dict[formula]
-            clean_formula = clean_formula.replace(',', '')
-            clean_formula = clean_formula.replace('\'', '')
-            clean_formula = clean_formula.replace('(', '')
-            clean_formula = clean_formula.replace(')', '')
-            clean_formula = clean_formula.strip()
-            self.formulas_dict[formula] = clean_formula
-        
-        return self.formulas_dict
+        # Return All Forumlas
+        return self.expand_formulas()
 
 
     def expand_formulas(self):
-        """Expand all the formulas using regex"""
-        import re
-        
-        for formula in self.formulas:
-            if not 'pipe_' in self.formulas_dict[formula]:
-                if not 'pr_' in self.formulas_dict[formula]:
-                    if not 'as_' in self.formulas_dict[formula]:
-                        continue
+        """Return a {formula: value} dict of every fully expanded formula"""
 
-            # Get the formula that we want to inherit values from.
-            bracketed_values = re.findall(r'\{(.*?)\}', self.formulas_dict[formula])
-            formula_to_switch = bracketed_values[0]
-            if not formula_to_switch:
-                continue
-            
-            # Get the formula with that value.
-            legit_values = self.formulas_dict[formula_to_switch]
-            replacement_str = "{%s}" % formula_to_switch
-            
-            if formula_to_switch in self.formulas_dict.keys():
-                # Replace the 'pr_' value with the legit_values.
-                current_value = self.formulas_dict[formula]
-                current_value = current_value.replace(replacement_str, legit_values)
-                self.formulas_dict[formula] = current_value
+        self.formulas_dict = {name: ' '.join(compiled.pieces)
+                              for name, compiled in self.registry.compiled_formulas().items()}
+        self.formulas = list(self.formulas_dict)
+        return self.formulas_dict
 
 
     def get_formula_disk(self, formula):
-        """Checks the 'disk_type' key in the formula dict and then returns the value"""
+        """Return the PIPE_DISK a formula lives on, or None if it isn't defined"""
 
-        if formula in self.formulas_dict:
-            formula_disk = self.formulas_dict['disk_type']
-            self.formula_disk = formula_disk
-            return self.formula_disk
\ No newline at end of file
+        compiled = self.registry.get_compiled(formula)
+        if compiled is None:
+            return None
+        self.formula_disk = compiled.disk
+        return self.formula_disk
@@ -0,0 +1,368 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Compact sets of resolved paths
+
+:description:
+    PathSet stores paths as a trie of path components. Every distinct component is
+    kept once, UTF-8 encoded in a single buffer, and the trie itself is three flat
+    arrays: nodes are numbered breadth first with each node's children contiguous
+    and sorted, so a node costs a child offset, a segment id and a terminal flag.
+    A show inventory that shares '{drive}/projects/{project}/assets/...' prefixes
+    takes a fraction of the memory of the same paths as strings.
+
+        paths = PathSet(PipeContext.get_paths('as_tex_dir', rows, drive=drive))
+        path in paths
+        list(paths.under(PipeContext.get_path('pr_as_type_dir', ...)))
+
+    Added paths are buffered and built into a new trie (a run) when a query needs
+    them. Runs are merged structurally, segment ids and node arrays only, with
+    nothing decoded back to strings, whenever the newest run grows to half the
+    size of the one before it, so a set holds O(log n) runs and interleaved adds
+    and queries cost amortized O(log n) node work per path.
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import os
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from itertools import accumulate, chain
+
+# Paths buffered before they are merged into the arrays
+MERGE_SIZE = 1000000
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def from_formula(formula, rows, **kwargs):
+    """
+    Resolve a formula for many contexts into a PathSet
+    :param formula: formula to evaluate
+    :param rows: iterable of kwargs dicts, or a columnar {variable: sequence} mapping
+    :param kwargs: keyword_arguments shared by every row, e.g. drive
+    :return: PathSet
+    """
+    from pipe_context import PipeContext
+    return PathSet(PipeContext.get_paths(formula, rows, **kwargs))
+
+
+def from_examined(paths, formula=None, pipe_base_dir=None):
+    """
+    Collect the paths that examine_path recognizes into a PathSet
+    :param paths: iterable of paths, e.g. a directory listing
+    :param formula: only keep paths matching this formula
+    :param pipe_base_dir: Pipeline Base Directory, inferred when None
+    :return: PathSet
+    """
+    import path_index
+    index = path_index.get_path_index()
+    path_set = PathSet()
+    for path in paths:
+        context = index.examine(path, drive=pipe_base_dir)
+        if context is not None and (formula is None or context['formula'] == formula):
+            path_set.add(os.path.normpath(path))
+    return path_set
+
+
+def _encode(segment):
+    return segment.encode('utf-8', 'surrogatepass')
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class _Segments(object):
+    """Sorted sequence view over the encoded segment buffer, for bisect"""
+    __slots__ = ('buffer', 'offsets')
+
+    def __init__(self, buffer, offsets):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.buffer[self.offsets[index]:self.offsets[index + 1]]
+
+    def decode(self, index):
+        return self[index].decode('utf-8', 'surrogatepass')
+
+
+class _Levels(object):
+    """
+    Collects trie nodes in sorted pre-order, one array per depth; siblings stay
+    adjacent, so the levels laid end to end are the breadth first node arrays
+    """
+    __slots__ = ('edges', 'terminals', 'counts', 'root_count', 'size')
+
+    def __init__(self):
+        self.edges, self.terminals, self.counts = [], [], []
+        self.root_count = 0
+        self.size = 0
+
+    def add(self, depth, segment, terminal):
+        """Append a node below the last node of the previous depth"""
+        if depth == len(self.edges):
+            self.edges.append(array('I'))
+            self.terminals.append(bytearray())
+            self.counts.append(array('I'))
+        self.edges[depth].append(segment)
+        self.terminals[depth].append(terminal)
+        self.counts[depth].append(0)
+        if depth:
+            self.counts[depth - 1][-1] += 1
+        else:
+            self.root_count += 1
+        self.size += terminal
+
+    def trie(self, encoded):
+        """Return the _Trie of the collected nodes over the encoded segments"""
+        edges = array('I')
+        terminal = bytearray(1)
+        child_counts = array('I', [self.root_count])
+        for level, level_terminals, level_counts in zip(self.edges, self.terminals, self.counts):
+            edges.extend(level)
+            terminal.extend(level_terminals)
+            child_counts.extend(level_counts)
+        segments = _Segments(b''.join(encoded), array('I', accumulate(map(len, encoded), initial=0)))
+        return _Trie(segments, array('I', accumulate(child_counts, initial=0)), edges, terminal, self.size)
+
+
+class _Trie(object):
+    """
+    One run of a PathSet: the segment buffer and the flat node arrays
+    """
+    __slots__ = ('segments', 'offsets', 'edges', 'terminal', 'size')
+
+    def __init__(self, segments, offsets, edges, terminal, size):
+        self.segments = segments
+        # Children of node n are nodes offsets[n] + 1 ... offsets[n + 1], node 0 is the root
+        self.offsets = offsets
+        # Segment id of node n + 1
+        self.edges = edges
+        self.terminal = terminal
+        self.size = size
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a run from sorted, unique component lists"""
+        names = sorted(set(chain.from_iterable(rows)))
+        ids = {segment: index for index, segment in enumerate(names)}
+        # Rows are sorted, so every row only adds the nodes below its common prefix
+        # with the previous row
+        levels = _Levels()
+        previous = ()
+        for row in rows:
+            shared = 0
+            for segment, other in zip(row, previous):
+                if segment != other:
+                    break
+                shared += 1
+            last = len(row) - 1
+            for depth in range(shared, len(row)):
+                levels.add(depth, ids[row[depth]], depth == last)
+            previous = row
+        return levels.trie([_encode(segment) for segment in names])
+
+    @classmethod
+    def merge(cls, first, second):
+        """Merge two runs holding disjoint paths, without decoding their segments"""
+        # Merge the sorted segment tables and map each run's ids into the merged one
+        encoded, maps = [], (array('I'), array('I'))
+        ours, theirs = first.segments, second.segments
+        i = j = 0
+        while i < len(ours) or j < len(theirs):
+            a = ours[i] if i < len(ours) else None
+            b = theirs[j] if j < len(theirs) else None
+            if b is None or (a is not None and a <= b):
+                if a == b:
+                    maps[1].append(len(encoded))
+                    j += 1
+                maps[0].append(len(encoded))
+                encoded.append(a)
+                i += 1
+            else:
+                maps[1].append(len(encoded))
+                encoded.append(b)
+                j += 1
+
+        # Walk both runs together in sorted pre-order; node -1 is absent from that run
+        levels = _Levels()
+        stack = [(-1, 0, 0, 0)]
+        while stack:
+            depth, segment, a, b = stack.pop()
+            if depth >= 0:
+                levels.add(depth, segment, (a >= 0 and first.terminal[a]) or (b >= 0 and second.terminal[b]))
+            children = {}
+            for side, (run, node, ids) in enumerate(((first, a, maps[0]), (second, b, maps[1]))):
+                if node < 0:
+                    continue
+                edges = run.edges
+                for child in range(run.offsets[node], run.offsets[node + 1]):
+                    children.setdefault(ids[edges[child]], [-1, -1])[side] = child + 1
+            # Push in reverse so children come out in sorted order
+            for child in sorted(children, reverse=True):
+                stack.append((depth + 1, child, children[child][0], children[child][1]))
+        return levels.trie(encoded)
+
+    def find(self, keys):
+        """Return the node of a path's encoded components, or -1"""
+        segment_bytes = self.segments.__getitem__
+        offsets = self.offsets
+        edges = self.edges
+        node = 0
+        for key in keys:
+            # Children are sorted by segment, bisect within the node's range only
+            first, last = offsets[node], offsets[node + 1]
+            index = bisect_left(edges, key, first, last, key=segment_bytes)
+            if index == last or segment_bytes(edges[index]) != key:
+                return -1
+            node = index + 1
+        return node
+
+    def walk(self, node, parts, sep):
+        """Depth first generator of the paths at or under a node"""
+        decode = self.segments.decode
+        offsets = self.offsets
+        edges = self.edges
+        terminal = self.terminal
+        stack = [(node, parts)]
+        while stack:
+            node, parts = stack.pop()
+            if terminal[node]:
+                yield sep.join(parts)
+            # Push in reverse so children come out in sorted order
+            for child in range(offsets[node + 1], offsets[node], -1):
+                stack.append((child, parts + [decode(edges[child - 1])]))
+
+    def nbytes(self):
+        """Return the bytes held by the arrays"""
+        return (len(self.segments.buffer) + self.segments.offsets.itemsize * len(self.segments.offsets)
+                + self.offsets.itemsize * len(self.offsets) + self.edges.itemsize * len(self.edges)
+                + len(self.terminal))
+
+
+class PathSet(object):
+    """
+    Set of paths stored as compact component tries
+    :param paths: initial paths
+    :param sep: path separator, os.sep by default
+    """
+    __slots__ = ('sep', '_runs', '_pending')
+
+    def __init__(self, paths=(), sep=os.sep):
+        self.sep = sep
+        # Runs from oldest and largest to newest, each holding paths none of the others do
+        self._runs = []
+        self._pending = set()
+        self.update(paths)
+
+    def __repr__(self):
+        return "PathSet(%d paths)" % len(self)
+
+    def __len__(self):
+        self.compact()
+        return sum(run.size for run in self._runs)
+
+    def __bool__(self):
+        return bool(self._pending) or bool(self._runs)
+
+    def __iter__(self):
+        return self.under(None)
+
+    def __contains__(self, path):
+        self.compact()
+        return self._contains(path)
+
+    def add(self, path):
+        """Add a path"""
+        self._pending.add(path)
+        if len(self._pending) >= MERGE_SIZE:
+            self.compact()
+
+    def update(self, paths):
+        """Add many paths"""
+        pending = self._pending
+        for path in paths:
+            pending.add(path)
+            if len(pending) >= MERGE_SIZE:
+                self.compact()
+                pending = self._pending
+
+    def under(self, prefix):
+        """
+        Yield the paths at or under a directory, in sorted component order
+        :param prefix: directory path, None for every path
+        :return: generator of paths
+        """
+        self.compact()
+        if prefix is None:
+            parts = []
+        else:
+            prefix = os.path.normpath(prefix) if self.sep == os.sep else prefix.rstrip(self.sep)
+            parts = prefix.split(self.sep)
+        keys = [_encode(part) for part in parts]
+        walks = []
+        for run in self._runs:
+            node = run.find(keys)
+            if node >= 0:
+                walks.append(run.walk(node, parts, self.sep))
+        if len(walks) == 1:
+            yield from walks[0]
+        elif walks:
+            sep = self.sep
+            yield from merge(*walks, key=lambda path: path.split(sep))
+
+    def count(self, prefix=None):
+        """Return the number of paths at or under a directory"""
+        if prefix is None:
+            return len(self)
+        return sum(1 for _ in self.under(prefix))
+
+    def compact(self):
+        """
+        Build the pending paths into a new run and merge runs of similar size
+        :return: self
+        """
+        if not self._pending:
+            return self
+        sep = self.sep
+        paths = [path for path in self._pending if not self._contains(path)]
+        self._pending = set()
+        if not paths:
+            return self
+        # With the separator sorting first, string order is component order
+        paths.sort(key=lambda path: path.replace(sep, '\0'))
+        runs = self._runs
+        runs.append(_Trie.from_rows([path.split(sep) for path in paths]))
+        # Keep run sizes geometric, so every path takes part in O(log n) merges
+        while len(runs) > 1 and runs[-1].size * 2 >= runs[-2].size:
+            newest = runs.pop()
+            runs[-1] = _Trie.merge(runs[-1], newest)
+        return self
+
+    def nbytes(self):
+        """Return the bytes held by the compact arrays"""
+        self.compact()
+        return sum(run.nbytes() for run in self._runs)
+
+    def _contains(self, path):
+        """Return whether one of the runs holds a path"""
+        keys = [_encode(segment) for segment in path.split(self.sep)]
+        for run in self._runs:
+            node = run.find(keys)
+            if node >= 0 and run.terminal[node]:
+                return True
+        return False
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    asyncio API for path resolution and filesystem operations
+
+:description:
+    Resolving a formula is pure computation and runs on the event loop. Anything
+    that touches the filesystem (existence checks, directory creation) runs on a
+    bounded thread pool, with at most LIMIT jobs in flight per event loop, so slow
+    network filesystems never block the loop.
+
+    aget_path calls made in the same loop iteration are coalesced: requests are
+    queued and resolved together with one get_paths call per formula on the next
+    iteration.
+
+        path = await pipe_async.aget_path('as_tex_dir', project='avengers', asset='cube')
+        report = await pipe_async.acreate_paths(PIPELINE.LAYOUT.ASSET, rows, drive=drive)
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import asyncio
+import functools
+import threading
+import contextvars
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import pipe_fs
+import pipe_metrics
+from pipe_context import PipeContext, PathContext
+
+MAX_WORKERS = pipe_fs.MAX_WORKERS
+
+# Filesystem jobs in flight per event loop
+LIMIT = 16
+
+_executor = None
+_executor_lock = threading.Lock()
+_semaphores = weakref.WeakKeyDictionary()
+_batchers = weakref.WeakKeyDictionary()
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def get_executor():
+    """Return the shared thread pool filesystem jobs run on"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(MAX_WORKERS, thread_name_prefix='pipe_async')
+    return _executor
+
+
+def configure(max_workers=None, limit=None):
+    """
+    Resize the thread pool and/or the per-loop limit of filesystem jobs
+    :param max_workers: threads running filesystem jobs
+    :param limit: filesystem jobs in flight per event loop
+    """
+    global MAX_WORKERS, LIMIT, _executor
+    with _executor_lock:
+        if max_workers is not None and max_workers != MAX_WORKERS:
+            MAX_WORKERS = max_workers
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+                _executor = None
+        if limit is not None:
+            LIMIT = limit
+            _semaphores.clear()
+
+
+async def run_fs(func, *args, **kwargs):
+    """
+    Run a blocking filesystem call on the thread pool, within the loop's limit
+    :param func: callable
+    :return: its result
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(LIMIT)
+    async with semaphore:
+        return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def aget_path(formula, context_cls=PipeContext, **kwargs):
+    """
+    Evaluate a formula and return a path, batched with the other requests of this
+    loop iteration
+    :param formula: formula to evaluate
+    :param context_cls: PipeContext class supplying defaults
+    :param kwargs: keyword_arguments to pass to PipeContext
+    :return: path
+    """
+    # Capture the caller's context now, the batch resolves outside of it
+    values = context_cls(**kwargs).context_values()
+    values.update((key, value) for key, value in kwargs.items() if value is not None)
+    loop = asyncio.get_running_loop()
+    batchers = _batchers.get(loop)
+    if batchers is None:
+        batchers = _batchers[loop] = {}
+    batcher = batchers.get(context_cls)
+    if batcher is None:
+        batcher = batchers[context_cls] = Batcher(context_cls)
+    return await batcher.submit(formula, values)
+
+
+async def aget_paths(formula, rows, context_cls=PipeContext, **kwargs):
+    """
+    Evaluate one formula for many contexts
+    :param formula: formula to evaluate
+    :param rows: iterable of kwargs dicts, or a columnar {variable: sequence} mapping
+    :param kwargs: keyword_arguments shared by every row, e.g. drive
+    :return: list of paths
+    """
+    return context_cls.get_paths(formula, rows, as_list=True, **kwargs)
+
+
+async def aexamine_path(path, pipe_base_dir=None, var=None, context_cls=PipeContext, **kwargs):
+    """
+    Reverse resolve a path into its formula and variables; no filesystem access
+    :param path: path to examine
+    :param pipe_base_dir: Pipeline Base Directory, inferred when None
+    :param var: Specific variable (or 'formula') to return
+    :return: path_dict, path_item or None
+    """
+    return context_cls(**kwargs).examine_path(path, pipe_base_dir=pipe_base_dir, var=var)
+
+
+async def aexists(paths):
+    """
+    Check whether paths exist through the stat cache, on the thread pool
+    :param paths: a path, or a list of paths
+    :return: bool, or a list of bools
+    """
+    if isinstance(paths, str):
+        return await run_fs(pipe_fs.exists, paths)
+    return await run_fs(pipe_fs.exists_many, list(paths))
+
+
+async def acreate_path(path):
+    """Create a directory and its parents, on the thread pool"""
+    await run_fs(PathContext.create_path, path)
+
+
+async def acreate_paths(formulas, rows, max_workers=None, context_cls=PipeContext, **kwargs):
+    """
+    Materialize a set of directory formulas for many contexts; resolution runs on
+    the loop and directory creation on the thread pool, each disk's directories
+    on that disk's queue
+    :param formulas: directory formula or list of directory formulas
+    :param rows: iterable of kwargs dicts, or a columnar {variable: sequence} mapping
+    :param max_workers: threads issuing mkdir calls, the disk queues when None
+    :param kwargs: keyword_arguments shared by every row, e.g. drive
+    :return: pipe_fs.MaterializeReport
+    """
+    groups = context_cls.paths_by_disk(formulas, rows, **kwargs)
+    reports = await asyncio.gather(*(run_fs(pipe_fs.materialize, paths, max_workers=max_workers, disk=disk)
+                                     for disk, paths in groups.items()))
+    report = pipe_fs.MaterializeReport()
+    for disk_report in reports:
+        report.extend(disk_report)
+    return report
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class Batcher(object):
+    """
+    Collects the aget_path requests of one loop iteration and resolves them with
+    one get_paths call per formula. Used from the thread of a single event loop.
+    :param context_cls: PipeContext class supplying defaults
+    """
+    def __init__(self, context_cls=PipeContext):
+        self.context_cls = context_cls
+        self.pending = {}
+
+    def submit(self, formula, values):
+        """Queue a request and return the future of its path"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self.pending:
+            # Flush in an empty context, so no caller's with-block leaks into the defaults
+            loop.call_soon(self.flush, context=contextvars.Context())
+        self.pending.setdefault(formula, []).append((values, future))
+        return future
+
+    def flush(self):
+        """Resolve every queued request"""
+        pending, self.pending = self.pending, {}
+        for formula, requests in pending.items():
+            pipe_metrics.count('async_batched_requests', formula, len(requests))
+            try:
+                paths = self.context_cls.get_paths(formula, [values for values, _ in requests],
+                                                   as_list=True)
+            except Exception:
+                # Some request can't resolve, settle each one on its own
+                paths = None
+            for index, (values, future) in enumerate(requests):
+                if future.done():
+                    continue
+                if paths is not None:
+                    future.set_result(paths[index])
+                    continue
+                try:
+                    future.set_result(self.context_cls.get_path(formula, **values))
+                except Exception as e:
+                    future.set_exception(e)
@@ -33,32 +33,107 @@
 # Built-in
 import os
 import re as re
+import contextvars
 import path_lib as fm
+import path_cache
+import path_index
+import pipe_fs
+import pipe_metrics
 from pipe_utils import IO
 preferences = None
 bpy = None
 sep = os.path.sep
+
+# PipeContexts entered through `with`, innermost last; each thread and asyncio task
+# sees its own stack
+_context_stack = contextvars.ContextVar('pipe_context_stack', default=())
+_preferences = contextvars.ContextVar('pipe_preferences', default=None)
 #----------------------------------------------------------------------------------------#
 #--------------------------------------------------------------------------- FUNCTIONS --#
 
+def current_context():
+    """Return the innermost PipeContext entered in this thread or task, or None"""
+    stack = _context_stack.get()
+    return stack[-1] if stack else None
+
+
+def get_preferences():
+    """Return the preferences set for this thread or task, else the module preferences"""
+    value = _preferences.get()
+    return preferences if value is None else value
+
+
+def set_preferences(value):
+    """
+    Set the preferences of the current thread or task
+    :param value: preferences object, e.g. the add-on preferences
+    :return: contextvars.Token to reset them with
+    """
+    return _preferences.set(value)
+
+
+def disk_values(compiled, values):
+    """
+    Point 'drive' at the storage root of the formula's disk, when one is configured
+    :param compiled: CompiledFormula
+    :param values: {variable: value}, updated in place
+    :return: values
+    """
+    root = pipe_fs.DISK_ROOTS.get(compiled.disk)
+    if root is not None and 'drive' in values:
+        values['drive'] = root
+    return values
+
+
+def resolve_paths(compiled, rows, defaults):
+    """
+    Resolve a compiled formula for many rows, every row's drive pointed at the
+    storage root of the formula's disk, as disk_values does for a single row
+    :param compiled: CompiledFormula
+    :param rows: iterable of {variable: value} dicts, or a columnar {variable: sequence} mapping
+    :param defaults: {variable: value} rows fall back to, updated in place
+    :return: generator of paths
+    """
+    disk_values(compiled, defaults)
+    root = pipe_fs.DISK_ROOTS.get(compiled.disk)
+    if isinstance(rows, Mapping):
+        if root is not None and 'drive' in rows:
+            rows = dict(rows)
+            rows['drive'] = [root] * len(rows['drive'])
+        return compiled.resolve_columns(rows, defaults)
+    if root is not None:
+        rows = (disk_values(compiled, dict(row)) if 'drive' in row else row for row in rows)
+    return compiled.resolve_rows(rows, defaults)
+
 
 #----------------------------------------------------------------------------------------#
 #----------------------------------------------------------------------------- CLASSES --#
 
+from collections.abc import Mapping
 from contextlib import contextmanager, AbstractContextManager
 from pipe_enums import PIPELINE
 
 
-class PipeContext(AbstractContextManager):
+class PipeContext(object):
     """
     this stores pipeline values
     """
+    # Context variables formulas can read from a PipeContext
+    VARIABLES = ('asset', 'asset_type', 'context_area', 'disk_type', 'drive', 'project')
+
+    # Still an AbstractContextManager through its __enter__/__exit__, without a __dict__
+    __slots__ = VARIABLES + ('_context', '_old_context', 'preferences', 'user')
 
     def __init__(self, **kwargs):
 
         self._context:str = None
-        self._old_context:list = []
-        global preferences
+        self._old_context:list = None
+        outer = current_context()
+        if outer is not None:
+            # Variables not given are inherited from the enclosing with-block
+            for var in self.VARIABLES:
+                if kwargs.get(var) is None:
+                    kwargs[var] = getattr(outer, var)
         self.asset = kwargs.setdefault('asset', None)
         self.asset_type = kwargs.setdefault('asset_type', None)
         self.context_area = kwargs.setdefault('context_area', "pipeline")
@@ -66,14 +141,15 @@ class PipeContext(AbstractContextManager):
         drive = PIPELINE.OS
         self.drive = kwargs.setdefault('drive', drive)
         self.project = kwargs.setdefault('project', None)
-        self.preferences = None        
+        self.preferences = get_preferences()
         self.user = False
         
 
     def __enter__(self):
         """
         Upon entering a fresh PipeContext Manager assign the current context to the platform specific base drive
-        :return:
+        and make it the current context of this thread or task
+        :return: self
         """
         try:
             if not self.context and self.drive is not None:
@@ -81,7 +157,8 @@ class PipeContext(AbstractContextManager):
         except AttributeError:
             IO.error("'drive' keyword not set")
         finally:
-            pass
+            _context_stack.set(_context_stack.get() + (self,))
+        return self
 
 
     def __exit__(self, exc_type, exc_value, traceback):
@@ -90,12 +167,16 @@ class PipeContext(AbstractContextManager):
         :param exc_type:
         :param exc_value:
         :param traceback:
-        :return:
+        :return: False, exceptions raised in the block propagate
         """
         
         if self.context and self.context == self.old_context[-1:]:
-            self.old_context.pop()
-        return self.context
+            self._old_context = self._old_context[:-1]
+        stack = _context_stack.get()
+        if self in stack:
+            index = len(stack) - 1 - stack[::-1].index(self)
+            _context_stack.set(stack[:index] + stack[index + 1:])
+        return False
 
 
     def __str__(self):
@@ -114,6 +195,19 @@ class PipeContext(AbstractContextManager):
     #     return hash((self.context))
 
 
+    def context_values(self) -> dict:
+        """
+        Return the context variables that are set
+        :return: {variable: value}
+        """
+        values = {}
+        for var in self.VARIABLES:
+            value = getattr(self, var, None)
+            if isinstance(value, str):
+                values[var] = value
+        return values
+
+
     def context_init(self):
         if not self.context and self.drive is not None:
                 self.context = self.drive
@@ -124,18 +218,15 @@ class PipeContext(AbstractContextManager):
         """
         Evaluate a formula and return a path
         :param formula:
-        :param args: positional arguments, e.g. parent_formula
+        :param args: positional arguments, e.g. parent_formula (no longer required)
         :param kwargs: keyword_arguments to pass to PipeContext
         :return: path
         """
         
-        argv = None
-        if args:
-            argv = args
-
-        IO.debug(f"Formula               : {formula}")
-        IO.debug(f"Additional Forumlas   : {argv}")
-        IO.debug(f"Keyword Arguments     : {kwargs}")
+        started = pipe_metrics.start()
+        IO.debug("Formula               : %s", formula)
+        IO.debug("Additional Forumlas   : %s", args or None)
+        IO.debug("Keyword Arguments     : %s", kwargs)
 
         pc = cls(**kwargs)
         with pc:
@@ -148,9 +239,132 @@ class PipeContext(AbstractContextManager):
                 # Evaluate Single Path
                 _eval = pc.eval_path
                 path = _eval(formula, *args, **kwargs)
+            if started is not None:
+                label = ','.join(formula) if isinstance(formula, list) else formula
+                pipe_metrics.observe('pipe_context_get_path', label, started)
             return pc.context
 
 
+    @classmethod
+    def get_paths(cls, formula, rows, as_list=False, **kwargs):
+        """
+        Evaluate one formula for many contexts
+        :param formula: formula to evaluate
+        :param rows: iterable of kwargs dicts, or a columnar {variable: sequence} mapping
+        :param as_list: return a list instead of a generator
+        :param kwargs: keyword_arguments shared by every row, e.g. drive
+        :return: generator or list of paths
+        """
+        compiled = fm.get_registry().get_compiled(formula)
+        if compiled is None:
+            raise fm.FormulaError("Undefined formula '%s'" % formula)
+
+        # Values every row falls back to, resolved once
+        pc = cls(**kwargs)
+        defaults = {}
+        for var in compiled.variables:
+            value = kwargs.get(var)
+            if value is None:
+                value = getattr(pc, var, None)
+                if value is None and var == 'disk_type':
+                    value = compiled.disk
+            if value is not None:
+                defaults[var] = value
+        paths = resolve_paths(compiled, rows, defaults)
+        if as_list:
+            return list(paths)
+        return paths
+
+
+    @classmethod
+    def create_paths(cls, formulas, rows, max_workers=None, **kwargs):
+        """
+        Materialize a set of directory formulas for many contexts
+        :param formulas: directory formula or list of directory formulas,
+            e.g. PIPELINE.LAYOUT.ASSET
+        :param rows: iterable of kwargs dicts, or a columnar {variable: sequence} mapping
+        :param max_workers: threads issuing mkdir calls, the disk queues when None
+        :param kwargs: keyword_arguments shared by every row, e.g. drive
+        :return: pipe_fs.MaterializeReport
+        """
+        report = pipe_fs.MaterializeReport()
+        for disk, paths in cls.paths_by_disk(formulas, rows, **kwargs).items():
+            report.extend(PathContext.create_paths(paths, max_workers=max_workers, disk=disk))
+        return report
+
+
+    @classmethod
+    def paths_by_disk(cls, formulas, rows, **kwargs):
+        """
+        Resolve a set of formulas for many contexts and group the paths by disk
+        :param formulas: formula or list of formulas
+        :param rows: iterable of kwargs dicts, or a columnar {variable: sequence} mapping
+        :param kwargs: keyword_arguments shared by every row, e.g. drive
+        :return: {disk: set of paths}
+        """
+        if isinstance(formulas, str):
+            formulas = [formulas]
+        if not isinstance(rows, Mapping):
+            rows = list(rows)
+        registry = fm.get_registry()
+        groups = {}
+        for formula in formulas:
+            compiled = registry.get_compiled(formula)
+            if compiled is None:
+                raise fm.FormulaError("Undefined formula '%s'" % formula)
+            groups.setdefault(compiled.disk, set()).update(cls.get_paths(formula, rows, **kwargs))
+        return groups
+
+
+    @classmethod
+    def bind(cls, **kwargs):
+        """
+        Return a resolver specialized for a fixed set of variables
+        :param kwargs: variables that stay fixed, e.g. drive, project, asset_type
+        :return: BoundContext
+        """
+        return BoundContext(cls, **kwargs)
+
+
+    @classmethod
+    def find(cls, formula, **kwargs):
+        """
+        Return every context of a formula that exists on disk
+        :param formula: formula to enumerate, e.g. 'as_base_dir'
+        :param kwargs: known variables; leave a variable out or pass a glob ('*') to enumerate it
+        :return: list of {'formula': formula, variable: value, ..., 'path': path}; see pipe_scan
+        """
+        import pipe_scan
+        return pipe_scan.find_contexts(formula, **kwargs)
+
+
+    @classmethod
+    async def aget_path(cls, formula, **kwargs):
+        """asyncio get_path, batched with the other requests of the loop iteration; see pipe_async"""
+        import pipe_async
+        return await pipe_async.aget_path(formula, context_cls=cls, **kwargs)
+
+
+    @classmethod
+    async def aget_paths(cls, formula, rows, **kwargs):
+        """asyncio get_paths; see pipe_async"""
+        import pipe_async
+        return await pipe_async.aget_paths(formula, rows, context_cls=cls, **kwargs)
+
+
+    @classmethod
+    async def acreate_paths(cls, formulas, rows, max_workers=None, **kwargs):
+        """asyncio create_paths, creating directories on the disk queues; see pipe_async"""
+        import pipe_async
+        return await pipe_async.acreate_paths(formulas, rows, max_workers=max_workers,
+                                              context_cls=cls, **kwargs)
+
+
+    async def aexamine_path(self, path, pipe_base_dir=None, var=None):
+        """asyncio examine_path; see pipe_async"""
+        return self.examine_path(path, pipe_base_dir=pipe_base_dir, var=var)
+
+
     def eval_path(self, formula, *args, **kwargs):
         """
         Evaluate a formula and return a path object
@@ -196,16 +410,17 @@ class PipeContext(AbstractContextManager):
         """
         # Get the current set context
         current_context = self._context
-        if current_context and current_context != self._old_context[-1:]:
+        if current_context and current_context != self.old_context[-1:]:
             # Check against the new context before appending the current one.
             if context_path != current_context:
-                # Append the current context to the old context before switching
-                self._old_context.append(current_context)
+                # Append the current context to the old context before switching,
+                # copying the list so readers never see it change
+                self._old_context = self._old_context + [current_context]
         self._context = context_path
 
     @context.deleter
     def context(self):
-        base = preferences.pipe_base_dir
+        base = get_preferences().pipe_base_dir
         if base:
             self._context = base
         else:
@@ -214,40 +429,132 @@ class PipeContext(AbstractContextManager):
 
     @property
     def old_context(self) -> list:
+        # Allocated on first use, most contexts never switch
+        if self._old_context is None:
+            self._old_context = []
         return self._old_context
 
     @old_context.setter
     def old_context(self, context_path:str or list):
         if isinstance(context_path, str):
-            self._old_context.append(context_path)
+            self._old_context = self.old_context + [context_path]
         elif isinstance(context_path, list):
             self._old_context = context_path
 
 
     def examine_path(self, path, pipe_base_dir=None, var=None) -> str or dict:
         """
-        NOTE: NOT YET IMPLEMENTED
         Examine a path on disk and derive the current context
         :param path: Current Path to evaluate
-        :param pipe_base_dir: Pipeline Base Directory
-        :param var: Specific formula/path
-        :return: path_item or path_dict
+        :param pipe_base_dir: Pipeline Base Directory, inferred when None
+        :param var: Specific variable (or 'formula') to return
+        :return: path_item or path_dict, None if no formula matches
         """
         pcontext = PathContext(self)
-        # Return a Single Path
-        if var is None:
-            path_item = pcontext.examine_path(path, pipe_base_dir=pipe_base_dir, var=var)
-            return path_item
         # Return the entire Path Context
-        else:
+        if var is None:
             path_dict = pcontext.examine_path(path, pipe_base_dir=pipe_base_dir, var=var)
             return path_dict
+        # Return a Single Path Item
+        else:
+            path_item = pcontext.examine_path(path, pipe_base_dir=pipe_base_dir, var=var)
+            return path_item
             
 
+class BoundContext(object):
+    """
+    Resolver with some variables bound ahead of time. Each formula is specialized
+    once: everything that depends only on the bound variables becomes a constant
+    prefix, and resolving costs the concatenation of the remaining free slots.
+
+        bound = PipeContext.bind(drive=pipe_base_dir, project='avengers', asset_type='props')
+        bound.get_path('as_tex_dir', asset='cube')
+    """
+
+    def __init__(self, context_cls=PipeContext, **kwargs):
+        self.context_cls = context_cls
+        # PipeContext defaults (e.g. drive) are bound too, as they would be for get_path
+        self.values = context_cls(**kwargs).context_values()
+        self.values.update({key: value for key, value in kwargs.items() if value is not None})
+        self._compiled = None
+        self._roots = None
+        self._formulas = {}
+
+
+    def bind(self, **kwargs):
+        """Return a new BoundContext with additional bound variables"""
+        values = dict(self.values)
+        values.update(kwargs)
+        return BoundContext(self.context_cls, **values)
+
+
+    def formula(self, formula):
+        """Return the BoundFormula of a formula, specializing it on first use"""
+        compiled = fm.get_registry().compiled_formulas()
+        if compiled is not self._compiled or pipe_fs.DISK_ROOTS is not self._roots:
+            # The registry reloaded or the disk roots changed, drop every specialized formula
+            self._formulas = {}
+            self._compiled = compiled
+            self._roots = pipe_fs.DISK_ROOTS
+        bound = self._formulas.get(formula)
+        if bound is None:
+            if formula not in compiled:
+                raise fm.FormulaError("Undefined formula '%s'" % formula)
+            bound = self._formulas[formula] = compiled[formula].bind(self._values(compiled[formula]))
+        return bound
+
+
+    def _values(self, compiled, **kwargs):
+        """Return the bound variables, and any given ones, as the formula resolves them"""
+        values = dict(self.values)
+        values.update(kwargs)
+        if 'disk_type' in compiled.variables:
+            values.setdefault('disk_type', compiled.disk)
+        return disk_values(compiled, values)
+
+
+    def get_path(self, formula, **kwargs):
+        """
+        Evaluate a formula with the bound variables
+        :param formula: formula to evaluate
+        :param kwargs: free variables, e.g. asset
+        :return: path
+        """
+        bound = self.formula(formula)
+        for key in kwargs:
+            if key in bound.bound:
+                # Overriding a bound variable, resolve the full formula instead
+                return bound.compiled.resolve(self._values(bound.compiled, **kwargs))
+        return bound.resolve(kwargs)
+
+
+    def get_paths(self, formula, rows, as_list=False):
+        """
+        Evaluate a formula with the bound variables for many rows of free variables;
+        rows may override bound variables
+        :param formula: formula to evaluate
+        :param rows: iterable of kwargs dicts, or a columnar {variable: sequence} mapping
+        :param as_list: return a list instead of a generator
+        :return: generator or list of paths
+        """
+        bound = self.formula(formula)
+        fixed = bound.bound.keys()
+        if isinstance(rows, Mapping):
+            keys = list(rows)
+            rows = (dict(zip(keys, values)) for values in zip(*rows.values()))
+        # Rows overriding a bound variable resolve the full formula, as get_path does
+        paths = (bound.resolve(row) if fixed.isdisjoint(row)
+                 else bound.compiled.resolve(self._values(bound.compiled, **row)) for row in rows)
+        if as_list:
+            return list(paths)
+        return paths
+
+
 class PathContext(object):
     """
     this class resolves a real path on disk
     """
+    __slots__ = ('pipe_context', 'path', 'path_dict')
 
     def __init__(self, pipe_context):
         self.pipe_context = pipe_context
@@ -257,70 +564,97 @@ class PathContext(object):
 
     @staticmethod
     def create_path(path):
+        started = pipe_metrics.start()
         os.makedirs(path, exist_ok=True)
+        pipe_fs.get_stat_cache().record_dirs([path], parents=True)
+        if started is not None:
+            pipe_metrics.count('fs_makedirs')
+            pipe_metrics.observe('create_path', None, started)
+
+
+    @staticmethod
+    def create_paths(paths, max_workers=None, disk=None):
+        """
+        Create many directories, each once and parents first
+        :param paths: iterable of directory paths
+        :param max_workers: threads issuing mkdir calls, the disk queues when None
+        :param disk: PIPE_DISK of the paths, found from the disk roots when None
+        :return: pipe_fs.MaterializeReport
+        """
+        return pipe_fs.materialize(paths, max_workers=max_workers, disk=disk)
 
 
     def get_path(self, formula, *args, **kwargs):
         """
-        Return or Yield a formula path
+        Return a formula path
         :param formula: formula to evaluate
-        :param args[0]: parent_formula
+        :param args: parent formulas; no longer needed, formulas are fully expanded
         :param kwargs: keyword_arguments
         :return:
         """
 
-        # Load Formula manager
-        formula_manager = fm.FormulaManager(self.pipe_context.user)
-        if args:
-            for arg in args:
-                parent_formula = arg
-                formula_manager.get_formula(parent_formula)
-        formula_pieces = formula_manager.get_formula(formula)
-        return self._get_form_path(formula_pieces, **kwargs)
-
-
-    def _get_form_path(self, formula_pieces, **kwargs):
-        """Return a single formula using the passed in formula pieces"""
-        return self._return_path(formula_pieces, **kwargs)
+        started = pipe_metrics.start()
+
+        # Load the compiled formula from the registry
+        compiled = fm.get_registry().get_compiled(formula)
+        if compiled is None:
+            raise fm.FormulaError("Undefined formula '%s'" % formula)
+        values = disk_values(compiled, self._get_values(compiled, **kwargs))
+
+        # Check the resolution cache before resolving
+        cache = path_cache.get_resolution_cache()
+        key = path_cache.make_key(formula, values)
+        path = cache.get(key)
+        if path is path_cache.MISSING:
+            path = compiled.resolve(values)
+            cache.put(key, path)
+            if started is not None:
+                pipe_metrics.count('cache_misses', formula)
+        elif started is not None:
+            pipe_metrics.count('cache_hits', formula)
+
+        if started is not None:
+            pipe_metrics.observe('path_context_get_path', formula, started)
+        return path
 
 
-    def _return_path(self, pieces, **kwargs) -> str :
+    def _get_values(self, compiled, **kwargs) -> dict :
         """
-        Return a normalized path by pulling values of formula pieces out of a dict
-        :param path: list or set
-        :param pieces: formula pieces
-        :param y: yield
+        Return the {variable: value} dict needed to fill a compiled formula
+        :param compiled: CompiledFormula
         :param kwargs: keyword arguments
         :return:
         """
-        # Iterate over each piece
-        path = []
-        for piece in pieces:
-            # No Bracketed Values to clean, put in path
-            if not '{' in piece:
-                path.append(piece)
-                continue
-            # Regex to find all bracketed values and clean them
-            cleaned = re.findall(r'{(.*?)\}', piece, 0)
-            # Check if the cleaned value is in kwargs
-            if cleaned[0] in kwargs:
-                value = kwargs[cleaned[0]]
-                path.append(value)
-            # Check if the cleaned value is in PipeContext
-            elif cleaned[0] in self.pipe_context.__dict__.keys():
-                value = self.pipe_context.__dict__[cleaned[0]]
-                path.append(value)
-        # IO.debug("Returning Path")
-        return os.path.normpath((os.path.sep).join(path))
+        values = {}
+        for var in compiled.variables:
+            # Check if the value is in kwargs, then in PipeContext
+            value = kwargs.get(var)
+            if value is None:
+                value = getattr(self.pipe_context, var, None)
+                if value is None and var == 'disk_type':
+                    # Formulas naming their disk default to the disk they are tagged with
+                    value = compiled.disk
+            if value is not None:
+                values[var] = value
+        return values
 
 
     def examine_path(self, path, pipe_base_dir=None, var=None):
         """
-
+        Reverse resolve a path into the most specific formula that matches it
         :param path: Current context path we want to examine
-        :param pipe_base_dir: Pipeline Base Directory Path
+        :param pipe_base_dir: Pipeline Base Directory Path, defaults to the context drive
+            when the path lies under it, otherwise it is inferred
         :param var: Variable we want to examine in this path
-        :return:
+        :return: {'formula': ..., variable: value} dict, or the value of var
         """
-
-        return ""
\ No newline at end of file
+        if pipe_base_dir is None:
+            drive = getattr(self.pipe_context, 'drive', None)
+            if drive and os.path.normpath(path).startswith(os.path.normpath(drive) + sep):
+                pipe_base_dir = drive
+        path_dict = path_index.get_path_index().examine(path, drive=pipe_base_dir)
+        if var is None:
+            return path_dict
+        if path_dict is None:
+            return None
+        return path_dict.get(var)
@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Resident path-resolution service for DCC sessions and farm tasks
+
+:description:
+    ResolverServer keeps a warm formula registry, reverse index and resolution
+    cache in one long-lived process and serves get_path, get_paths and
+    examine_path over a Unix domain socket. Every message is a frame made of a
+    4-byte big-endian length followed by a compact JSON body.
+
+    ResolverClient mirrors the PipeContext API. When no daemon is listening it
+    resolves in-process instead, so tools can use it unconditionally.
+
+        python -m pipe_daemon --socket /tmp/asset_engine.sock
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import os
+import json
+import socket
+import struct
+import argparse
+import tempfile
+import threading
+import socketserver
+import path_lib as fm
+import path_cache
+import path_index
+from pipe_utils import IO
+from pipe_context import PipeContext
+
+HEADER = struct.Struct('>I')
+MAX_FRAME = 64 * 1024 * 1024
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def default_socket():
+    """Return the socket path from PIPE_DAEMON_SOCKET, or a per-user temp path"""
+    return os.environ.get('PIPE_DAEMON_SOCKET') or os.path.join(
+        tempfile.gettempdir(), 'asset_engine-%d.sock' % os.getuid())
+
+
+def send_frame(sock, message):
+    """Send one JSON message as a length-prefixed frame"""
+    body = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    sock.sendall(HEADER.pack(len(body)) + body)
+
+
+def recv_frame(sock):
+    """Receive one length-prefixed JSON message, None on a clean EOF"""
+    header = _recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    size, = HEADER.unpack(header)
+    if size > MAX_FRAME:
+        raise DaemonError("Frame of %d bytes exceeds the %d byte limit" % (size, MAX_FRAME))
+    body = _recv_exact(sock, size)
+    if body is None:
+        raise DaemonError("Connection closed mid-frame")
+    return json.loads(body.decode('utf-8'))
+
+
+def _listening(socket_path):
+    """Return True if a server accepts connections on a Unix socket"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            if chunks:
+                raise DaemonError("Connection closed mid-frame")
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def handle_request(request):
+    """
+    Execute one request dict and return the response dict
+    :param request: {'op': ..., ...}
+    :return: {'ok': True, 'result': ...} or {'ok': False, 'error': ..., 'message': ...}
+    """
+    try:
+        op = request.get('op')
+        kwargs = request.get('kwargs') or {}
+        if op == 'get_path':
+            result = PipeContext.get_path(request['formula'], *request.get('args', ()), **kwargs)
+        elif op == 'get_paths':
+            result = PipeContext.get_paths(request['formula'], request['rows'], as_list=True, **kwargs)
+        elif op == 'examine_path':
+            result = PipeContext(**kwargs).examine_path(request['path'],
+                                                        pipe_base_dir=request.get('pipe_base_dir'),
+                                                        var=request.get('var'))
+        elif op == 'ping':
+            result = 'pong'
+        elif op == 'stats':
+            result = {'cache': path_cache.get_resolution_cache().stats(),
+                      'generation': fm.get_registry().generation}
+        else:
+            raise DaemonError("Unknown operation '%s'" % op)
+    except fm.FormulaError as e:
+        return {'ok': False, 'error': 'FormulaError', 'message': str(e)}
+    except Exception as e:
+        return {'ok': False, 'error': type(e).__name__, 'message': str(e)}
+    return {'ok': True, 'result': result}
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class DaemonError(Exception):
+    """Raised for protocol errors and for failed requests on the daemon"""
+
+
+class ResolverHandler(socketserver.BaseRequestHandler):
+    """Serves framed requests on one client connection until it closes"""
+    def handle(self):
+        while True:
+            try:
+                request = recv_frame(self.request)
+            except (OSError, ValueError, DaemonError):
+                return
+            if request is None:
+                return
+            try:
+                send_frame(self.request, handle_request(request))
+            except OSError:
+                return
+
+
+class ResolverServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Threaded Unix socket server holding a warm registry, index and cache
+    :param socket_path: Unix socket to listen on, replaced if stale
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path=None):
+        self.socket_path = socket_path or default_socket()
+        if os.path.exists(self.socket_path):
+            if _listening(self.socket_path):
+                raise DaemonError("A resolver daemon is already listening on %s" % self.socket_path)
+            os.remove(self.socket_path)
+        # Warm everything before accepting the first request
+        fm.get_registry().refresh()
+        path_index.get_path_index()
+        path_cache.get_resolution_cache()
+        socketserver.UnixStreamServer.__init__(self, self.socket_path, ResolverHandler)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def serve_in_thread(self):
+        """Serve from a daemon thread and return it"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class ResolverClient(object):
+    """
+    Thin client mirroring the PipeContext resolution API
+    :param socket_path: daemon socket, defaults to default_socket()
+    :param timeout: socket timeout in seconds
+    :param fallback: resolve in-process when the daemon is unreachable
+    """
+    def __init__(self, socket_path=None, timeout=10.0, fallback=True):
+        self.socket_path = socket_path or default_socket()
+        self.timeout = timeout
+        self.fallback = fallback
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                self._sock.close()
+                self._sock = None
+
+    @property
+    def connected(self):
+        """True if the daemon is reachable"""
+        with self._lock:
+            return self._connect() is not None
+
+    def get_path(self, formula="pipe_base_dir", *args, **kwargs):
+        """Evaluate a formula and return a path, see PipeContext.get_path"""
+        request = {'op': 'get_path', 'formula': formula, 'args': list(args), 'kwargs': kwargs}
+        return self._call(request, lambda: PipeContext.get_path(formula, *args, **kwargs))
+
+    def get_paths(self, formula, rows, as_list=True, **kwargs):
+        """Evaluate one formula for many contexts, see PipeContext.get_paths"""
+        if isinstance(rows, dict):
+            rows = {key: list(values) for key, values in rows.items()}
+        else:
+            rows = list(rows)
+        return self._call({'op': 'get_paths', 'formula': formula, 'rows': rows, 'kwargs': kwargs},
+                          lambda: PipeContext.get_paths(formula, rows, as_list=True, **kwargs))
+
+    def examine_path(self, path, pipe_base_dir=None, var=None, **kwargs):
+        """Reverse resolve a path, see PipeContext.examine_path"""
+        request = {'op': 'examine_path', 'path': path, 'pipe_base_dir': pipe_base_dir,
+                   'var': var, 'kwargs': kwargs}
+        return self._call(request, lambda: PipeContext(**kwargs).examine_path(
+            path, pipe_base_dir=pipe_base_dir, var=var))
+
+    def stats(self):
+        return self._call({'op': 'stats'}, lambda: None)
+
+    def _connect(self):
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                return None
+            self._sock = sock
+        return self._sock
+
+    def _request(self, request):
+        """
+        Send a request, reconnecting once if the daemon restarted, None if unreachable.
+        Only a failed connect or send is retried: once a request is sent the daemon
+        may be working on it, so a failed receive raises instead of sending it again.
+        """
+        with self._lock:
+            for _ in range(2):
+                sock = self._connect()
+                if sock is None:
+                    return None
+                try:
+                    send_frame(sock, request)
+                except OSError:
+                    self._drop()
+                    continue
+                try:
+                    response = recv_frame(sock)
+                except (OSError, ValueError, DaemonError) as e:
+                    self._drop()
+                    raise DaemonError("No response from the resolver daemon on %s: %s"
+                                      % (self.socket_path, e)) from None
+                if response is None:
+                    self._drop()
+                    raise DaemonError("The resolver daemon on %s closed the connection"
+                                      % self.socket_path)
+                return response
+        return None
+
+    def _drop(self):
+        self._sock.close()
+        self._sock = None
+
+    def _call(self, request, local):
+        response = self._request(request)
+        if response is None:
+            if not self.fallback:
+                raise DaemonError("No resolver daemon listening on %s" % self.socket_path)
+            return local()
+        if response['ok']:
+            return response['result']
+        if response['error'] == 'FormulaError':
+            raise fm.FormulaError(response['message'])
+        raise DaemonError("%s: %s" % (response['error'], response['message']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='pipe_daemon', description="Resident path resolver")
+    parser.add_argument('--socket', default=None, help="Unix socket path")
+    args = parser.parse_args(argv)
+
+    server = ResolverServer(args.socket)
+    IO.info("Resolver listening on %s", server.socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -61,7 +61,9 @@ class PIPE_DISK(object):
     RENDER = 'render'
     STORE  = 'store'
     WORK   = 'work'
-    ALL    = [CODE, CONFIG, DATA, STORE, WORK]
+    ALL    = [CODE, CONFIG, DATA, RENDER, STORE, WORK]
+    # Disk of formulas that are not tagged and extend no tagged formula
+    DEFAULT = WORK
 
     @classmethod
     def get_all(cls):
@@ -99,12 +101,23 @@ RigTypes = enum(ANI='ani_rig',
                 LIT='lit_rig')
 
 
+class PIPE_LAYOUT:
+    """Directory formulas making up the standard layout of a new entity"""
+    PROJECT = ['pr_base_dir', 'pr_as_dir', 'pr_data_dir', 'pr_thumb_dir']
+    ASSET   = ['as_base_dir', 'as_ass_dir', 'as_dyn_dir',
+               'as_surf_dir', 'as_tex_dir', 'as_sbs_dir', 'as_mdl_dir', 'as_mtlx_dir',
+               'as_geo_dir', 'as_geo_fbx_dir', 'as_geo_obj_dir', 'as_geo_abc_dir',
+               'as_data_dir', 'as_thumb_dir']
+
+
 class PIPELINE:
+    VERSION = '0.2.0'
     _pipe_base = PIPE_OS()
     OS = _pipe_base.os
     DRIVE = _pipe_base.drive
     DISC = PIPE_DISC
     DISK = PIPE_DISK
+    LAYOUT = PIPE_LAYOUT
 
 
 class FileSize:
@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Incremental content fingerprints of asset directories
+
+:description:
+    Fingerprinter computes a digest for every file of a directory tree and
+    Merkle-style digests for every directory: a directory's digest covers the
+    names, kinds and digests of its entries, so two trees with the same root
+    digest have the same content.
+
+        with Fingerprinter(drive='/mnt/pipeline') as fingerprinter:
+            prints = fingerprinter.fingerprint_context(project='avengers', asset_type='props', asset='cube')
+        prints['as_geo_dir'].digest
+        diff(last_night['as_geo_dir'], prints['as_geo_dir'])   # TreeDiff(added, removed, changed)
+
+    File digests are stored in fingerprints.sqlite, next to the asset index,
+    with the (size, mtime, inode) they were computed at; a file whose stat
+    still matches is not read again. Files of at least PROCESS_THRESHOLD bytes
+    are hashed on a process pool with memory-mapped, chunked reads, smaller
+    ones on the worker queue of their disk.
+
+    diff() only descends into directories whose digests differ, so comparing
+    two snapshots, or the same formula for two assets, costs the size of the
+    change. Fingerprint.save() and Fingerprint.load() keep snapshots as JSON.
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import os
+import mmap
+import json
+import stat
+import hashlib
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import path_lib as fm
+import pipe_fs
+import pipe_index
+import pipe_metrics
+
+FINGERPRINT_FILE = 'fingerprints.sqlite'
+
+# Directory formulas fingerprinted by fingerprint_context
+FORMULAS = ('as_geo_dir', 'as_surf_dir', 'as_tex_dir')
+
+DIGEST_SIZE = 20
+CHUNK_SIZE = 8 * 1024 * 1024
+# Files from this size on are memory-mapped instead of read in one call
+MMAP_THRESHOLD = 64 * 1024
+# Files from this size on are hashed on the process pool
+PROCESS_THRESHOLD = 4 * 1024 * 1024
+
+# Entry kinds recorded in directory digests
+FILE, DIRECTORY, LINK = 'f', 'd', 'l'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+"""
+
+# Relative paths, '/' separated, found only in the old tree, only in the new one, or in both
+# with different content or kind
+TreeDiff = namedtuple('TreeDiff', ('added', 'removed', 'changed'))
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def file_digest(path, chunk_size=CHUNK_SIZE):
+    """
+    Return the digest of a file's content, memory-mapping large files and hashing
+    them chunk by chunk
+    :param path: file path
+    :param chunk_size: bytes hashed per update
+    :return: hex digest
+    """
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(path, 'rb') as fh:
+        if os.fstat(fh.fileno()).st_size < MMAP_THRESHOLD:
+            digest.update(fh.read())
+        else:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    for offset in range(0, len(view), chunk_size):
+                        digest.update(view[offset:offset + chunk_size])
+    return digest.hexdigest()
+
+
+def _file_digest(path):
+    """Process pool job: (path, digest), digest None when the file can't be read"""
+    try:
+        return path, file_digest(path)
+    except (OSError, ValueError):
+        return path, None
+
+
+def directory_digest(entries):
+    """
+    Return the Merkle digest of a directory
+    :param entries: {name: (kind, digest)} of its entries
+    :return: hex digest
+    """
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for name in sorted(entries):
+        kind, entry_digest = entries[name]
+        digest.update(('%s %s\0%s\n' % (kind, name, entry_digest)).encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
+
+
+def _join(relative, name):
+    return '%s/%s' % (relative, name) if relative else name
+
+
+def diff(old, new):
+    """
+    Compare two fingerprints, descending only into directories whose digests differ
+    :param old: Fingerprint
+    :param new: Fingerprint
+    :return: TreeDiff of sorted relative paths
+    """
+    added, removed, changed = [], [], []
+    pending = ['']
+    while pending:
+        relative = pending.pop()
+        if old.digests.get(relative) == new.digests.get(relative):
+            continue
+        old_entries = old.children.get(relative)
+        new_entries = new.children.get(relative)
+        if old_entries is None or new_entries is None:
+            changed.append(relative)
+            continue
+        for name in set(old_entries) | set(new_entries):
+            path = _join(relative, name)
+            if name not in new_entries:
+                removed.append(path)
+            elif name not in old_entries:
+                added.append(path)
+            elif old_entries[name] == new_entries[name] == DIRECTORY:
+                pending.append(path)
+            elif old_entries[name] != new_entries[name] or old.digests[path] != new.digests[path]:
+                changed.append(path)
+    return TreeDiff(sorted(added), sorted(removed), sorted(changed))
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class Fingerprint(object):
+    """
+    Digests of a file or directory tree
+    :param root: fingerprinted path
+    :param digests: {relative path: digest}, '' for the root and '/' separated below it
+    :param children: {relative directory path: {name: kind}}
+    """
+    def __init__(self, root, digests, children, hashed=0, reused=0):
+        self.root = root
+        self.digests = digests
+        self.children = children
+        self.hashed = hashed
+        self.reused = reused
+
+    def __repr__(self):
+        return "Fingerprint(%r, %s)" % (self.root, self.digest)
+
+    def __eq__(self, other):
+        return isinstance(other, Fingerprint) and self.digest == other.digest
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    @property
+    def digest(self):
+        return self.digests.get('')
+
+    def diff(self, other):
+        """Return the TreeDiff from this fingerprint to another"""
+        return diff(self, other)
+
+    def save(self, file_location):
+        """Write the fingerprint as a JSON snapshot"""
+        with open(file_location, 'w') as fh:
+            json.dump({'root': self.root, 'digests': self.digests, 'children': self.children}, fh)
+
+    @classmethod
+    def load(cls, file_location):
+        """Read a JSON snapshot written by save()"""
+        with open(file_location, 'r') as fh:
+            data = json.load(fh)
+        return cls(data['root'], data['digests'], data['children'])
+
+
+class Fingerprinter(object):
+    """
+    Computes fingerprints, reusing the stored digests of unchanged files
+    :param cache_file: SQLite file, fingerprints.sqlite in the default index location when None
+    :param drive: pipeline base drive used by fingerprint_context and the default location
+    :param project: put the default location in this project's data dir
+    :param max_workers: processes hashing large files, os.cpu_count() when None
+    :param process_threshold: files from this size on are hashed on the process pool
+    :param wal: use write-ahead logging, only safe on a local disk; pipe_index.WAL when None
+    """
+    def __init__(self, cache_file=None, drive=None, project=None, max_workers=None,
+                 process_threshold=PROCESS_THRESHOLD, wal=None):
+        self.drive = drive
+        self.max_workers = max_workers
+        self.process_threshold = process_threshold
+        self.cache_file = cache_file or pipe_index.default_index_file(drive, project, FINGERPRINT_FILE)
+        directory = os.path.dirname(self.cache_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._db = pipe_index.connect(self.cache_file, wal)
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self._db.close()
+
+    def fingerprint_context(self, formulas=FORMULAS, **kwargs):
+        """
+        Fingerprint the directories of some formulas for one context
+        :param formulas: directory formulas, e.g. ('as_geo_dir', 'as_surf_dir')
+        :param kwargs: context variables, e.g. project, asset_type, asset
+        :return: {formula: Fingerprint, or None when the directory doesn't exist}
+        """
+        from pipe_context import PipeContext
+        if self.drive and 'drive' not in kwargs:
+            kwargs['drive'] = self.drive
+        registry = fm.get_registry()
+        fingerprints = {}
+        for formula in formulas:
+            compiled = registry.get_compiled(formula)
+            if compiled is None:
+                raise fm.FormulaError("Undefined formula '%s'" % formula)
+            path = PipeContext.get_path(formula, **kwargs)
+            fingerprints[formula] = self.fingerprint(path, disk=compiled.disk) if os.path.lexists(path) else None
+        return fingerprints
+
+    def fingerprint(self, path, disk=None):
+        """
+        Fingerprint a file or directory tree
+        :param path: file or directory
+        :param disk: PIPE_DISK whose worker queue lists directories, found from the disk roots when None
+        :return: Fingerprint
+        """
+        root = os.path.normpath(path)
+        files, children = self._walk(root, disk)
+        stored = self._load(root)
+
+        digests = {}
+        pending = []
+        for relative, (full, size, mtime_ns, inode) in files.items():
+            known = stored.get(full)
+            if known is not None and known[:3] == (size, mtime_ns, inode):
+                digests[relative] = known[3]
+            else:
+                pending.append((relative, full, size))
+        reused = len(digests)
+        computed = self._hash(pending, disk)
+        for relative, full, _ in pending:
+            digests[relative] = computed.get(full) or ''
+
+        # Directory digests, deepest first
+        for relative in sorted(children, key=lambda relative: relative.count('/') if relative else -1,
+                               reverse=True):
+            digests[relative] = directory_digest({
+                name: (kind, digests.get(_join(relative, name), ''))
+                for name, kind in children[relative].items()})
+
+        self._save(root, stored, files, computed)
+        pipe_metrics.count('fingerprint_hashed_files', None, len(pending))
+        pipe_metrics.count('fingerprint_reused_files', None, reused)
+        return Fingerprint(root, digests, children, hashed=len(pending), reused=reused)
+
+    def _walk(self, root, disk):
+        """
+        List a tree level by level
+        :return: ({relative file path: (path, size, mtime_ns, inode)}, {relative dir path: {name: kind}})
+        """
+        files = {}
+        children = {}
+        try:
+            st = os.stat(root, follow_symlinks=False)
+        except OSError:
+            return files, children
+        if not stat.S_ISDIR(st.st_mode):
+            files[''] = (root, st.st_size, st.st_mtime_ns, st.st_ino)
+            return files, children
+
+        frontier = [('', root)]
+        with pipe_fs.worker_pool(disk) as pool:
+            while frontier:
+                paths = dict((full, relative) for relative, full in frontier)
+                frontier = []
+                for full, entries in pool(self._list, list(paths)):
+                    relative = paths[full]
+                    children[relative] = kinds = {}
+                    for name, kind, size, mtime_ns, inode in entries:
+                        kinds[name] = kind
+                        child = _join(relative, name)
+                        if kind == DIRECTORY:
+                            frontier.append((child, os.path.join(full, name)))
+                        else:
+                            files[child] = (os.path.join(full, name), size, mtime_ns, inode)
+        return files, children
+
+    @staticmethod
+    def _list(path):
+        """Return (path, [(name, kind, size, mtime_ns, inode), ...]) for a directory"""
+        pipe_metrics.count('fs_scandir')
+        entries = []
+        try:
+            with os.scandir(path) as scan:
+                for entry in scan:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if stat.S_ISDIR(st.st_mode):
+                        kind = DIRECTORY
+                    elif stat.S_ISLNK(st.st_mode):
+                        kind = LINK
+                    elif stat.S_ISREG(st.st_mode):
+                        kind = FILE
+                    else:
+                        continue
+                    entries.append((entry.name, kind, st.st_size, st.st_mtime_ns, st.st_ino))
+        except OSError:
+            pass
+        return path, entries
+
+    def _hash(self, pending, disk):
+        """Hash files: large ones on the process pool, the others on the disk queue"""
+        computed = {}
+        large = [full for _, full, size in pending if size >= self.process_threshold]
+        small = [full for _, full, size in pending if size < self.process_threshold]
+        futures = []
+        if large:
+            futures = [self._process_pool().submit(_file_digest, full) for full in large]
+        if small:
+            with pipe_fs.worker_pool(disk) as pool:
+                computed.update(pool(self._digest, small))
+        computed.update(future.result() for future in futures)
+        return computed
+
+    @staticmethod
+    def _digest(path):
+        if os.path.islink(path):
+            return path, hashlib.blake2b(os.readlink(path).encode('utf-8', 'surrogateescape'),
+                                         digest_size=DIGEST_SIZE).hexdigest()
+        return _file_digest(path)
+
+    def _process_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.max_workers)
+            return self._pool
+
+    def _load(self, root):
+        """Return the stored {path: (size, mtime_ns, inode, digest)} of every file under root"""
+        prefix = os.path.join(root, '')
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT path, size, mtime_ns, inode, digest FROM digests '
+                'WHERE path = ? OR (path > ? AND path < ?)',
+                (root, prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)))
+            return {row[0]: tuple(row[1:]) for row in rows}
+
+    def _save(self, root, stored, files, computed):
+        """Store the digests computed and drop the files that are gone"""
+        present = {full for full, _, _, _ in files.values()}
+        gone = [(path,) for path in stored if path not in present]
+        rows = [(full, size, mtime_ns, inode, computed[full])
+                for full, size, mtime_ns, inode in files.values() if computed.get(full)]
+        with self._lock, self._db:
+            self._db.executemany('DELETE FROM digests WHERE path = ?', gone)
+            self._db.executemany('INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?)', rows)
@@ -0,0 +1,588 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Bulk filesystem operations on resolved paths
+
+:description:
+    materialize() collapses any number of directory paths into the minimal tree
+    of directories that may need creating and creates each one exactly once,
+    parent-first, one depth level at a time on a bounded thread pool. Ancestors
+    that already exist are found with a handful of stats instead of one per path.
+
+    StatCache remembers which paths exist, for a few seconds (TTL), and which do
+    not, for a shorter time (negative caching), so repeated existence checks on
+    a network filesystem cost nothing. exists_many() checks a batch of paths on a
+    thread pool, listing each parent directory once with scandir when several of
+    its children are asked for. Directory creation and formula scans update the
+    process-wide cache as they go.
+
+        pipe_fs.exists_many([thumb, dna, geo_dir])   # [True, False, True]
+        pipe_fs.get_stat_cache().configure(ttl=30, negative_ttl=5)
+
+    Each PIPE_DISK can have its own storage root, which replaces 'drive' for
+    the formulas tagged with that disk, and has its own bounded worker queue.
+    Filesystem work is routed to the queue of the disk it touches, so a slow
+    render volume only backs up render traffic. Roots are set with
+    configure_disk() or the PIPE_DISK_ROOTS environment variable, e.g.
+    'render=/mnt/render:config=/srv/pipeline_config' (os.pathsep separated).
+
+        pipe_fs.configure_disk('render', root='/mnt/render', max_workers=4)
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import os
+import stat
+import time
+import functools
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import pipe_metrics
+from pipe_utils import IO
+from pipe_enums import PIPE_DISK
+
+MAX_WORKERS = 8
+
+# Jobs a disk queue holds, running or waiting, per worker thread; submitting
+# more blocks the caller until the disk catches up
+QUEUE_DEPTH = 4
+
+# Seconds a cached stat stays valid, for paths that exist and paths that don't
+STAT_TTL = 5.0
+NEGATIVE_TTL = 1.0
+
+MISSING = object()
+
+_stat_cache = None
+_stat_cache_lock = threading.Lock()
+
+# {disk: storage root}, replaced as a whole on every change
+DISK_ROOTS = {}
+_disk_workers = {}
+_disk_queues = {}
+_disk_lock = threading.Lock()
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def existing_anchor(paths):
+    """
+    Return the deepest existing directory that contains every path, or None
+    :param paths: normalized paths
+    :return: directory path or None
+    """
+    try:
+        anchor = os.path.commonpath(paths)
+    except ValueError:
+        # Mixed absolute/relative paths or drives share no common directory
+        return None
+    while anchor and not os.path.isdir(anchor):
+        pipe_metrics.count('fs_stat')
+        parent = os.path.dirname(anchor)
+        if parent == anchor:
+            return None
+        anchor = parent
+    pipe_metrics.count('fs_stat')
+    return anchor or None
+
+
+def plan_tree(paths):
+    """
+    Collapse paths into the directories to create, grouped parent-first by depth
+    :param paths: iterable of directory paths
+    :return: (anchor, [[directories at depth n], [directories at depth n + 1], ...])
+    """
+    targets = {os.path.normpath(path) for path in paths}
+    if not targets:
+        return None, []
+    anchor = existing_anchor(list(targets))
+
+    tree = set()
+    for path in targets:
+        while path and path != anchor and path not in tree:
+            tree.add(path)
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+
+    levels = {}
+    for path in tree:
+        levels.setdefault(path.count(os.path.sep), []).append(path)
+    return anchor, [sorted(levels[depth]) for depth in sorted(levels)]
+
+
+def materialize(paths, max_workers=None, disk=None):
+    """
+    Create every directory in paths, each directory once and parents first
+    :param paths: iterable of directory paths
+    :param max_workers: threads issuing mkdir calls, the disk queues when None
+    :param disk: PIPE_DISK of the paths, found from the disk roots when None
+    :return: MaterializeReport
+    """
+    targets = {os.path.normpath(path) for path in paths}
+    if disk is None and DISK_ROOTS:
+        groups = {}
+        for path in targets:
+            groups.setdefault(path_disk(path), set()).add(path)
+        if len(groups) > 1:
+            report = MaterializeReport()
+            for disk, group in groups.items():
+                report.extend(materialize(group, max_workers, disk))
+            return report
+    anchor, levels = plan_tree(targets)
+    report = MaterializeReport()
+    if anchor in targets:
+        report.existing.append(anchor)
+
+    def _mkdir(path):
+        pipe_metrics.count('fs_mkdir')
+        try:
+            os.mkdir(path)
+        except FileExistsError:
+            return path, False, None
+        except OSError as e:
+            return path, False, e
+        return path, True, None
+
+    with worker_pool(disk, max_workers) as pool:
+        for level in levels:
+            # Children of directories that failed can't be created either
+            pending = []
+            for path in level:
+                error = report.failed.get(os.path.dirname(path))
+                if error is None:
+                    pending.append(path)
+                else:
+                    report.failed[path] = error
+            for path, created, error in pool(_mkdir, pending):
+                if error is not None:
+                    report.failed[path] = error
+                elif created:
+                    report.created.append(path)
+                else:
+                    report.existing.append(path)
+    cache = get_stat_cache()
+    cache.record_dirs(report.created)
+    cache.record_dirs(report.existing)
+    return report
+
+
+def get_stat_cache():
+    """Return the process-wide StatCache"""
+    global _stat_cache
+    if _stat_cache is None:
+        with _stat_cache_lock:
+            if _stat_cache is None:
+                _stat_cache = StatCache()
+    return _stat_cache
+
+
+def exists(path):
+    """Return True if a path exists, through the process-wide StatCache"""
+    return get_stat_cache().exists(path)
+
+
+def isdir(path):
+    """Return True if a path is a directory, through the process-wide StatCache"""
+    return get_stat_cache().isdir(path)
+
+
+def exists_many(paths, max_workers=None, disk=None):
+    """
+    Check whether many paths exist, through the process-wide StatCache
+    :param paths: iterable of paths
+    :param max_workers: threads issuing stat and scandir calls, the disk queues when None
+    :param disk: PIPE_DISK of the paths, found from the disk roots when None
+    :return: list of bools, in the order of paths
+    """
+    return get_stat_cache().exists_many(paths, max_workers=max_workers, disk=disk)
+
+
+def _check_disk(disk):
+    if disk not in PIPE_DISK.ALL:
+        raise ValueError("Unknown disk type '%s', expected one of %s" % (disk, ', '.join(PIPE_DISK.ALL)))
+
+
+def configure_disk(disk, root=MISSING, max_workers=None):
+    """
+    Set the storage root and/or worker count of a disk
+    :param disk: PIPE_DISK value, e.g. 'render'
+    :param root: storage root replacing 'drive' for the disk's formulas, None to use 'drive'
+    :param max_workers: worker threads of the disk queue
+    """
+    global DISK_ROOTS
+    _check_disk(disk)
+    with _disk_lock:
+        if root is not MISSING:
+            roots = dict(DISK_ROOTS)
+            if root is None:
+                roots.pop(disk, None)
+            else:
+                roots[disk] = os.path.normpath(root)
+            DISK_ROOTS = roots
+        if max_workers is not None and max_workers != _disk_workers.get(disk, MAX_WORKERS):
+            _disk_workers[disk] = max_workers
+            queue = _disk_queues.pop(disk, None)
+            if queue is not None:
+                queue.shutdown()
+
+
+def get_disk_root(disk):
+    """Return the storage root of a disk, or None when it uses 'drive'"""
+    return DISK_ROOTS.get(disk)
+
+
+def path_disk(path):
+    """Return the disk whose storage root holds a path, PIPE_DISK.DEFAULT when none does"""
+    path = os.path.normpath(path)
+    found, length = PIPE_DISK.DEFAULT, -1
+    for disk, root in DISK_ROOTS.items():
+        if len(root) > length and (path == root or path.startswith(os.path.join(root, ''))):
+            found, length = disk, len(root)
+    return found
+
+
+def get_disk_queue(disk):
+    """Return the worker queue of a disk, creating it on first use"""
+    queue = _disk_queues.get(disk)
+    if queue is None:
+        _check_disk(disk)
+        with _disk_lock:
+            queue = _disk_queues.get(disk)
+            if queue is None:
+                queue = _disk_queues[disk] = DiskQueue(disk, _disk_workers.get(disk, MAX_WORKERS))
+    return queue
+
+
+def map_on_disks(func, paths, disk=None):
+    """
+    Call func(path) for every path on the queue of its disk
+    :param func: callable taking a path
+    :param paths: iterable of paths
+    :param disk: PIPE_DISK of every path, found from the disk roots when None
+    :return: list of results, in the order of paths
+    """
+    futures = [get_disk_queue(disk or path_disk(path)).submit(func, path) for path in paths]
+    return [future.result() for future in futures]
+
+
+@contextmanager
+def worker_pool(disk=None, max_workers=None):
+    """
+    Yield a map(func, paths) -> list running the calls on worker threads: a private
+    pool of max_workers threads when given, else the disk queues
+    :param disk: PIPE_DISK of the paths, found from the disk roots when None
+    :param max_workers: threads of a private pool, None to use the disk queues
+    """
+    if max_workers:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            yield lambda func, paths: list(pool.map(func, paths))
+    else:
+        yield functools.partial(map_on_disks, disk=disk)
+
+
+def _load_disk_roots():
+    """
+    Read storage roots from PIPE_DISK_ROOTS, 'disk=root' pairs separated by os.pathsep.
+    Runs at import, so bad entries are skipped with a warning instead of raising.
+    """
+    for item in filter(None, os.environ.get('PIPE_DISK_ROOTS', '').split(os.pathsep)):
+        disk, _, root = item.partition('=')
+        try:
+            configure_disk(disk.strip(), root=root.strip() or None)
+        except ValueError as e:
+            IO.warning("Ignoring PIPE_DISK_ROOTS entry '%s': %s", item, e)
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class MaterializeReport(object):
+    """
+    Outcome of materialize(): directories created, already present, and failed
+    """
+    def __init__(self):
+        self.created = []
+        self.existing = []
+        self.failed = {}
+
+    def __repr__(self):
+        return "MaterializeReport(created=%d, existing=%d, failed=%d)" % (
+            len(self.created), len(self.existing), len(self.failed))
+
+    def extend(self, other):
+        """Add the outcome of another report"""
+        self.created.extend(other.created)
+        self.existing.extend(other.existing)
+        self.failed.update(other.failed)
+
+    @property
+    def ok(self):
+        return not self.failed
+
+
+class DiskQueue(object):
+    """
+    Bounded worker queue of one disk: max_workers threads and at most
+    QUEUE_DEPTH jobs per thread, running or waiting. submit() blocks while the
+    queue is full. Jobs must not wait on jobs of their own queue.
+    :param disk: PIPE_DISK value
+    :param max_workers: worker threads
+    """
+    def __init__(self, disk, max_workers=MAX_WORKERS):
+        self.disk = disk
+        self.max_workers = max_workers
+        self._slots = threading.BoundedSemaphore(max_workers * QUEUE_DEPTH)
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='pipe_fs_%s' % disk)
+
+    def __repr__(self):
+        return "DiskQueue(%r, max_workers=%d)" % (self.disk, self.max_workers)
+
+    def submit(self, func, *args, **kwargs):
+        """Queue a call, waiting for a free slot; return its Future"""
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        self._slots.release()
+
+    def shutdown(self):
+        """Stop the workers once the queued jobs are done"""
+        self._executor.shutdown(wait=False)
+
+
+class StatCache(object):
+    """
+    Cache of path existence with TTL and negative caching
+    :param ttl: seconds an existing path stays cached, 0 disables caching
+    :param negative_ttl: seconds a missing path stays cached, 0 disables negative caching
+    :param maxsize: maximum number of entries, the oldest are dropped first
+    """
+    def __init__(self, ttl=STAT_TTL, negative_ttl=NEGATIVE_TTL, maxsize=100000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # {normalized path: (state, expires)}, insertion ordered, oldest first; the state
+        # is True for a directory, False for any other existing path, None if missing
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def configure(self, ttl=None, negative_ttl=None, maxsize=None):
+        """Change the TTLs and/or size of the cache; entries already cached keep their expiry"""
+        with self._lock:
+            if ttl is not None:
+                self.ttl = ttl
+            if negative_ttl is not None:
+                self.negative_ttl = negative_ttl
+            if maxsize is not None:
+                self.maxsize = maxsize
+            while len(self._entries) > self.maxsize:
+                del self._entries[next(iter(self._entries))]
+
+    def exists(self, path):
+        return self.state(path) is not None
+
+    def isdir(self, path):
+        return self.state(path) is True
+
+    def isfile(self, path):
+        return self.state(path) is False
+
+    def state(self, path):
+        """
+        Return the cached or freshly stat'ed state of a path
+        :param path: path
+        :return: True for a directory, False for another existing path, None if missing
+        """
+        path = os.path.normpath(path)
+        state = self._get(path, time.monotonic())
+        if state is MISSING:
+            state = self._stat(path)
+        return state
+
+    def exists_many(self, paths, max_workers=None, disk=None):
+        """
+        Check whether many paths exist. Uncached paths are grouped by parent
+        directory: a directory holding several of them is listed once with scandir,
+        the others are stat'ed, all on worker threads.
+        :param paths: iterable of paths
+        :param max_workers: threads issuing stat and scandir calls, the disk queues when None
+        :param disk: PIPE_DISK of the paths, found from the disk roots when None
+        :return: list of bools, in the order of paths
+        """
+        paths = [os.path.normpath(path) for path in paths]
+        now = time.monotonic()
+        states = {}
+        groups = {}
+        for path in paths:
+            if path in states:
+                continue
+            state = self._get(path, now)
+            if state is MISSING:
+                parent = os.path.dirname(path)
+                groups.setdefault(parent if parent != path else None, set()).add(path)
+            else:
+                states[path] = state
+
+        stats = [path for parent, group in groups.items() if parent is None or len(group) == 1
+                 for path in group]
+        scans = [parent for parent, group in groups.items() if parent is not None and len(group) > 1]
+        if len(stats) + len(scans) > 1:
+            with worker_pool(disk, max_workers) as pool:
+                listings = dict(zip(scans, pool(self._scan, scans)))
+                states.update(zip(stats, pool(self._stat, stats)))
+        else:
+            listings = {parent: self._scan(parent) for parent in scans}
+            states.update((path, self._stat(path)) for path in stats)
+
+        negative = []
+        for parent, listing in listings.items():
+            if listing is MISSING:
+                states.update((path, self._stat(path)) for path in groups[parent])
+                continue
+            for path in groups[parent]:
+                state = None if listing is None else listing.get(os.path.basename(path))
+                states[path] = state
+                if state is None:
+                    negative.append(path)
+        self._put([(path, None) for path in negative])
+        return [states[path] is not None for path in paths]
+
+    def record_listing(self, directory, entries):
+        """
+        Record a directory listing: the directory and every entry exist
+        :param directory: listed directory
+        :param entries: [(name, is_dir), ...]
+        """
+        directory = os.path.normpath(directory or os.curdir)
+        if directory == os.curdir:
+            items = [(name, is_dir) for name, is_dir in entries]
+        else:
+            items = [(os.path.join(directory, name), is_dir) for name, is_dir in entries]
+        items.append((directory, True))
+        self._put(items)
+
+    def record_dirs(self, paths, parents=False):
+        """
+        Record directories that are known to exist, e.g. just created
+        :param paths: iterable of directory paths
+        :param parents: also record every parent directory
+        """
+        items = {}
+        for path in paths:
+            path = os.path.normpath(path)
+            while path not in items:
+                items[path] = True
+                parent = os.path.dirname(path)
+                if not parents or not parent or parent == path:
+                    break
+                path = parent
+        self._put(list(items.items()))
+
+    def invalidate(self, path=None):
+        """Drop a path and everything cached below it, or every entry if path is None"""
+        with self._lock:
+            if path is None:
+                self._entries = {}
+                return
+            path = os.path.normpath(path)
+            prefix = os.path.join(path, '')
+            self._entries = {key: entry for key, entry in self._entries.items()
+                             if key != path and not key.startswith(prefix)}
+
+    def clear(self):
+        """Drop every entry and reset the hit/miss counters"""
+        with self._lock:
+            self._entries = {}
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return a dict of cache counters"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'negative_ttl': self.negative_ttl,
+        }
+
+    def _get(self, path, now):
+        entry = self._entries.get(path)
+        if entry is not None and entry[1] > now:
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return MISSING
+
+    def _put(self, items):
+        """Store [(normalized path, state), ...]"""
+        now = time.monotonic()
+        positive = now + self.ttl if self.ttl else None
+        negative = now + self.negative_ttl if self.negative_ttl else None
+        with self._lock:
+            entries = self._entries
+            for path, state in items:
+                expires = negative if state is None else positive
+                # Re-inserting moves the path to the young end
+                entries.pop(path, None)
+                if expires is not None:
+                    entries[path] = (state, expires)
+            while len(entries) > self.maxsize:
+                del entries[next(iter(entries))]
+
+    def _stat(self, path):
+        """Stat one path and cache its state"""
+        pipe_metrics.count('fs_stat')
+        try:
+            state = stat.S_ISDIR(os.stat(path).st_mode)
+        except (OSError, ValueError):
+            state = None
+        self._put([(path, state)])
+        return state
+
+    def _scan(self, directory):
+        """List a directory and cache its entries; return {name: is_dir}, or None if it is missing"""
+        pipe_metrics.count('fs_scandir')
+        try:
+            with os.scandir(directory or os.curdir) as entries:
+                listing = {entry.name: entry.is_dir() for entry in entries}
+        except FileNotFoundError:
+            self._put([(directory, None)])
+            return None
+        except NotADirectoryError:
+            self._put([(directory, False)])
+            return None
+        except OSError:
+            # e.g. no read permission: the children may still be stat'ed
+            return MISSING
+        self.record_listing(directory, listing.items())
+        return listing
+
+
+_load_disk_roots()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Persistent SQLite index of the contexts that exist on disk
+
+:description:
+    AssetIndex keeps the contexts found by formula scans (pipe_scan) and by
+    examine_path in a local SQLite file, by default asset_index.sqlite in the
+    pipeline's 'pipe_data_dir' (or the project's 'pr_data_dir'). Questions such as
+    "which props exist in avengers" become an indexed query instead of a walk.
+
+        index = AssetIndex(drive='/mnt/pipeline')
+        index.refresh('as_base_dir', project='avengers')
+        index.query(project='avengers', asset_type='props')
+
+    Every directory listing a scan makes is stored with the directory's mtime.
+    A refresh lists a directory again only when its mtime changed; unchanged
+    directories cost one stat and are answered from the index.
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import os
+import json
+import sqlite3
+import threading
+import path_lib as fm
+import path_index
+import pipe_metrics
+import pipe_scan
+
+INDEX_FILE = 'asset_index.sqlite'
+
+# Write-ahead logging needs shared memory and byte-range locks that NFS and SMB
+# don't provide, so the stores keep SQLite's rollback journal unless told their
+# data dir is on a local disk
+WAL = os.environ.get('PIPE_INDEX_WAL', '').lower() in ('1', 'true', 'yes')
+
+# Variables stored in their own indexed columns; every variable is in 'context'
+COLUMNS = ('drive', 'project', 'asset_type', 'asset')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS contexts (
+    path TEXT PRIMARY KEY,
+    formula TEXT NOT NULL,
+    drive TEXT,
+    project TEXT,
+    asset_type TEXT,
+    asset TEXT,
+    context TEXT NOT NULL,
+    mtime REAL
+);
+CREATE INDEX IF NOT EXISTS contexts_asset ON contexts (project, asset_type, asset);
+CREATE INDEX IF NOT EXISTS contexts_formula ON contexts (formula, project);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    PRIMARY KEY (dir, name)
+) WITHOUT ROWID;
+"""
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def default_index_file(drive=None, project=None, file_name=INDEX_FILE):
+    """
+    Return the default index location: the project's 'pr_data_dir' when a project
+    is given, otherwise the pipeline's 'pipe_data_dir'
+    :param drive: pipeline base drive, the PipeContext default when None
+    :param project: project name
+    :param file_name: index file name
+    :return: path
+    """
+    from pipe_context import PipeContext
+    kwargs = {'drive': drive} if drive else {}
+    if project:
+        return os.path.join(PipeContext.get_path('pr_data_dir', project=project, **kwargs), file_name)
+    return os.path.join(PipeContext.get_path('pipe_data_dir', **kwargs), file_name)
+
+
+def connect(file_location, wal=None):
+    """
+    Open one of the SQLite stores kept in the data dirs
+    :param file_location: SQLite file
+    :param wal: use write-ahead logging, only safe on a local disk; WAL when None
+    :return: sqlite3.Connection
+    """
+    db = sqlite3.connect(file_location, check_same_thread=False)
+    if WAL if wal is None else wal:
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+    else:
+        # A file last opened in WAL mode stays in it until switched back
+        db.execute('PRAGMA journal_mode=DELETE')
+    return db
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class AssetIndex(object):
+    """
+    SQLite index of existing contexts
+    :param index_file: SQLite file, default_index_file(drive, project) when None
+    :param drive: pipeline base drive used by scans and the default location
+    :param project: put the default location in this project's data dir
+    :param wal: use write-ahead logging, only safe on a local disk; pipe_index.WAL when None
+    """
+    def __init__(self, index_file=None, drive=None, project=None, wal=None):
+        self.drive = drive
+        self.index_file = index_file or default_index_file(drive, project)
+        directory = os.path.dirname(self.index_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = connect(self.index_file, wal)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        self._db.close()
+
+    def refresh(self, formula, max_workers=None, **bound):
+        """
+        Scan a formula and replace its indexed contexts matching the bound variables
+        :param formula: formula to scan, e.g. 'as_base_dir'
+        :param max_workers: threads listing directories, the formula's disk queue when None
+        :param bound: known variables; left out or globbed variables are enumerated
+        :return: number of contexts found
+        """
+        compiled = fm.get_registry().get_compiled(formula)
+        if compiled is None:
+            raise fm.FormulaError("Undefined formula '%s'" % formula)
+        if self.drive and 'drive' not in bound:
+            bound['drive'] = self.drive
+        lister = IndexLister(self)
+        contexts = pipe_scan.FormulaScan(compiled, lister, max_workers).find(**bound)
+
+        where, args = self._where(formula=formula, **{
+            key: value for key, value in bound.items() if key in COLUMNS})
+        with self._lock:
+            known = dict(self._db.execute('SELECT path, mtime FROM contexts' + where, args))
+        rows = []
+        for context in contexts:
+            path = context['path']
+            if path in known and os.path.dirname(path) in lister.unchanged:
+                mtime = known[path]
+            else:
+                mtime = self._mtime(path)
+            rows.append(self._row(context, mtime))
+
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM contexts' + where, args)
+            self._db.executemany('INSERT OR REPLACE INTO contexts VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            lister.save(self._db)
+        pipe_metrics.count('index_refresh', formula)
+        return len(rows)
+
+    def add_paths(self, paths, pipe_base_dir=None):
+        """
+        Index paths through examine_path; paths that match no formula are skipped
+        :param paths: iterable of paths, e.g. from a render or publish log
+        :param pipe_base_dir: Pipeline Base Directory, inferred when None
+        :return: number of paths indexed
+        """
+        index = path_index.get_path_index()
+        rows = []
+        for path in paths:
+            path = os.path.normpath(path)
+            context = index.examine(path, drive=pipe_base_dir or self.drive)
+            if context is None:
+                continue
+            context['path'] = path
+            rows.append(self._row(context, self._mtime(path)))
+        with self._lock, self._db:
+            self._db.executemany('INSERT OR REPLACE INTO contexts VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def query(self, formula=None, **variables):
+        """
+        Return the indexed contexts matching a formula and variables
+        :param formula: formula name, or None for any
+        :param variables: drive/project/asset_type/asset values or globs ('char*'),
+            any other variable is matched against the stored context
+        :return: list of {'formula': ..., variable: value, ..., 'path': ..., 'mtime': ...}
+        """
+        columns = {key: value for key, value in variables.items() if key in COLUMNS}
+        extra = {key: value for key, value in variables.items() if key not in COLUMNS}
+        where, args = self._where(formula=formula, **columns)
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT formula, context, path, mtime FROM contexts%s ORDER BY path' % where, args).fetchall()
+        results = []
+        for row in rows:
+            values = json.loads(row['context'])
+            if any(values.get(key) != value for key, value in extra.items()):
+                continue
+            context = {'formula': row['formula']}
+            context.update(values)
+            context['path'] = row['path']
+            context['mtime'] = row['mtime']
+            results.append(context)
+        return results
+
+    def count(self, formula=None, **variables):
+        """Return the number of indexed contexts matching a formula and drive/project/asset_type/asset"""
+        where, args = self._where(formula=formula, **variables)
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM contexts' + where, args).fetchone()[0]
+
+    def values(self, variable, formula=None, **variables):
+        """Return the distinct values of drive/project/asset_type/asset, e.g. every project"""
+        if variable not in COLUMNS:
+            raise ValueError("'%s' is not an indexed variable: %s" % (variable, ', '.join(COLUMNS)))
+        where, args = self._where(formula=formula, **variables)
+        with self._lock:
+            rows = self._db.execute('SELECT DISTINCT %s FROM contexts%s ORDER BY 1' % (variable, where),
+                                    args).fetchall()
+        return [row[0] for row in rows if row[0] is not None]
+
+    @staticmethod
+    def _where(formula=None, **variables):
+        """Build a WHERE clause; globbed values use SQLite GLOB"""
+        clauses, args = [], []
+        if formula is not None:
+            clauses.append('formula = ?')
+            args.append(formula)
+        for key in COLUMNS:
+            value = variables.get(key)
+            if value is None:
+                continue
+            if pipe_scan.is_wildcard(value):
+                clauses.append('%s GLOB ?' % key)
+                args.append(pipe_scan.sqlite_glob(value))
+            else:
+                clauses.append('%s = ?' % key)
+                args.append(value)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), args
+
+    @staticmethod
+    def _row(context, mtime):
+        values = {key: value for key, value in context.items() if key not in ('formula', 'path')}
+        return ((context['path'], context['formula'])
+                + tuple(values.get(key) for key in COLUMNS)
+                + (json.dumps(values, sort_keys=True), mtime))
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+
+class IndexLister(object):
+    """
+    Directory lister for pipe_scan backed by the index: a directory whose mtime
+    matches the stored one is answered from the stored listing
+    :param index: AssetIndex
+    """
+    def __init__(self, index):
+        self.index = index
+        self.unchanged = set()
+        self._listed = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, path):
+        path = path or os.curdir
+        mtime_ns = os.stat(path).st_mtime_ns
+        pipe_metrics.count('fs_stat')
+        with self.index._lock:
+            stored = self.index._db.execute('SELECT mtime_ns FROM dirs WHERE path = ?', (path,)).fetchone()
+            if stored is not None and stored[0] == mtime_ns:
+                entries = [(name, bool(is_dir)) for name, is_dir in self.index._db.execute(
+                    'SELECT name, is_dir FROM entries WHERE dir = ?', (path,))]
+                with self._lock:
+                    self.unchanged.add(path)
+                return entries
+        entries = pipe_scan.scandir_lister(path)
+        with self._lock:
+            self._listed[path] = (mtime_ns, entries)
+        return entries
+
+    def save(self, db):
+        """Store the listings made during the scan; call inside the index transaction"""
+        for path, (mtime_ns, entries) in self._listed.items():
+            db.execute('DELETE FROM entries WHERE dir = ?', (path,))
+            db.executemany('INSERT INTO entries VALUES (?, ?, ?)',
+                           [(path, name, int(is_dir)) for name, is_dir in entries])
+            db.execute('INSERT OR REPLACE INTO dirs VALUES (?, ?)', (path, mtime_ns))
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Opt-in instrumentation of path resolution
+
+:description:
+    Records call counts, latency histograms, cache hit/miss counts and filesystem
+    calls per formula. Instrumentation is off unless enable() is called or the
+    PIPE_METRICS environment variable is set; while disabled every instrumented
+    call site costs one module attribute check.
+
+        pipe_metrics.enable()
+        ...
+        pipe_metrics.snapshot()
+        pipe_metrics.write_prometheus('/var/lib/node_exporter/asset_engine.prom')
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import os
+import json
+import time
+import threading
+
+PREFIX = 'asset_engine'
+
+# Latency histogram bucket upper bounds, in seconds
+BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+ENABLED = bool(os.environ.get('PIPE_METRICS'))
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def reset():
+    """Drop every recorded metric"""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def start():
+    """Return a start time when instrumentation is enabled, else None"""
+    return time.perf_counter() if ENABLED else None
+
+
+def observe(operation, formula, started):
+    """
+    Record the latency of one call
+    :param operation: instrumented operation, e.g. 'path_context_get_path'
+    :param formula: formula label, None for calls not tied to a formula
+    :param started: value returned by start()
+    """
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    key = (operation, formula or '')
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.add(elapsed)
+
+
+def count(name, formula=None, amount=1):
+    """
+    Increment a counter, e.g. 'cache_hits' or 'file_opens'
+    :param name: counter name
+    :param formula: formula label, None for counts not tied to a formula
+    :param amount: increment
+    """
+    if not ENABLED:
+        return
+    key = (name, formula or '')
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def snapshot():
+    """
+    Return every metric as a plain dict:
+    {'counters': {name: {formula: n}},
+     'latency': {operation: {formula: {'count', 'sum', 'buckets'}}},
+     'cache_hit_rate': {formula: ratio}}
+    """
+    with _lock:
+        counters = {}
+        for (name, formula), value in sorted(_counters.items()):
+            counters.setdefault(name, {})[formula] = value
+        latency = {}
+        for (operation, formula), histogram in sorted(_histograms.items()):
+            latency.setdefault(operation, {})[formula] = histogram.to_dict()
+    hit_rate = {}
+    for formula, hits in counters.get('cache_hits', {}).items():
+        misses = counters.get('cache_misses', {}).get(formula, 0)
+        hit_rate[formula] = hits / (hits + misses)
+    for formula in counters.get('cache_misses', {}):
+        hit_rate.setdefault(formula, 0.0)
+    return {'counters': counters, 'latency': latency, 'cache_hit_rate': hit_rate}
+
+
+def to_json(indent=None):
+    """Return the snapshot as a JSON string"""
+    return json.dumps(snapshot(), indent=indent)
+
+
+def to_prometheus():
+    """Return every metric in the Prometheus text exposition format"""
+    data = snapshot()
+    lines = []
+    for name, formulas in data['counters'].items():
+        metric = '%s_%s_total' % (PREFIX, name)
+        lines.append('# TYPE %s counter' % metric)
+        for formula, value in formulas.items():
+            lines.append('%s{formula="%s"} %d' % (metric, _escape(formula), value))
+    for operation, formulas in data['latency'].items():
+        metric = '%s_%s_seconds' % (PREFIX, operation)
+        lines.append('# TYPE %s histogram' % metric)
+        for formula, histogram in formulas.items():
+            label = 'formula="%s"' % _escape(formula)
+            for bound, total in histogram['buckets']:
+                lines.append('%s_bucket{%s,le="%s"} %d' % (metric, label, bound, total))
+            lines.append('%s_bucket{%s,le="+Inf"} %d' % (metric, label, histogram['count']))
+            lines.append('%s_sum{%s} %r' % (metric, label, histogram['sum']))
+            lines.append('%s_count{%s} %d' % (metric, label, histogram['count']))
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(file_location):
+    """Atomically write the Prometheus text file, e.g. for the node_exporter textfile collector"""
+    _write(file_location, to_prometheus())
+
+
+def write_json(file_location):
+    """Atomically write a JSON snapshot"""
+    _write(file_location, to_json(indent=2))
+
+
+def _write(file_location, text):
+    temp_file = '%s.%d.tmp' % (file_location, os.getpid())
+    with open(temp_file, 'w') as fh:
+        fh.write(text)
+    os.replace(temp_file, file_location)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class Histogram(object):
+    """Fixed-bucket latency histogram"""
+    def __init__(self, buckets=BUCKETS):
+        self.bounds = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def to_dict(self):
+        """Return count, sum and cumulative [bound, count] buckets"""
+        buckets = []
+        total = 0
+        for bound, bucket_count in zip(self.bounds, self.counts):
+            total += bucket_count
+            buckets.append([bound, total])
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Streaming command-line path resolver
+
+:description:
+    Reads context rows (JSONL or CSV with formula/project/asset_type/asset/...
+    columns) from stdin or a file, resolves each one with the compiled formulas
+    and writes the results as soon as they are produced, in input order. Memory
+    stays constant however long the input is, and the work can be sharded over
+    several processes. Optional flags check whether each path exists or create it.
+
+    printf '{"project": "avengers", "asset_type": "props", "asset": "cube"}\\n' | \\
+        python -m pipe_resolve --formula as_tex_dir --drive /mnt/pipeline --format paths
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import os
+import argparse
+import path_lib as fm
+import pipe_fs
+import pipe_stream
+from pipe_context import PipeContext, disk_values
+
+_options = {}
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def init_worker(options):
+    """Store the resolution options and warm the registry once per worker process"""
+    _options.clear()
+    _options.update(options)
+    fm.get_registry().compiled_formulas()
+
+
+def resolve_chunk(rows):
+    """Return a result record for each row of a chunk"""
+    registry = fm.get_registry()
+    defaults = _options.get('defaults') or {}
+    default_formula = _options.get('formula')
+    records = []
+    for row in rows:
+        record = dict(row)
+        record['path'] = None
+        records.append(record)
+        formula = row.get('formula') or default_formula
+        record['formula'] = formula
+        compiled = registry.get_compiled(formula) if isinstance(formula, str) else None
+        if compiled is None:
+            record['error'] = "Undefined formula '%s'" % formula
+            continue
+        try:
+            values = row_values(compiled, row, defaults)
+            record['path'] = compiled.resolve(disk_values(compiled, values))
+        except fm.FormulaError as e:
+            record['error'] = str(e)
+
+    paths = [record['path'] for record in records if record['path']]
+    create = _options.get('create')
+    if create and paths:
+        targets = paths if create == 'dir' else [os.path.dirname(path) for path in paths]
+        report = pipe_fs.materialize(targets)
+        created = set(report.created)
+        for record in records:
+            if record['path']:
+                target = record['path'] if create == 'dir' else os.path.dirname(record['path'])
+                # Only directories this mkdir made, not ones that already existed
+                record['created'] = target in created
+                if target in report.failed:
+                    record['error'] = str(report.failed[target])
+    if _options.get('exists'):
+        # One batch per chunk, so paths sharing a directory cost a single listing
+        found = iter(pipe_fs.exists_many(paths))
+        for record in records:
+            record['exists'] = bool(record['path']) and next(found)
+    return records
+
+
+def row_values(compiled, row, defaults):
+    """
+    Return the {variable: value} of a row for a compiled formula, falling back to
+    the defaults for missing values
+    :param compiled: CompiledFormula
+    :param row: input row; JSON numbers are converted to strings
+    :param defaults: {variable: value}
+    :return: {variable: value}
+    """
+    values = {}
+    for var in compiled.variables:
+        value = row.get(var)
+        # CSV rows carry empty strings and JSON rows null for missing values
+        if value is None or value == '':
+            value = defaults.get(var)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        elif not isinstance(value, str):
+            raise fm.FormulaError("Variable '%s' must be a string, got %r" % (var, value))
+        if value:
+            values[var] = value
+    return values
+
+
+def resolve_stream(rows, formula=None, defaults=None, exists=False, create=None,
+                   jobs=1, chunk_size=None):
+    """
+    Resolve an iterable of context rows
+    :param rows: iterable of dicts
+    :param formula: formula for rows without a 'formula' column
+    :param defaults: {variable: value} for variables a row leaves empty, e.g. drive
+    :param exists: add an 'exists' field to every record
+    :param create: None, 'dir' to create each path or 'parent' to create its parent
+    :param jobs: worker processes
+    :param chunk_size: rows per chunk, defaults to 1 in-process (100 with exists or create,
+        whose filesystem checks are batched per chunk) and 1000 when sharded
+    :return: generator of record lists, one per chunk, in input order
+    """
+    options = {'formula': formula, 'defaults': _defaults(defaults), 'exists': exists,
+               'create': create}
+    if chunk_size is None:
+        chunk_size = 1000 if jobs > 1 else 100 if exists or create else 1
+    chunks = pipe_stream.chunked(rows, chunk_size)
+    return pipe_stream.stream_map(resolve_chunk, chunks, jobs, init_worker, (options,))
+
+
+def _defaults(defaults):
+    """Fill in the PipeContext defaults (e.g. drive) under any explicit defaults"""
+    values = PipeContext(**(defaults or {})).context_values()
+    values.update(defaults or {})
+    return values
+
+
+def record_fields(exists=False, create=None):
+    """Return the CSV columns: formula, every formula variable, path and flags"""
+    fields = ['formula']
+    for compiled in fm.get_registry().compiled_formulas().values():
+        for var in compiled.variables:
+            if var not in fields:
+                fields.append(var)
+    fields.append('path')
+    if exists:
+        fields.append('exists')
+    if create:
+        fields.append('created')
+    fields.append('error')
+    return fields
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='pipe_resolve', description="Resolve context rows into paths")
+    parser.add_argument('input', nargs='?', default='-', help="JSONL or CSV rows, '-' for stdin")
+    parser.add_argument('-o', '--output', default='-', help="output file, '-' for stdout")
+    parser.add_argument('-i', '--input-format', choices=('auto', 'jsonl', 'csv'), default='auto')
+    parser.add_argument('-f', '--format', choices=('jsonl', 'csv', 'paths'), default='jsonl')
+    parser.add_argument('--formula', default=None, help="formula for rows without a formula column")
+    parser.add_argument('--drive', default=None, help="drive for rows without a drive column")
+    parser.add_argument('--set', action='append', default=[], metavar='VAR=VALUE',
+                        type=pipe_stream.assignment, help="default value for a variable, repeatable")
+    parser.add_argument('--exists', action='store_true', help="report whether each path exists")
+    parser.add_argument('--create', choices=('dir', 'parent'), default=None,
+                        help="create each path, or its parent directory")
+    parser.add_argument('-j', '--jobs', type=int, default=1)
+    parser.add_argument('--chunk-size', type=int, default=None)
+    parser.add_argument('--progress', type=float, default=None, metavar='SECONDS',
+                        help="report throughput on stderr every SECONDS")
+    args = parser.parse_args(argv)
+
+    defaults = dict(args.set)
+    if args.drive:
+        defaults['drive'] = args.drive
+
+    meter = pipe_stream.Throughput('rows', args.progress)
+    with pipe_stream.open_input(args.input) as fh_in, pipe_stream.open_output(args.output) as fh_out:
+        rows = pipe_stream.read_rows(fh_in, args.input_format)
+        writer = None
+        if args.format != 'paths':
+            writer = pipe_stream.RecordWriter(fh_out, args.format,
+                                              record_fields(args.exists, args.create))
+        for records in resolve_stream(rows, args.formula, defaults, args.exists, args.create,
+                                      args.jobs, args.chunk_size):
+            if writer is None:
+                fh_out.write(''.join('%s\n' % (record['path'] or '') for record in records))
+            else:
+                writer.write_many(records)
+            fh_out.flush()
+            meter.add(len(records))
+    if args.progress is not None:
+        meter.report()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
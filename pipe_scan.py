@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Finds the contexts of a formula that exist on disk
+
+:description:
+    find_contexts takes a formula and some of its variables and returns every
+    context on disk that completes it. Variables left out, or given a glob such
+    as '*', 'char*' or '[cs]*', are enumerated. The scan follows the formula one path
+    component at a time: components whose variables are all known are simply
+    appended, and only the directories at wildcard components are listed, with
+    every listing of a level running in parallel on a thread pool.
+
+        find_contexts('as_base_dir', drive=drive, project='avengers', asset_type='props')
+        # [{'formula': 'as_base_dir', 'drive': ..., 'asset': 'cube', 'path': ...}, ...]
+        find_contexts('pr_base_dir', drive=drive)   # every project
+
+    Hidden entries are skipped, and only directories match the last component of
+    a '*_dir' formula. Directories are listed through a lister callable, os.scandir
+    by default, that returns (name, is_dir) pairs; pass another one to scan a
+    remote store or to record the listings. Listings run on the worker queue of
+    the formula's disk (see pipe_fs), and a storage root configured for that disk
+    replaces the default drive.
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import os
+import re
+import path_lib as fm
+import pipe_fs
+import pipe_metrics
+
+GLOB_CHARS = '*?['
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def scandir_lister(path):
+    """
+    List a directory
+    :param path: directory path
+    :return: [(name, is_dir), ...]
+    """
+    pipe_metrics.count('fs_scandir')
+    with os.scandir(path or os.curdir) as entries:
+        listing = [(entry.name, entry.is_dir()) for entry in entries]
+    pipe_fs.get_stat_cache().record_listing(path, listing)
+    return listing
+
+
+def is_wildcard(value):
+    """Return True if a variable value asks for enumeration: None or a glob"""
+    return value is None or (isinstance(value, str) and any(char in value for char in GLOB_CHARS))
+
+
+def glob_parts(pattern):
+    """
+    Split a glob into '*', '?', character classes and literal characters. A class
+    is '[' + members + ']', negated by a leading '!' (fnmatch) or '^' (SQLite); a
+    ']' right after the opening bracket is a member, and an unclosed '[' is literal.
+    :param pattern: glob
+    :return: generator of '*', '?', (negate, members) or a literal character
+    """
+    index, size = 0, len(pattern)
+    while index < size:
+        char = pattern[index]
+        index += 1
+        if char != '[':
+            yield char
+            continue
+        start = index
+        if start < size and pattern[start] in '!^':
+            start += 1
+        end = pattern.find(']', start + 1 if start < size and pattern[start] == ']' else start)
+        if end < 0:
+            yield char
+            continue
+        yield pattern[index] in '!^', pattern[start:end]
+        index = end + 1
+
+
+def glob_regex(pattern):
+    """Translate a glob matching one path component into a regex"""
+    sep = re.escape(os.sep)
+    if pattern is None or pattern == '*':
+        return '[^%s]+' % sep
+    regex = []
+    for part in glob_parts(pattern):
+        if part == '*':
+            regex.append('[^%s]*' % sep)
+        elif part == '?':
+            regex.append('[^%s]' % sep)
+        elif isinstance(part, tuple):
+            negate, members = part
+            # Escape every member but the '-' of a range; a negated class never matches os.sep
+            members = ''.join(member if member == '-' and 0 < index < len(members) - 1 else re.escape(member)
+                              for index, member in enumerate(members))
+            regex.append('[^%s%s]' % (sep, members) if negate else '[%s]' % members)
+        else:
+            regex.append(re.escape(part))
+    return ''.join(regex)
+
+
+def sqlite_glob(pattern):
+    """Spell a glob the way SQLite GLOB reads it, negated classes with '^'"""
+    return ''.join('[%s%s]' % ('^' if part[0] else '', part[1]) if isinstance(part, tuple)
+                   else '[[]' if part == '[' else part for part in glob_parts(pattern))
+
+
+def find_contexts(formula, lister=None, max_workers=None, **bound):
+    """
+    Return every context of a formula that exists on disk
+    :param formula: formula to enumerate
+    :param lister: callable(path) -> [(name, is_dir), ...], os.scandir by default
+    :param max_workers: threads listing directories, the formula's disk queue when None
+    :param bound: known variables; None or a glob ('*', 'char*') to enumerate one
+    :return: list of {'formula': formula, variable: value, ..., 'path': path} sorted by path
+    """
+    compiled = fm.get_registry().get_compiled(formula)
+    if compiled is None:
+        raise fm.FormulaError("Undefined formula '%s'" % formula)
+    return FormulaScan(compiled, lister, max_workers).find(**bound)
+
+
+def _components(compiled):
+    """Split a compiled formula into its path components"""
+    return [component for component in os.sep.join(compiled.pieces).split(os.sep)
+            if component and component != os.curdir]
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class FormulaScan(object):
+    """
+    Directory scan following one compiled formula
+    :param compiled: CompiledFormula
+    :param lister: callable(path) -> [(name, is_dir), ...], os.scandir by default
+    :param max_workers: threads listing directories, the formula's disk queue when None
+    """
+    def __init__(self, compiled, lister=None, max_workers=None):
+        self.compiled = compiled
+        self.lister = lister or scandir_lister
+        self.max_workers = max_workers
+        self.components = _components(compiled)
+        # '*_dir' formulas name directories, anything else may end on a file
+        self.directories = compiled.name.endswith('_dir')
+        self._regexes = {}
+
+    def find(self, **bound):
+        """
+        Return every context of the formula that exists on disk
+        :param bound: known variables; None or a glob to enumerate one
+        :return: list of context dicts sorted by path
+        """
+        from pipe_context import PipeContext, disk_values
+        fixed = {key: value for key, value in bound.items() if not is_wildcard(value)}
+        # PipeContext defaults (e.g. drive), unless a variable was asked for
+        values = {key: value for key, value in PipeContext(**fixed).context_values().items()
+                  if key not in bound}
+        if 'disk_type' not in bound:
+            values.setdefault('disk_type', self.compiled.disk)
+        values.update(fixed)
+        disk_values(self.compiled, values)
+        globs = {var: bound.get(var) for var in self.compiled.variables if var not in values}
+
+        absolute = os.sep.join(self.compiled.pieces).startswith(os.sep)
+        # (directory, values found so far, whether the directory was seen in a listing)
+        frontier = [(os.sep if absolute else '', values, True)]
+        with pipe_fs.worker_pool(self.compiled.disk, self.max_workers) as pool:
+            last = len(self.components) - 1
+            for index, component in enumerate(self.components):
+                frontier = self._step(pool, frontier, component, globs, index == last)
+                if not frontier:
+                    return []
+            frontier = self._verify(pool, frontier)
+
+        contexts = []
+        for path, found, _ in frontier:
+            context = {'formula': self.compiled.name}
+            context.update((var, found[var]) for var in self.compiled.variables)
+            context['path'] = self.compiled.resolve(found)
+            contexts.append(context)
+        contexts.sort(key=lambda context: context['path'])
+        return contexts
+
+    def _list(self, path):
+        try:
+            return self.lister(path)
+        except OSError:
+            return []
+
+    def _listings(self, pool, directories):
+        """List directories in parallel, returning {directory: [(name, is_dir), ...]}"""
+        directories = list(dict.fromkeys(directories))
+        return dict(zip(directories, pool(self._list, directories)))
+
+    def _step(self, pool, frontier, component, globs, last):
+        """Advance every frontier entry by one formula component"""
+        names = fm._slot_re.findall(component)
+        advanced = []
+        scanned = []
+        for path, found, seen in frontier:
+            if all(name in found for name in names):
+                literal = fm._slot_re.sub(lambda match: found[match.group(1)], component)
+                advanced.append((os.path.join(path, literal), found, False))
+            else:
+                scanned.append((path, found, seen))
+        if not scanned:
+            return advanced
+
+        # Directories only reached through literal components may not exist; listing
+        # them answers that too
+        listings = self._listings(pool, [path for path, _, _ in scanned])
+        for path, found, _ in scanned:
+            regex = self._regex(component, names, found, globs)
+            for name, is_dir in listings[path]:
+                if name.startswith('.') or not (is_dir or (last and not self.directories)):
+                    continue
+                match = regex.fullmatch(name)
+                if match is None:
+                    continue
+                values = dict(found)
+                values.update(match.groupdict())
+                advanced.append((os.path.join(path, name), values, True))
+        return advanced
+
+    def _verify(self, pool, frontier):
+        """Keep the entries whose trailing literal components exist"""
+        unseen = [path for path, _, seen in frontier if not seen]
+        if not unseen:
+            return frontier
+        listings = self._listings(pool, [os.path.dirname(path) for path in unseen])
+        existing = set()
+        for directory, entries in listings.items():
+            existing.update(os.path.join(directory, name) for name, _ in entries)
+        return [entry for entry in frontier if entry[2] or entry[0] in existing]
+
+    def _regex(self, component, names, found, globs):
+        """Return the compiled regex matching a component given the known values"""
+        known = tuple((name, found[name]) for name in names if name in found)
+        key = (component, known)
+        regex = self._regexes.get(key)
+        if regex is None:
+            parts = fm._slot_re.split(component)
+            pattern = []
+            grouped = set()
+            for index, part in enumerate(parts):
+                if index % 2 == 0:
+                    pattern.append(re.escape(part))
+                elif part in found:
+                    pattern.append(re.escape(found[part]))
+                elif part in grouped:
+                    pattern.append('(?P=%s)' % part)
+                else:
+                    grouped.add(part)
+                    pattern.append('(?P<%s>%s)' % (part, glob_regex(globs.get(part))))
+            regex = self._regexes[key] = re.compile(''.join(pattern))
+        return regex
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Streaming helpers shared by the command-line tools
+
+:description:
+    Chunks an input stream, maps the chunks in order over an optional
+    multiprocessing pool with a bounded number of chunks in flight (so memory
+    stays constant however large the input is), writes records out as JSONL or
+    CSV and reports throughput.
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import sys
+import csv
+import json
+import time
+import argparse
+import contextlib
+import multiprocessing
+from collections import deque
+from itertools import islice
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def chunked(iterable, size):
+    """Yield lists of at most size items from an iterable"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def stream_map(func, chunks, jobs=1, initializer=None, initargs=(), backlog=2):
+    """
+    Map func over chunks, in order, yielding each result as soon as it is ready
+    :param func: picklable callable taking one chunk
+    :param chunks: iterable of chunks
+    :param jobs: worker processes, 1 runs in-process
+    :param initializer: called once per worker (and once in-process when jobs is 1)
+    :param backlog: chunks queued per worker before the input is read further
+    :return: generator of results
+    """
+    if jobs <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for chunk in chunks:
+            yield func(chunk)
+        return
+
+    with multiprocessing.Pool(jobs, initializer, initargs) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(func, (chunk,)))
+            if len(pending) >= jobs * backlog:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def assignment(item):
+    """
+    argparse type of VAR=VALUE options, e.g. --set project=avengers
+    :param item: option value
+    :return: (variable, value)
+    """
+    var, sep, value = item.partition('=')
+    if not sep or not var.strip():
+        raise argparse.ArgumentTypeError("expected VAR=VALUE, got '%s'" % item)
+    return var.strip(), value
+
+
+@contextlib.contextmanager
+def open_input(location):
+    """Open an input file for reading, '-' or None for stdin"""
+    if location in (None, '-'):
+        yield sys.stdin
+    else:
+        with open(location, 'r', newline='') as fh:
+            yield fh
+
+
+@contextlib.contextmanager
+def open_output(location):
+    """Open an output file for writing, '-' or None for stdout"""
+    if location in (None, '-'):
+        yield sys.stdout
+    else:
+        with open(location, 'w', newline='') as fh:
+            yield fh
+
+
+def read_rows(fh, input_format='auto'):
+    """
+    Yield dict rows from a JSONL or CSV stream
+    :param fh: open text stream
+    :param input_format: 'jsonl', 'csv' or 'auto' (sniffed from the first line)
+    :return: generator of dicts
+    """
+    if input_format == 'auto':
+        first = fh.readline()
+        input_format = 'jsonl' if first.lstrip().startswith('{') else 'csv'
+        fh = _prepend(first, fh)
+    if input_format == 'jsonl':
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        for row in csv.DictReader(fh):
+            yield row
+
+
+def _prepend(line, fh):
+    yield line
+    yield from fh
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class RecordWriter(object):
+    """
+    Writes dict records to a text stream as JSONL or CSV
+    :param fh: open text stream
+    :param output_format: 'jsonl' or 'csv'
+    :param fields: CSV columns; extra keys are ignored, missing keys are empty
+    """
+    def __init__(self, fh, output_format='jsonl', fields=None):
+        self.fh = fh
+        self.output_format = output_format
+        self._csv = None
+        if output_format == 'csv':
+            self._csv = csv.DictWriter(fh, fields, extrasaction='ignore')
+            self._csv.writeheader()
+
+    def write(self, record):
+        if self._csv is not None:
+            self._csv.writerow(record)
+        else:
+            self.fh.write(json.dumps(record) + '\n')
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+
+class Throughput(object):
+    """
+    Counts processed lines and reports lines/second on a stream (stderr by default)
+    :param interval: seconds between progress reports, None reports only at the end
+    """
+    def __init__(self, label='lines', interval=None, stream=None):
+        self.label = label
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.count = 0
+        self.start = time.perf_counter()
+        self._reported = self.start
+
+    @property
+    def rate(self):
+        elapsed = time.perf_counter() - self.start
+        return self.count / elapsed if elapsed else 0.0
+
+    def add(self, count):
+        self.count += count
+        if self.interval is not None:
+            now = time.perf_counter()
+            if now - self._reported >= self.interval:
+                self._reported = now
+                self.report()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start
+        self.stream.write("%d %s in %.2fs (%.0f %s/s)\n"
+                          % (self.count, self.label, elapsed, self.rate, self.label))
+        self.stream.flush()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+
+#----------------------------------------------------------------------------------------#
+#------------------------------------------------------------------------------ HEADER --#
+
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Incremental disk usage per project, asset type, asset and subdirectory formula
+
+:description:
+    DiskUsage finds the contexts of a formula on disk (pipe_scan), walks each
+    one's directory tree one level at a time with os.scandir on the worker queue
+    of the formula's disk, and adds up bytes and file counts per context and per
+    subdirectory formula, e.g. as_geo_dir, as_surf_dir and as_data_dir for
+    as_base_dir.
+
+        with DiskUsage(drive='/mnt/pipeline') as usage:
+            report = usage.scan('as_base_dir', project='avengers')
+        print(report.format('project', 'asset_type'))
+
+    The bytes and files held directly in each directory are stored with the
+    directory's mtime in disk_usage.sqlite, next to the asset index. A rerun
+    stats every directory and lists only those whose mtime changed. A file
+    rewritten in place does not change its directory's mtime, so its new size
+    is counted once its directory changes; scan(..., full=True) (--full) lists
+    every directory again to catch those.
+
+        python -m pipe_usage as_base_dir --drive /mnt/pipeline --set project=avengers --by asset_type
+
+"""
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- IMPORTS --#
+
+# Built-in
+import os
+import sys
+import json
+import argparse
+import threading
+import path_lib as fm
+import pipe_fs
+import pipe_index
+import pipe_metrics
+import pipe_scan
+import pipe_stream
+from pipe_enums import FileSize
+
+USAGE_FILE = 'disk_usage.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    subdirs TEXT NOT NULL
+);
+"""
+
+#----------------------------------------------------------------------------------------#
+#--------------------------------------------------------------------------- FUNCTIONS --#
+
+def child_formulas(formula):
+    """
+    Return the directory formulas one literal component below a formula
+    :param formula: formula name, e.g. 'as_base_dir'
+    :return: list of formula names, e.g. ['as_ass_dir', 'as_dyn_dir', 'as_surf_dir', ...]
+    """
+    registry = fm.get_registry()
+    base = registry.get_compiled(formula)
+    if base is None:
+        raise fm.FormulaError("Undefined formula '%s'" % formula)
+    depth = len(base.pieces)
+    return [name for name, compiled in registry.compiled_formulas().items()
+            if name.endswith('_dir') and len(compiled.pieces) == depth + 1
+            and compiled.pieces[:depth] == base.pieces and not fm._slot_re.search(compiled.pieces[-1])]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='pipe_usage', description="Report disk usage per context")
+    parser.add_argument('formula', help="formula whose contexts are measured, e.g. as_base_dir")
+    parser.add_argument('--drive', default=None, help="pipeline base drive")
+    parser.add_argument('--set', action='append', default=[], metavar='VAR=VALUE',
+                        type=pipe_stream.assignment, help="known variable, globs allowed, repeatable")
+    parser.add_argument('--by', action='append', default=[], metavar='VAR',
+                        help="group totals by a variable, repeatable")
+    parser.add_argument('--usage-file', default=None, help="SQLite file of stored directory totals")
+    parser.add_argument('-f', '--format', choices=('text', 'jsonl'), default='text')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="threads, the disk queue when unset")
+    parser.add_argument('--full', action='store_true',
+                        help="list every directory again, catching files rewritten in place")
+    args = parser.parse_args(argv)
+
+    bound = dict(args.set)
+    with DiskUsage(args.usage_file, drive=args.drive) as usage:
+        report = usage.scan(args.formula, max_workers=args.jobs, full=args.full, **bound)
+    if args.format == 'jsonl':
+        for row in report.rows:
+            sys.stdout.write(json.dumps(row) + '\n')
+    else:
+        sys.stdout.write(report.format(*args.by) + '\n')
+    return 0
+
+#----------------------------------------------------------------------------------------#
+#----------------------------------------------------------------------------- CLASSES --#
+
+class DiskUsage(object):
+    """
+    Disk usage of formula contexts, with per-directory totals stored between runs
+    :param usage_file: SQLite file, disk_usage.sqlite in the default index location when None
+    :param drive: pipeline base drive used by scans and the default location
+    :param project: put the default location in this project's data dir
+    :param wal: use write-ahead logging, only safe on a local disk; pipe_index.WAL when None
+    """
+    def __init__(self, usage_file=None, drive=None, project=None, wal=None):
+        self.drive = drive
+        self.usage_file = usage_file or pipe_index.default_index_file(drive, project, USAGE_FILE)
+        directory = os.path.dirname(self.usage_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = pipe_index.connect(self.usage_file, wal)
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        self._db.close()
+
+    def scan(self, formula, subdirs=None, max_workers=None, full=False, **bound):
+        """
+        Measure every context of a formula found on disk
+        :param formula: formula to measure, e.g. 'as_base_dir'
+        :param subdirs: subdirectory formulas reported per context, child_formulas(formula) when None
+        :param max_workers: threads listing directories, the formula's disk queue when None
+        :param full: list every directory, not only those whose mtime changed
+        :param bound: known variables; left out or globbed variables are enumerated
+        :return: UsageReport
+        """
+        compiled = fm.get_registry().get_compiled(formula)
+        if compiled is None:
+            raise fm.FormulaError("Undefined formula '%s'" % formula)
+        if self.drive and 'drive' not in bound:
+            bound['drive'] = self.drive
+        if subdirs is None:
+            subdirs = child_formulas(formula)
+        contexts = pipe_scan.find_contexts(formula, max_workers=max_workers, **bound)
+
+        roots = [context['path'] for context in contexts]
+        stored = self._load(roots)
+        walk = UsageWalk(stored, compiled.disk, max_workers, full)
+        walk.run(roots)
+        self._save(stored, walk)
+
+        registry = fm.get_registry()
+        rows = []
+        for context in contexts:
+            values = {key: value for key, value in context.items() if key not in ('formula', 'path')}
+            row = dict(context)
+            row.update(walk.total(context['path']))
+            row['subdirs'] = {}
+            for name in subdirs:
+                path = registry.resolve(name, values)
+                if path in walk.totals:
+                    row['subdirs'][name] = walk.total(path)
+            rows.append(row)
+        pipe_metrics.count('usage_rescanned_dirs', formula, len(walk.changed))
+        variables = [var for var in compiled.variables if var != 'drive']
+        return UsageReport(formula, variables, rows, len(walk.dirs), len(walk.changed))
+
+    def _load(self, roots):
+        """Return the stored {path: (mtime_ns, bytes, files, subdirs)} of every directory under roots"""
+        stored = {}
+        with self._lock:
+            for root in roots:
+                # Paths below root sort between root + sep and root + the next character
+                prefix = os.path.join(root, '')
+                rows = self._db.execute(
+                    'SELECT path, mtime_ns, bytes, files, subdirs FROM usage '
+                    'WHERE path = ? OR (path > ? AND path < ?)',
+                    (root, prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)))
+                for path, mtime_ns, size, files, subdirs in rows:
+                    stored[path] = (mtime_ns, size, files, tuple(json.loads(subdirs)))
+        return stored
+
+    def _save(self, stored, walk):
+        """Store the directories listed by a walk and drop the ones that are gone"""
+        gone = [(path,) for path in stored if path not in walk.dirs]
+        changed = [(path,) + walk.dirs[path][:3] + (json.dumps(walk.dirs[path][3]),)
+                   for path in walk.changed]
+        with self._lock, self._db:
+            self._db.executemany('DELETE FROM usage WHERE path = ?', gone)
+            self._db.executemany('INSERT OR REPLACE INTO usage VALUES (?, ?, ?, ?, ?)', changed)
+
+
+class UsageWalk(object):
+    """
+    Level by level directory walk that reuses the stored totals of directories
+    whose mtime is unchanged
+    :param stored: {path: (mtime_ns, bytes, files, subdirs)} from a previous walk
+    :param disk: PIPE_DISK whose worker queue lists the directories
+    :param max_workers: threads of a private pool instead of the disk queue
+    :param full: list every directory, ignoring the stored totals
+    """
+    def __init__(self, stored=None, disk=None, max_workers=None, full=False):
+        self.stored = stored or {}
+        self.disk = disk
+        self.max_workers = max_workers
+        self.full = full
+        # {path: (mtime_ns, bytes, files, subdirs)} for the files directly in each directory
+        self.dirs = {}
+        self.changed = set()
+        self.totals = {}
+
+    def run(self, roots):
+        """Walk every root and total each directory with everything below it"""
+        frontier = list(dict.fromkeys(roots))
+        with pipe_fs.worker_pool(self.disk, self.max_workers) as pool:
+            while frontier:
+                below = []
+                for path, entry, changed in pool(self._visit, frontier):
+                    if entry is None:
+                        continue
+                    self.dirs[path] = entry
+                    if changed:
+                        self.changed.add(path)
+                    below.extend(os.path.join(path, name) for name in entry[3])
+                frontier = below
+        self.totals = self._roll_up()
+
+    def total(self, path):
+        """Return {'bytes': ..., 'files': ..., 'dirs': ...} under a walked directory"""
+        size, files, dirs = self.totals.get(path, (0, 0, 0))
+        return {'bytes': size, 'files': files, 'dirs': dirs}
+
+    def _visit(self, path):
+        """Return (path, (mtime_ns, bytes, files, subdirs) or None if unreadable, listed)"""
+        pipe_metrics.count('fs_stat')
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return path, None, False
+        stored = None if self.full else self.stored.get(path)
+        if stored is not None and stored[0] == mtime_ns:
+            return path, stored, False
+
+        pipe_metrics.count('fs_scandir')
+        size = files = 0
+        subdirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                        else:
+                            size += entry.stat(follow_symlinks=False).st_size
+                            files += 1
+                    except OSError:
+                        continue
+        except OSError:
+            return path, None, False
+        return path, (mtime_ns, size, files, tuple(sorted(subdirs))), True
+
+    def _roll_up(self):
+        """Add every directory's totals into its parents, deepest first"""
+        totals = {}
+        for path in sorted(self.dirs, key=lambda path: path.count(os.sep), reverse=True):
+            _, size, files, subdirs = self.dirs[path]
+            dirs = 0
+            for name in subdirs:
+                child = totals.get(os.path.join(path, name))
+                if child is not None:
+                    size += child[0]
+                    files += child[1]
+                    dirs += child[2] + 1
+            totals[path] = (size, files, dirs)
+        return totals
+
+
+class UsageReport(object):
+    """
+    Disk usage of the contexts of one formula
+    :param formula: measured formula
+    :param variables: context variables identifying a row, e.g. project, asset_type, asset
+    :param rows: [{'formula': ..., variable: value, ..., 'path': ..., 'bytes': ..., 'files': ...,
+        'dirs': ..., 'subdirs': {formula: {'bytes': ..., 'files': ..., 'dirs': ...}}}, ...]
+    :param visited: directories walked
+    :param rescanned: directories listed because they changed
+    """
+    def __init__(self, formula, variables, rows, visited=0, rescanned=0):
+        self.formula = formula
+        self.variables = variables
+        self.rows = rows
+        self.visited = visited
+        self.rescanned = rescanned
+
+    def __repr__(self):
+        return "UsageReport(%r, contexts=%d, bytes=%d, rescanned=%d/%d)" % (
+            self.formula, len(self.rows), self.bytes, self.rescanned, self.visited)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def bytes(self):
+        return sum(row['bytes'] for row in self.rows)
+
+    @property
+    def files(self):
+        return sum(row['files'] for row in self.rows)
+
+    def totals(self, *variables):
+        """
+        Return usage summed per value of some variables
+        :param variables: e.g. 'project', 'asset_type'
+        :return: {(value, ...): {'bytes': ..., 'files': ...}} sorted by key
+        """
+        groups = {}
+        for row in self.rows:
+            key = tuple(row.get(var) or '' for var in variables)
+            group = groups.setdefault(key, {'bytes': 0, 'files': 0})
+            group['bytes'] += row['bytes']
+            group['files'] += row['files']
+        return dict(sorted(groups.items()))
+
+    def format(self, *variables, system=FileSize.alternative):
+        """
+        Return a text table of the usage per context with its subdirectory formulas,
+        or summed per value of some variables
+        :param variables: group by these variables, e.g. 'project', 'asset_type'
+        :param system: FileSize system formatting the byte counts
+        :return: str
+        """
+        def line(label, usage, indent=''):
+            return '%-48s %12s %10d files' % (indent + label, FileSize.size(usage['bytes'], system),
+                                              usage['files'])
+
+        lines = []
+        if variables:
+            for key, usage in self.totals(*variables).items():
+                lines.append(line('/'.join(key), usage))
+        else:
+            for row in self.rows:
+                lines.append(line('/'.join(row[var] for var in self.variables), row))
+                for name, usage in row['subdirs'].items():
+                    lines.append(line(name, usage, indent='    '))
+        lines.append(line('total', {'bytes': self.bytes, 'files': self.files}))
+        return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
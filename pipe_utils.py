@@ -8,10 +8,22 @@
 :synopsis:
    Extra utilities 
 
+:description:
+    IO writes through the 'asset_engine' logger. Messages below the current level
+    are dropped before any formatting or writing happens, and output can be switched
+    between the colored console format and one JSON object per line:
+
+        PIPE_LOG_LEVEL=DEBUG PIPE_LOG_FORMAT=json python ...
+        IO.configure(level='DEBUG', fmt='json')
+
 """
 
 # ---------------------------------------------------------------------------------------#
 # ---------------------------------------------------------------------------- IMPORTS --#
+import os
+import sys
+import json
+import logging
 
 
 # ---------------------------------------------------------------------------------------#
@@ -37,12 +49,27 @@ def print_dict(rand_dict, indent=0):
     :param indent: How much to indent when printing the dictionary.
     :type: int
     """
+    for line in format_dict(rand_dict, indent):
+        print (line)
+
+def format_dict(rand_dict, indent=0):
+    """
+    Returns the lines print_dict prints for a dictionary.
+
+    :param rand_dict: A dictionary with items in it.
+    :type: dict
+
+    :param indent: How much to indent the dictionary.
+    :type: int
+    """
+    lines = []
     for key, value in rand_dict.items():
-        print ('  ' * indent + str(key))
+        lines.append('  ' * indent + str(key))
         if isinstance(value, dict):
-            print_dict(value, indent+2)
+            lines.extend(format_dict(value, indent+2))
         else:
-            print ('  ' * (indent+2) + str(value))
+            lines.append('  ' * (indent+2) + str(value))
+    return lines
 
 class bcolors:
     HEADER      = '\033[95m'
@@ -62,59 +89,176 @@ class bcolors:
         self.FAIL = ''
         self.ENDC = ''
 
+class ConsoleFormatter(logging.Formatter):
+    """
+    Formats IO records the way they have always been printed, with ANSI colors.
+    """
+    def format(self, record):
+        style = getattr(record, 'io_style', None) or record.levelname.lower()
+        message = record.getMessage()
+        if style == 'warning':
+            return "\n%sWARNING: %s\n" % (bcolors.WARNING, message) + bcolors.ENDC
+        if style == 'info':
+            return "\n%s  %s\n" % (bcolors.HEADER, message) + bcolors.ENDC
+        if style == 'debug':
+            return "%s  DEBUG: %s" % (bcolors.OKBLUE, message) + bcolors.ENDC
+        if style in ('error', 'critical'):
+            return "\n%s  ERROR: %s\n" % (bcolors.FAIL, message) + bcolors.ENDC
+        if style == 'block':
+            return "%s  %s" % (bcolors.OKGREEN, message) + bcolors.ENDC
+        if style == 'list':
+            lines = ["\n  LIST CONTENTS:"]
+            lines.extend("%s    %s" % (bcolors.OKBLUE, item) + bcolors.ENDC for item in record.io_data)
+            return '\n'.join(lines)
+        if style == 'dict':
+            return '\n'.join(["\n  DICTIONARY CONTENTS:"] + format_dict(record.io_data))
+        return message
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats IO records as one JSON object per line, for log collectors on the farm.
+    """
+    def format(self, record):
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data = getattr(record, 'io_data', None)
+        if data is not None:
+            entry['data'] = data
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class StdoutHandler(logging.StreamHandler):
+    """
+    Stream handler bound to whatever sys.stdout is at the time of each write.
+    """
+    def __init__(self):
+        logging.Handler.__init__(self)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
 class IO(object):
     """
     This class handles the outputting of printed information.
+    Messages are emitted through a leveled logger; disabled levels cost a single
+    level check. Pass %-style args instead of pre-formatted strings so the message
+    is only formatted when it is actually written.
     """
+    DEBUG = logging.DEBUG
+    INFO = logging.INFO
+    WARNING = logging.WARNING
+    ERROR = logging.ERROR
+
+    logger = logging.getLogger('asset_engine')
+    handler = None
+
     @classmethod
-    def warning(cls, message):
+    def configure(cls, level=None, fmt=None):
+        """
+        Set the output level and/or format.
+
+        :param level: A logging level name or number, e.g. 'DEBUG'. Unknown names
+            fall back to INFO with a warning.
+        :param fmt: 'text' for colored console output, 'json' for JSON lines.
+        """
+        if cls.handler is None:
+            cls.handler = StdoutHandler()
+            cls.logger.addHandler(cls.handler)
+            cls.logger.propagate = False
+            cls.handler.setFormatter(ConsoleFormatter())
+        if level is not None:
+            if isinstance(level, str):
+                name, level = level, logging.getLevelName(level.upper())
+                if not isinstance(level, int):
+                    # getLevelName returns 'Level X' for unknown names, which setLevel rejects
+                    cls.logger.setLevel(logging.INFO)
+                    cls.warning("Unknown log level '%s', using INFO", name)
+                    level = logging.INFO
+            cls.logger.setLevel(level)
+        if fmt is not None:
+            if fmt == 'json':
+                cls.handler.setFormatter(JSONFormatter())
+            else:
+                cls.handler.setFormatter(ConsoleFormatter())
+
+    @classmethod
+    def enabled(cls, level):
+        """
+        Returns True if messages of a level are written. Use it to guard
+        expensive message arguments.
+
+        :param level: A logging level, e.g. IO.DEBUG.
+        :type: int
+        """
+        return cls.logger.isEnabledFor(level)
+
+    @classmethod
+    def warning(cls, message, *args):
         """
         Prints a message with the warning label attached.
 
         :param message: The message to output.
         :type: str
         """
-        print ("\n%sWARNING: %s\n" % (bcolors.WARNING, message) + bcolors.ENDC)
+        if cls.logger.isEnabledFor(logging.WARNING):
+            cls.logger.warning(message, *args)
 
     @classmethod
-    def info(cls, message):
+    def info(cls, message, *args):
         """
         Prints a message.
 
         :param message: The message to output.
         :type: str
         """
-        print ("\n%s  %s\n" % (bcolors.HEADER ,message) + bcolors.ENDC)
+        if cls.logger.isEnabledFor(logging.INFO):
+            cls.logger.info(message, *args)
 
     @classmethod
-    def debug(cls, message):
+    def debug(cls, message, *args):
         """
         Prints a message with the debug label attached.
 
         :param message: The message to output.
         :type: str
         """
-        print ("%s  DEBUG: %s" % (bcolors.OKBLUE ,message) + bcolors.ENDC)
+        if cls.logger.isEnabledFor(logging.DEBUG):
+            cls.logger.debug(message, *args)
 
     @classmethod
-    def error(cls, message):
+    def error(cls, message, *args):
         """
         Prints a message with the error label attached.
 
         :param message: The message to output.
         :type: str
         """
-        print ("\n%s  ERROR: %s\n" % (bcolors.FAIL ,message) + bcolors.ENDC)
+        if cls.logger.isEnabledFor(logging.ERROR):
+            cls.logger.error(message, *args)
 
     @classmethod
-    def block(cls, message):
+    def block(cls, message, *args):
         """
         Prints one line of a block of text.
 
         :param message: The message to output.
         :type: str
         """
-        print ("%s  %s" % (bcolors.OKGREEN ,message) + bcolors.ENDC)
+        if cls.logger.isEnabledFor(logging.INFO):
+            cls.logger.info(message, *args, extra={'io_style': 'block'})
 
     @classmethod
     def list(cls, input_list):
@@ -124,9 +268,8 @@ class IO(object):
         :param input_list: The dictionary to print.
         :type: list
         """
-        print ("\n  LIST CONTENTS:")
-        for item in input_list:
-            print ("%s    %s" % (bcolors.OKBLUE, item) + bcolors.ENDC)
+        if cls.logger.isEnabledFor(logging.INFO):
+            cls.logger.info("LIST CONTENTS", extra={'io_style': 'list', 'io_data': list(input_list)})
 
     @classmethod
     def dict(cls, input_dict):
@@ -136,8 +279,12 @@ class IO(object):
         :param input_dict: The dictionary to print.
         :type: dict
         """
-        print ("\n  DICTIONARY CONTENTS:")
-        print_dict(input_dict)
+        if cls.logger.isEnabledFor(logging.INFO):
+            cls.logger.info("DICTIONARY CONTENTS", extra={'io_style': 'dict', 'io_data': input_dict})
+
+
+IO.configure(level=os.environ.get('PIPE_LOG_LEVEL', 'INFO'),
+             fmt=os.environ.get('PIPE_LOG_FORMAT', 'text'))
 
 
 class Autovivification(dict):
@@ -0,0 +1,60 @@
+# ----------------------------------------------------------------------------#
+# ------------------------------------------------------------------ HEADER --#
+"""
+:author:
+    Jared Webber
+    
+:synopsis:
+    Test: Resolution Cache
+
+:description:
+    This test suite evaluates the LRU cache sitting in front of path resolution.
+
+"""
+
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- IMPORTS ----#
+import unittest, time
+import path_lib
+import path_cache
+from path_cache import ResolutionCache, MISSING
+from pipe_context import PipeContext as PC
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- FUNCTIONS --#
+class ResolutionCacheTest(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = ResolutionCache(maxsize=2)
+        cache.put('a', '/a')
+        cache.put('b', '/b')
+        self.assertEqual(cache.get('a'), '/a')
+        cache.put('c', '/c')
+        self.assertIs(cache.get('b'), MISSING)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl(self):
+        cache = ResolutionCache(ttl=0.01)
+        cache.put('a', '/a')
+        time.sleep(0.02)
+        self.assertIs(cache.get('a'), MISSING)
+
+    def test_invalidate_formula(self):
+        cache = ResolutionCache()
+        cache.put(path_cache.make_key('pr_base_dir', {'project': 'a'}), '/a')
+        cache.put(path_cache.make_key('pr_as_dir', {'project': 'a'}), '/a/assets')
+        cache.invalidate('pr_base_dir')
+        self.assertEqual(len(cache), 1)
+
+    def test_get_path_hits(self):
+        cache = path_cache.get_resolution_cache()
+        cache.clear()
+        for _ in range(3):
+            PC.get_path('pr_as_dir', drive='pipe', project='avengers')
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        path_lib.get_registry().refresh(force=True)
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# ----------------------------------------------------------------------------#
+# ------------------------------------------------------------------ HEADER --#
+"""
+:author:
+    Jared Webber
+    
+:synopsis:
+    Test: Path Index
+
+:description:
+    This test suite evaluates reverse resolution of paths on disk back into
+    a formula and its context variables.
+
+"""
+
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- IMPORTS ----#
+import unittest, os
+import path_lib
+import path_classify
+from path_index import PathIndex
+from pipe_context import PipeContext as PC
+pipe_base_dir = os.path.join(os.path.sep, 'home', 'user', 'pipeline')
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- FUNCTIONS --#
+class PathIndexTest(unittest.TestCase):
+    def test_round_trip(self):
+        context = {'drive': pipe_base_dir, 'project': 'avengers',
+                   'asset_type': 'props', 'asset': 'cube'}
+        for formula, compiled in path_lib.get_registry().compiled_formulas().items():
+            path = PC.get_path(formula, **context)
+            found = PC().examine_path(path, pipe_base_dir=pipe_base_dir)
+            self.assertEqual(found['formula'], formula)
+            for var in compiled.variables:
+                self.assertEqual(found[var], context[var])
+
+    def test_inferred_drive(self):
+        path = os.path.join(pipe_base_dir, 'projects', 'avengers', 'assets', 'props')
+        found = PC().examine_path(path)
+        self.assertEqual(found, {'formula': 'pr_as_type_dir', 'drive': pipe_base_dir,
+                                 'project': 'avengers', 'asset_type': 'props'})
+        self.assertEqual(PC().examine_path(path, var='project'), 'avengers')
+
+    def test_pattern_consistency(self):
+        path = os.path.join(pipe_base_dir, 'projects', 'avengers', 'assets', 'props',
+                            'cube', 'data', 'thumbnails', 'sphere.jpg')
+        self.assertIsNone(PC().examine_path(path, pipe_base_dir=pipe_base_dir))
+
+    def test_most_specific(self):
+        index = PathIndex(path_lib.compile_formulas({
+            'pipe_any': '{drive} {a} {b}',
+            'pipe_lit': '{drive} {a} fixed',
+        }))
+        self.assertEqual(index.examine(os.path.join('d', 'x', 'fixed'), drive='d')['formula'],
+                         'pipe_lit')
+        self.assertEqual(index.examine(os.path.join('d', 'x', 'other'), drive='d')['formula'],
+                         'pipe_any')
+
+
+class PathClassifyTest(unittest.TestCase):
+    def test_classify_stream(self):
+        lines = [
+            os.path.join(pipe_base_dir, 'projects', 'avengers') + '\n',
+            '{"path": "%s"}\n' % os.path.join(pipe_base_dir, 'lib', 'mtlx'),
+            os.path.join(os.path.sep, 'tmp', 'elsewhere') + '\n',
+        ]
+        records = [record for chunk in path_classify.classify(lines, chunk_size=2)
+                   for record in chunk]
+        self.assertEqual([record['formula'] for record in records],
+                         ['pr_base_dir', 'pipe_lib_mtlx', None])
+        self.assertEqual(records[0]['project'], 'avengers')
+
+    def test_classify_bad_lines(self):
+        lines = ['{"path": \n', '{"file": "x"}\n', '{"path": 5}\n',
+                 os.path.join(pipe_base_dir, 'projects', 'avengers') + '\n']
+        records = [record for chunk in path_classify.classify(lines) for record in chunk]
+        self.assertEqual([record['formula'] for record in records], [None, None, None, 'pr_base_dir'])
+        self.assertTrue(all(record['error'] for record in records[:3]))
+        self.assertNotIn('error', records[3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+# ----------------------------------------------------------------------------#
+# ------------------------------------------------------------------ HEADER --#
+"""
+:author:
+    Jared Webber
+    
+:synopsis:
+    Test: Formula Registry
+
+:description:
+    This test suite evaluates how formula configuration files are loaded,
+    cached and reloaded by the formula registry.
+
+"""
+
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- IMPORTS ----#
+import unittest, os, pickle, shutil, tempfile
+import path_lib
+from path_lib import FormulaRegistry, FormulaManager, FormulaError, compile_formulas
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- FUNCTIONS --#
+class FormulaRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.formula_dir = tempfile.mkdtemp()
+        for name in os.listdir(path_lib.FORMULA_DIR):
+            shutil.copy(os.path.join(path_lib.FORMULA_DIR, name), self.formula_dir)
+        self.registry = FormulaRegistry(self.formula_dir, check_interval=None, cache_file=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.formula_dir)
+
+    def _append(self, file_name, line):
+        file_location = os.path.join(self.formula_dir, file_name)
+        with open(file_location, 'a') as fh:
+            fh.write('\n%s\n' % line)
+        # Make sure the signature changes even on coarse mtime filesystems
+        st = os.stat(file_location)
+        os.utime(file_location, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+
+    def test_parse_once(self):
+        self.assertEqual(self.registry.get('pr_as_dir'), '{pr_base_dir} assets')
+        self.assertEqual(self.registry.get('pipe_base_dir'), '{drive}')
+        self.assertIsNone(self.registry.get('as_custom_dir'))
+        generation = self.registry.generation
+        self.assertFalse(self.registry.refresh())
+        self.assertEqual(self.registry.generation, generation)
+
+    def test_reload_changed_file(self):
+        self.registry.get('pipe_base_dir')
+        pipeline = self.registry._files['pipeline_formulas.cfg']
+        self._append('asset_formulas.cfg', "as_rig_dir = ('{as_base_dir}', 'rig')")
+        reloaded = []
+        self.registry.add_listener(reloaded.append)
+        self.assertTrue(self.registry.refresh())
+        self.assertEqual(self.registry.get('as_rig_dir'), '{as_base_dir} rig')
+        self.assertIs(self.registry._files['pipeline_formulas.cfg'], pipeline)
+        self.assertEqual(reloaded, [self.registry])
+
+    def test_manager_reads_registry(self):
+        manager = FormulaManager(registry=self.registry)
+        self.assertEqual(manager.get_formula('pr_base_dir'), ['{drive}', 'projects', '{project}'])
+        os.remove(os.path.join(self.formula_dir, 'project_formulas.cfg'))
+        # No file I/O happens until the registry is refreshed
+        self.assertEqual(FormulaManager(registry=self.registry).get_formula('pr_base_dir'),
+                         ['{drive}', 'projects', '{project}'])
+
+
+    def test_disk_cache(self):
+        cache_file = os.path.join(self.formula_dir, 'formulas.cache')
+        FormulaRegistry(self.formula_dir, cache_file=cache_file).refresh()
+        self.assertTrue(os.path.isfile(cache_file))
+
+        expected = self.registry.get_compiled('as_tex_dir').pieces
+        read_formula_file = path_lib.read_formula_file
+        path_lib.read_formula_file = None
+        try:
+            registry = FormulaRegistry(self.formula_dir, cache_file=cache_file)
+            self.assertEqual(registry.get_compiled('as_tex_dir').pieces, expected)
+        finally:
+            path_lib.read_formula_file = read_formula_file
+
+        # A changed cfg invalidates the cache
+        self._append('asset_formulas.cfg', "as_rig_dir = ('{as_base_dir}', 'rig')")
+        registry = FormulaRegistry(self.formula_dir, cache_file=cache_file)
+        self.assertIsNotNone(registry.get_compiled('as_rig_dir'))
+
+        # The key is the cfg contents, an edit keeping the size and mtime still invalidates it
+        file_location = os.path.join(self.formula_dir, 'asset_formulas.cfg')
+        st = os.stat(file_location)
+        with open(file_location, 'r') as fh:
+            text = fh.read()
+        with open(file_location, 'w') as fh:
+            fh.write(text.replace("'rig')", "'fx_')"))
+        os.utime(file_location, ns=(st.st_atime_ns, st.st_mtime_ns))
+        registry = FormulaRegistry(self.formula_dir, cache_file=cache_file)
+        self.assertEqual(registry.get_compiled('as_rig_dir').pieces[-1], 'fx_')
+
+        # A cache file that isn't the JSON snapshot is never loaded
+        with open(cache_file, 'wb') as fh:
+            fh.write(pickle.dumps(('key', {}, {})))
+        registry = FormulaRegistry(self.formula_dir, cache_file=cache_file)
+        self.assertEqual(registry.get_compiled('as_tex_dir').pieces, expected)
+
+    def test_disk_types(self):
+        self.assertEqual([self.registry.get_compiled(name).disk
+                          for name in ('pipe_config', 'pipe_lib_cfg', 'pipe_lib_geo', 'as_tex_dir')],
+                         ['config', 'config', 'work', 'work'])
+        self._append('render_formulas.cfg', "disk_type = ('render', )\n"
+                                            "rn_base_dir = ('{pr_base_dir}', 'renders')\n"
+                                            "disk_type = ()\n"
+                                            "rn_frames_dir = ('{rn_base_dir}', 'frames')\n"
+                                            "rn_notes_dir = ('{pr_data_dir}', 'renders')")
+        manager = FormulaManager(registry=self.registry)
+        self.registry.refresh()
+        self.assertEqual([manager.get_formula_disk(name)
+                          for name in ('rn_base_dir', 'rn_frames_dir', 'rn_notes_dir', 'rn_missing')],
+                         ['render', 'render', 'work', None])
+
+        self._append('render_formulas.cfg', "disk_type = ('scratch', )")
+        with self.assertRaisesRegex(FormulaError, 'scratch'):
+            self.registry.refresh()
+
+
+class CompileFormulasTest(unittest.TestCase):
+    def test_deep_chain(self):
+        compiled = path_lib.get_registry().get_compiled('as_thumb_file')
+        self.assertEqual(compiled.slots, ('drive', 'project', 'asset_type', 'asset', 'asset'))
+        self.assertEqual(compiled.variables, ('drive', 'project', 'asset_type', 'asset'))
+        path = compiled.resolve({'drive': 'pipe', 'project': 'avengers',
+                                 'asset_type': 'props', 'asset': 'cube'})
+        self.assertEqual(path, os.path.join('pipe', 'projects', 'avengers', 'assets', 'props',
+                                            'cube', 'data', 'thumbnails', 'cube.jpg'))
+
+    def test_order_independent(self):
+        compiled = compile_formulas({'b_dir': '{a_dir} b {x}', 'a_dir': '{drive} a'})
+        self.assertEqual(compiled['b_dir'].pieces, ('{drive}', 'a', 'b', '{x}'))
+
+    def test_multiple_references(self):
+        compiled = compile_formulas({'pipe_a': '{drive} a', 'pipe_b': '{drive} b',
+                                     'pipe_c': '{pipe_a} {pipe_b}_old'})
+        self.assertEqual(compiled['pipe_c'].slots, ('drive', 'drive'))
+        self.assertEqual(compiled['pipe_c'].resolve({'drive': 'x'}),
+                         os.path.join('x', 'a', 'x', 'b_old'))
+
+    def test_cycle(self):
+        with self.assertRaisesRegex(FormulaError, 'pipe_a -> pipe_b -> pipe_a'):
+            compile_formulas({'pipe_a': '{pipe_b} a', 'pipe_b': '{pipe_a} b'})
+
+    def test_undefined_reference(self):
+        with self.assertRaisesRegex(FormulaError, 'pr_missing'):
+            compile_formulas({'pr_a': '{pr_missing} a'})
+
+    def test_unbound_variable(self):
+        compiled = compile_formulas({'pipe_a': '{drive} a'})['pipe_a']
+        with self.assertRaisesRegex(FormulaError, 'drive'):
+            compiled.resolve({})
+
+    def test_immutable(self):
+        compiled = path_lib.get_registry().get_compiled('as_thumb_file')
+        compiled.generated()
+        with self.assertRaises(AttributeError):
+            compiled.name = 'as_other'
+        self.assertFalse(hasattr(compiled, '__dict__'))
+        copy = pickle.loads(pickle.dumps(compiled))
+        self.assertEqual((copy.name, copy.literals, copy.slots),
+                         (compiled.name, compiled.literals, compiled.slots))
+        self.assertIs(copy.literals[1], compiled.literals[1])
+
+    def test_generated_resolver(self):
+        values = {'drive': '/pipe', 'project': "it's", 'asset_type': '{props}', 'asset': '..'}
+        columns = {'asset': ['cube', '..', ''], 'project': ['a', 'b', 'c']}
+        defaults = {'drive': 'pipe', 'asset_type': 'props'}
+        for name, compiled in path_lib.get_registry().compiled_formulas().items():
+            if not compiled.slots or 'project' not in compiled.variables:
+                continue
+            interpreted = compiled.resolve(values)
+            batch = list(compiled.resolve_columns(columns, defaults))
+            path_lib.set_codegen(True)
+            try:
+                self.assertEqual(compiled.resolve(values), interpreted, name)
+                self.assertEqual(list(compiled.resolve_columns(columns, defaults)), batch, name)
+                with self.assertRaisesRegex(FormulaError, name):
+                    compiled.resolve({})
+            finally:
+                path_lib.set_codegen(False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# ----------------------------------------------------------------------------#
+# ------------------------------------------------------------------ HEADER --#
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Test: Path Sets
+
+:description:
+    This test suite evaluates membership, prefix queries and iteration of
+    compact path sets built from resolved and examined paths.
+
+"""
+
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- IMPORTS ----#
+import unittest, os
+from unittest import mock
+import path_set
+from path_set import PathSet
+from pipe_context import PipeContext as PC
+pipe_base_dir = os.path.join(os.sep, 'pipeline')
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- FUNCTIONS --#
+class PathSetTest(unittest.TestCase):
+    def setUp(self):
+        self.rows = [{'project': project, 'asset_type': asset_type, 'asset': asset}
+                     for project in ('avengers', 'avengers-old')
+                     for asset_type in ('props', 'vehicles')
+                     for asset in ('cube', 'sphere', 'cube.v2')]
+        self.paths = PC.get_paths('as_tex_dir', self.rows, as_list=True, drive=pipe_base_dir)
+
+    def test_membership(self):
+        paths = path_set.from_formula('as_tex_dir', self.rows, drive=pipe_base_dir)
+        self.assertEqual(len(paths), len(self.paths))
+        for path in self.paths:
+            self.assertIn(path, paths)
+        self.assertNotIn(os.path.dirname(self.paths[0]), paths)
+        self.assertNotIn(self.paths[0] + 'x', paths)
+        self.assertNotIn(os.path.join(pipe_base_dir, 'missing'), paths)
+
+    def test_iteration(self):
+        paths = PathSet(self.paths)
+        paths.update(self.paths[:3])
+        self.assertEqual(list(paths), sorted(self.paths, key=lambda path: path.split(os.sep)))
+
+    def test_under(self):
+        paths = PathSet(self.paths)
+        prefix = PC.get_path('pr_as_type_dir', drive=pipe_base_dir,
+                             project='avengers', asset_type='props')
+        under = list(paths.under(prefix))
+        self.assertEqual(len(under), 3)
+        self.assertTrue(all(path.startswith(prefix + os.sep) for path in under))
+        self.assertEqual(paths.count(prefix + os.sep), 3)
+        self.assertEqual(list(paths.under(prefix + '-old')), [])
+
+    def test_merge(self):
+        paths = PathSet(self.paths[:5])
+        self.assertEqual(len(paths), 5)
+        paths.update(self.paths[3:])
+        paths.add(pipe_base_dir)
+        self.assertEqual(len(paths), len(self.paths) + 1)
+        self.assertIn(pipe_base_dir, paths)
+        self.assertLess(paths.nbytes(), sum(len(path) for path in self.paths))
+
+    def test_interleaved(self):
+        paths = PathSet(self.paths[:1])
+        with mock.patch.object(path_set._Segments, 'decode') as decode:
+            for index, path in enumerate(self.paths[1:], 2):
+                paths.add(path)
+                self.assertIn(path, paths)
+                self.assertEqual(len(paths), index)
+        # Merging runs never decodes the stored paths back to strings
+        self.assertEqual(decode.call_count, 0)
+        self.assertLessEqual(len(paths._runs), len(self.paths).bit_length())
+        self.assertEqual(list(paths), sorted(self.paths, key=lambda path: path.split(os.sep)))
+
+    def test_from_examined(self):
+        listing = self.paths + [os.path.join(pipe_base_dir, 'unknown', 'dir')]
+        paths = path_set.from_examined(listing, formula='as_tex_dir', pipe_base_dir=pipe_base_dir)
+        self.assertEqual(sorted(paths), sorted(self.paths))
+
+
+if __name__ == '__main__':
+    unittest.main()
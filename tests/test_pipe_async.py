@@ -0,0 +1,88 @@
+# ----------------------------------------------------------------------------#
+# ------------------------------------------------------------------ HEADER --#
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Test: asyncio Path Resolution
+
+:description:
+    This test suite evaluates the asyncio API: batching of aget_path requests,
+    filesystem work on the thread pool and per-request error reporting.
+
+"""
+
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- IMPORTS ----#
+import unittest, os, shutil, asyncio, tempfile
+from unittest import mock
+import pipe_async
+from path_lib import FormulaError
+from pipe_enums import PIPELINE
+from pipe_context import PipeContext as PC
+pipe_base_dir = os.path.join(os.sep, 'pipeline')
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- FUNCTIONS --#
+class PipeAsyncTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.drive = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.drive)
+
+    async def test_batched_get_path(self):
+        assets = ['asset_%d' % index for index in range(20)]
+        with mock.patch.object(PC, 'get_paths', wraps=PC.get_paths) as get_paths:
+            paths = await asyncio.gather(*(
+                PC.aget_path('as_base_dir', drive=pipe_base_dir, project='avengers',
+                             asset_type='props', asset=asset) for asset in assets))
+        self.assertEqual(get_paths.call_count, 1)
+        self.assertEqual(paths, [PC.get_path('as_base_dir', drive=pipe_base_dir, project='avengers',
+                                             asset_type='props', asset=asset) for asset in assets])
+
+    async def test_task_context(self):
+        async def resolve(project):
+            with PC(drive=pipe_base_dir, project=project, asset_type='props'):
+                return await pipe_async.aget_path('as_base_dir', asset='cube')
+
+        paths = await asyncio.gather(resolve('avengers'), resolve('xmen'))
+        self.assertEqual([path.split(os.sep)[3] for path in paths], ['avengers', 'xmen'])
+
+    async def test_errors(self):
+        results = await asyncio.gather(
+            PC.aget_path('as_base_dir', drive=pipe_base_dir, project='avengers',
+                         asset_type='props', asset='cube'),
+            PC.aget_path('as_base_dir', drive=pipe_base_dir, project='avengers'),
+            PC.aget_path('as_missing_dir', drive=pipe_base_dir),
+            return_exceptions=True)
+        self.assertTrue(results[0].endswith('cube'))
+        self.assertIsInstance(results[1], FormulaError)
+        self.assertIsInstance(results[2], FormulaError)
+
+    async def test_bad_request_in_batch(self):
+        # A non-str value fails the batch outside FormulaError, it must not hang the others
+        results = await asyncio.wait_for(asyncio.gather(
+            PC.aget_path('as_base_dir', drive=pipe_base_dir, project='avengers',
+                         asset_type='props', asset='cube'),
+            PC.aget_path('as_base_dir', drive=pipe_base_dir, project='avengers',
+                         asset_type='props', asset=5),
+            return_exceptions=True), timeout=5)
+        self.assertTrue(results[0].endswith('cube'))
+        self.assertIsInstance(results[1], TypeError)
+
+    async def test_create_paths(self):
+        rows = [{'asset': 'cube'}, {'asset': 'sphere'}]
+        report = await PC.acreate_paths(PIPELINE.LAYOUT.ASSET, rows, drive=self.drive,
+                                        project='avengers', asset_type='props')
+        self.assertTrue(report.ok)
+        paths = await PC.aget_paths(PIPELINE.LAYOUT.ASSET[0], rows, drive=self.drive,
+                                    project='avengers', asset_type='props')
+        self.assertEqual(await pipe_async.aexists(paths), [True, True])
+        self.assertFalse(await pipe_async.aexists(os.path.join(self.drive, 'missing')))
+        examined = await PC(drive=self.drive).aexamine_path(paths[0], var='asset')
+        self.assertEqual(examined, 'cube')
+
+
+if __name__ == '__main__':
+    unittest.main()
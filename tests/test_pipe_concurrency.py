@@ -0,0 +1,103 @@
+# ----------------------------------------------------------------------------#
+# ------------------------------------------------------------------ HEADER --#
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Test: Concurrent Path Resolution
+
+:description:
+    This test suite evaluates path resolution shared across threads and asyncio
+    tasks: nested PipeContext blocks stay private to each thread and task, and
+    32 threads resolving against one registry (reloading underneath them) get
+    the same paths as a single thread. benchmarks/bench_threads.py measures
+    their throughput.
+
+"""
+
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- IMPORTS ----#
+import unittest, os, time, asyncio, threading
+import path_lib
+import pipe_context
+from concurrent.futures import ThreadPoolExecutor
+from pipe_context import PipeContext as PC
+pipe_base_dir = os.path.join(os.sep, 'pipeline')
+THREADS = 32
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- FUNCTIONS --#
+def expected_path(project, asset_type, asset):
+    return os.path.join(pipe_base_dir, 'projects', project, 'assets', asset_type, asset)
+
+
+def nested_resolve(index):
+    with PC(drive=pipe_base_dir, project='project_%d' % index):
+        with PC(asset_type='props'):
+            inner = PC.get_path('as_base_dir', asset='asset_%d' % index)
+        outer = PC.get_path('pr_as_type_dir', asset_type='vehicles')
+    return inner, outer, pipe_context.current_context()
+
+
+class PipeConcurrencyTest(unittest.TestCase):
+    def test_nested_threads(self):
+        with ThreadPoolExecutor(THREADS) as pool:
+            results = list(pool.map(nested_resolve, range(THREADS * 4)))
+        for index, (inner, outer, current) in enumerate(results):
+            self.assertEqual(inner, expected_path('project_%d' % index, 'props', 'asset_%d' % index))
+            self.assertEqual(outer, os.path.dirname(expected_path('project_%d' % index, 'vehicles', 'x')))
+            self.assertIsNone(current)
+
+    def test_nested_tasks(self):
+        async def task(index):
+            with PC(drive=pipe_base_dir, project='project_%d' % index):
+                await asyncio.sleep(0)
+                with PC(asset_type='props'):
+                    await asyncio.sleep(0)
+                    return PC.get_path('as_base_dir', asset='asset_%d' % index)
+
+        async def run():
+            return await asyncio.gather(*(task(index) for index in range(THREADS)))
+
+        paths = asyncio.run(run())
+        self.assertEqual(paths, [expected_path('project_%d' % index, 'props', 'asset_%d' % index)
+                                 for index in range(THREADS)])
+        self.assertIsNone(pipe_context.current_context())
+
+    def test_stress(self):
+        rows = [{'project': 'project_%d' % (index % 10), 'asset_type': 'props',
+                 'asset': 'asset_%d' % index} for index in range(2000)]
+        expected = [expected_path(row['project'], row['asset_type'], row['asset']) for row in rows]
+
+        def resolve(chunk):
+            return [PC.get_path('as_base_dir', drive=pipe_base_dir, **row) for row in chunk]
+
+        self.assertEqual(resolve(rows), expected)
+
+        registry = path_lib.get_registry()
+        stop = threading.Event()
+        errors = []
+
+        def reload():
+            while not stop.is_set():
+                try:
+                    registry.refresh(force=True)
+                except Exception as e:
+                    errors.append(e)
+                time.sleep(0.01)
+
+        reloader = threading.Thread(target=reload)
+        reloader.start()
+        try:
+            with ThreadPoolExecutor(THREADS) as pool:
+                results = list(pool.map(resolve, [rows] * THREADS))
+        finally:
+            stop.set()
+            reloader.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), THREADS)
+        for paths in results:
+            self.assertEqual(paths, expected)
+
+if __name__ == '__main__':
+    unittest.main()
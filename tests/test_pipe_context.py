@@ -11,7 +11,7 @@
     This test suite evaluates the pipeline logic required for parsing
     formulas and turning them into paths on disk.
     
-    Three Tests:
+    Six Tests:
 
         1) Single Path 
         Find a 'pr_base_dir' path given a set of keyword arguments to establish context.
@@ -32,6 +32,23 @@
 
             - Evaluates each path, while subsequently updating a shared context pointer.
 
+        4) Deep Paths
+        Find an 'as_thumb_file' path without any parent formulas.
+
+            - Evaluates a fully expanded formula chain in a single pass
+
+        5) Batch Paths
+        Find 'as_base_dir' for a list of rows and for a columnar mapping of
+        keyword arguments.
+
+            - Compiles the formula once and resolves every row
+
+        6) Bound Paths
+        Bind drive, project and asset_type once and find 'as_thumb_file' for
+        several assets.
+
+            - Matches PipeContext.get_path, including overridden and unsafe values
+
 
     NOTE: CHANGE $PIPE_BASE_DIR = '/home/user/pipeline/' to a path that exists on 
     your system 
@@ -103,11 +120,80 @@ class PipeContextTest(unittest.TestCase):
         IO.block("Found Path: %s" % path)
 
 
+    def test_deep_path(self):
+        IO.info("TEST ---| Deep Path")
+
+        path = PC.get_path(
+            'as_thumb_file',
+            drive=pipe_base_dir, project='Interstellar',
+            asset_type='Vehicles', asset="Endurance"
+        )
+        message = f"\n{bcolors.FAIL}  ERROR: {'Test 4: Deep-Path Pipeline Context test failed'}\n"
+        self.assertEqual(
+            path, 
+            (f"{os.path.join(pipe_base_dir, 'projects', 'Interstellar', 'assets', 'Vehicles', 'Endurance', 'data', 'thumbnails', 'Endurance.jpg')}"),
+            message
+        )
+        IO.block("Found Path: %s" % path)
+
+
+    def test_batch_paths(self):
+        IO.info("TEST ---| Batch Paths")
+
+        rows = [{'asset': 'Endurance'}, {'asset': 'Ranger', 'project': 'Lazarus'}]
+        columns = {'asset': ['Endurance', 'Ranger'], 'project': ['Interstellar', 'Lazarus']}
+        expected = [
+            os.path.join(pipe_base_dir, 'projects', 'Interstellar', 'assets', 'Vehicles', 'Endurance'),
+            os.path.join(pipe_base_dir, 'projects', 'Lazarus', 'assets', 'Vehicles', 'Ranger'),
+        ]
+        message = f"\n{bcolors.FAIL}  ERROR: {'Test 5: Batch-Path Pipeline Context test failed'}\n"
+        for batch in (rows, columns):
+            paths = PC.get_paths(
+                'as_base_dir', batch, as_list=True,
+                drive=pipe_base_dir, project='Interstellar', asset_type='Vehicles'
+            )
+            self.assertEqual(paths, expected, message)
+        IO.block("Found Paths: %s" % paths)
+
+
+    def test_bound_paths(self):
+        IO.info("TEST ---| Bound Paths")
+
+        bound = PC.bind(drive=pipe_base_dir, project='Interstellar', asset_type='Vehicles')
+        message = f"\n{bcolors.FAIL}  ERROR: {'Test 6: Bound-Path Pipeline Context test failed'}\n"
+        for kwargs in ({'asset': 'Endurance'}, {'asset': 'Ranger', 'project': 'Lazarus'},
+                       {'asset': '../Ranger'}, {'asset': ''}):
+            expected = PC.get_path(
+                'as_thumb_file',
+                **dict({'drive': pipe_base_dir, 'project': 'Interstellar', 'asset_type': 'Vehicles'}, **kwargs)
+            )
+            self.assertEqual(bound.get_path('as_thumb_file', **kwargs), expected, message)
+        self.assertEqual(
+            bound.get_paths('as_base_dir', {'asset': ['Endurance', 'Ranger']}, as_list=True),
+            [os.path.join(pipe_base_dir, 'projects', 'Interstellar', 'assets', 'Vehicles', asset)
+             for asset in ('Endurance', 'Ranger')],
+            message
+        )
+        self.assertEqual(bound.formula('as_thumb_file').variables, ('asset',), message)
+        # A row overriding a bound variable resolves like get_path, in both row layouts
+        rows = [{'asset': 'Ranger', 'project': 'Lazarus'}, {'asset': 'Endurance'}]
+        expected = [bound.get_path('as_base_dir', **row) for row in rows]
+        self.assertEqual(expected[0], os.path.join(pipe_base_dir, 'projects', 'Lazarus', 'assets',
+                                                   'Vehicles', 'Ranger'), message)
+        self.assertEqual(bound.get_paths('as_base_dir', rows, as_list=True), expected, message)
+        self.assertEqual(bound.get_paths('as_base_dir', {'asset': ['Ranger'], 'project': ['Lazarus']},
+                                         as_list=True), expected[:1], message)
+        IO.block("Found Path: %s" % bound.get_path('as_thumb_file', asset='Endurance'))
+
+
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(PipeContextTest('test_single_path'))
     suite.addTest(PipeContextTest('test_child_path'))
     suite.addTest(PipeContextTest('test_multi_path'))
+    suite.addTest(PipeContextTest('test_deep_path'))
+    suite.addTest(PipeContextTest('test_batch_paths'))
+    suite.addTest(PipeContextTest('test_bound_paths'))
     return suite
 
 
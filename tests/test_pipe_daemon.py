@@ -0,0 +1,113 @@
+# ----------------------------------------------------------------------------#
+# ------------------------------------------------------------------ HEADER --#
+"""
+:author:
+    Jared Webber
+    
+:synopsis:
+    Test: Resolver Daemon
+
+:description:
+    This test suite runs the resolver daemon on a temporary Unix socket and
+    checks the client against in-process resolution, including the fallback
+    when no daemon is listening.
+
+"""
+
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- IMPORTS ----#
+import unittest, os, shutil, socket, tempfile, threading
+import path_lib
+import pipe_daemon
+from pipe_daemon import ResolverServer, ResolverClient, DaemonError
+from pipe_context import PipeContext as PC
+pipe_base_dir = os.path.join(os.path.sep, 'home', 'user', 'pipeline')
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- FUNCTIONS --#
+class ResolverDaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.temp_dir, 'resolver.sock')
+        self.server = ResolverServer(self.socket_path)
+        self.server.serve_in_thread()
+        self.client = ResolverClient(self.socket_path, fallback=False)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_requests(self):
+        kwargs = {'drive': pipe_base_dir, 'project': 'avengers', 'asset_type': 'props'}
+        self.assertTrue(self.client.connected)
+        self.assertEqual(self.client.get_path('as_tex_dir', asset='cube', **kwargs),
+                         PC.get_path('as_tex_dir', asset='cube', **kwargs))
+        rows = [{'asset': 'cube'}, {'asset': 'sphere'}]
+        self.assertEqual(self.client.get_paths('as_base_dir', rows, **kwargs),
+                         PC.get_paths('as_base_dir', rows, as_list=True, **kwargs))
+        path = PC.get_path('as_thumb_file', asset='cube', **kwargs)
+        self.assertEqual(self.client.examine_path(path, var='asset'), 'cube')
+
+    def test_errors(self):
+        with self.assertRaises(path_lib.FormulaError):
+            self.client.get_path('as_missing_dir', drive=pipe_base_dir)
+
+    def test_fallback(self):
+        client = ResolverClient(os.path.join(self.temp_dir, 'missing.sock'))
+        self.assertFalse(client.connected)
+        self.assertEqual(client.get_path('pr_base_dir', drive=pipe_base_dir, project='avengers'),
+                         os.path.join(pipe_base_dir, 'projects', 'avengers'))
+        with self.assertRaises(DaemonError):
+            ResolverClient(client.socket_path, fallback=False).get_path('pr_base_dir')
+
+    def test_args(self):
+        # Positional parent formulas reach the daemon as they would get_path
+        self.assertEqual(self.client.get_path('pr_base_dir', 'pipe_base_dir', drive=pipe_base_dir,
+                                              project='avengers'),
+                         PC.get_path('pr_base_dir', 'pipe_base_dir', drive=pipe_base_dir,
+                                     project='avengers'))
+
+    def test_socket_in_use(self):
+        with self.assertRaises(DaemonError):
+            ResolverServer(self.socket_path)
+        self.assertTrue(self.client.connected)
+
+        # A socket file nobody listens on is replaced
+        stale_path = os.path.join(self.temp_dir, 'stale.sock')
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(stale_path)
+        stale.close()
+        server = ResolverServer(stale_path)
+        server.server_close()
+
+    def test_no_resend(self):
+        # A daemon that reads requests and never answers
+        silent_path = os.path.join(self.temp_dir, 'silent.sock')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(silent_path)
+        listener.listen(4)
+        frames = []
+
+        def serve():
+            while True:
+                try:
+                    conn, _ = listener.accept()
+                except OSError:
+                    return
+                threading.Thread(target=lambda: frames.append(pipe_daemon.recv_frame(conn)),
+                                 daemon=True).start()
+
+        threading.Thread(target=serve, daemon=True).start()
+        client = ResolverClient(silent_path, timeout=0.2)
+        try:
+            with self.assertRaises(DaemonError):
+                client.get_path('pr_base_dir', drive=pipe_base_dir, project='avengers')
+        finally:
+            client.close()
+            listener.close()
+        self.assertEqual(len(frames), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# ----------------------------------------------------------------------------#
+# ------------------------------------------------------------------ HEADER --#
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Test: Content Fingerprints
+
+:description:
+    This test suite evaluates file and Merkle directory digests of asset
+    directories, digest reuse for unchanged files and tree diffs.
+
+"""
+
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- IMPORTS ----#
+import unittest, os, shutil, hashlib, tempfile
+import pipe_fingerprint
+from pipe_fingerprint import Fingerprinter, Fingerprint, TreeDiff
+from pipe_enums import PIPELINE
+from pipe_context import PipeContext as PC
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- FUNCTIONS --#
+class FingerprintTest(unittest.TestCase):
+    def setUp(self):
+        self.drive = tempfile.mkdtemp()
+        PC.create_paths(PIPELINE.LAYOUT.ASSET, [{'asset': 'cube'}, {'asset': 'sphere'}],
+                        drive=self.drive, project='avengers', asset_type='props')
+        self.write('as_geo_abc_dir', 'cube', 'cube.abc', b'abc' * 3000)
+        self.write('as_geo_abc_dir', 'sphere', 'sphere.abc', b'abc' * 3000)
+        self.write('as_tex_dir', 'cube', 'diffuse.png', b'png')
+        self.fingerprinter = Fingerprinter(drive=self.drive, process_threshold=4096)
+
+    def tearDown(self):
+        self.fingerprinter.close()
+        shutil.rmtree(self.drive)
+
+    def path(self, formula, asset):
+        return PC.get_path(formula, drive=self.drive, project='avengers', asset_type='props', asset=asset)
+
+    def write(self, formula, asset, name, data):
+        path = os.path.join(self.path(formula, asset), name)
+        previous = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+        with open(path, 'wb') as fh:
+            fh.write(data)
+        if previous is not None:
+            # Make sure a rewrite changes the mtime even on coarse mtime filesystems
+            os.utime(path, ns=(previous, previous + 1000000000))
+        return path
+
+    def test_file_digest(self):
+        data = os.urandom(pipe_fingerprint.MMAP_THRESHOLD * 3 + 7)
+        path = self.write('as_data_dir', 'cube', 'cube.dna', data)
+        expected = hashlib.blake2b(data, digest_size=pipe_fingerprint.DIGEST_SIZE).hexdigest()
+        self.assertEqual(pipe_fingerprint.file_digest(path, chunk_size=10000), expected)
+
+    def test_fingerprint_context(self):
+        prints = self.fingerprinter.fingerprint_context(project='avengers', asset_type='props', asset='cube')
+        self.assertEqual(sorted(prints), ['as_geo_dir', 'as_surf_dir', 'as_tex_dir'])
+        # The textures digest inside as_surf_dir is the as_tex_dir fingerprint
+        self.assertEqual(prints['as_surf_dir'].digests['textures'], prints['as_tex_dir'].digest)
+        self.assertEqual(prints['as_geo_dir'].digests['.abc/cube.abc'],
+                         pipe_fingerprint.file_digest(os.path.join(self.path('as_geo_abc_dir', 'cube'),
+                                                                   'cube.abc')))
+
+        again = self.fingerprinter.fingerprint(self.path('as_geo_dir', 'cube'))
+        self.assertEqual((again.hashed, again.reused), (0, 1))
+        self.assertEqual(again, prints['as_geo_dir'])
+        self.write('as_geo_abc_dir', 'cube', 'cube.abc', b'abd' * 3000)
+        changed = self.fingerprinter.fingerprint(self.path('as_geo_dir', 'cube'))
+        self.assertEqual(changed.hashed, 1)
+        self.assertNotEqual(changed.digest, again.digest)
+
+    def test_diff(self):
+        geo_dir = self.path('as_geo_dir', 'cube')
+        snapshot = os.path.join(self.drive, 'geo.json')
+        self.fingerprinter.fingerprint(geo_dir).save(snapshot)
+
+        self.write('as_geo_obj_dir', 'cube', 'cube.obj', b'obj')
+        self.write('as_geo_abc_dir', 'cube', 'cube.abc', b'abd' * 3000)
+        shutil.rmtree(self.path('as_geo_fbx_dir', 'cube'))
+        old = Fingerprint.load(snapshot)
+        new = self.fingerprinter.fingerprint(geo_dir)
+        self.assertEqual(old.diff(new), TreeDiff(['.obj/cube.obj'], ['.fbx'], ['.abc/cube.abc']))
+        self.assertEqual(new.diff(new), TreeDiff([], [], []))
+
+        # The same formula for two assets
+        sphere = self.fingerprinter.fingerprint(self.path('as_geo_dir', 'sphere'))
+        self.assertEqual(sphere.diff(new), TreeDiff(['.abc/cube.abc', '.obj/cube.obj'],
+                                                    ['.abc/sphere.abc', '.fbx'], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+# ----------------------------------------------------------------------------#
+# ------------------------------------------------------------------ HEADER --#
+"""
+:author:
+    Jared Webber
+    
+:synopsis:
+    Test: Filesystem Operations
+
+:description:
+    This test suite evaluates the bulk filesystem operations run on resolved paths,
+    the stat cache used for existence checks and the per-disk roots and queues.
+
+"""
+
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- IMPORTS ----#
+import unittest, os, shutil, asyncio, tempfile, threading
+from unittest import mock
+import pipe_fs
+import pipe_resolve
+from pipe_enums import PIPELINE
+from pipe_context import PipeContext as PC, PathContext
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- FUNCTIONS --#
+class MaterializeTest(unittest.TestCase):
+    def setUp(self):
+        self.drive = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.drive)
+
+    def test_plan_tree(self):
+        paths = [os.path.join(self.drive, 'a', 'b', 'c'), os.path.join(self.drive, 'a', 'b', 'd'),
+                 os.path.join(self.drive, 'a')]
+        anchor, levels = pipe_fs.plan_tree(paths)
+        self.assertEqual(anchor, self.drive)
+        self.assertEqual(levels, [[os.path.join(self.drive, 'a')],
+                                  [os.path.join(self.drive, 'a', 'b')],
+                                  sorted(paths[:2])])
+
+    def test_create_layout(self):
+        rows = [{'asset': 'cube'}, {'asset': 'sphere'}]
+        report = PC.create_paths(PIPELINE.LAYOUT.ASSET, rows, drive=self.drive,
+                                 project='avengers', asset_type='props')
+        self.assertTrue(report.ok)
+        self.assertEqual(len(report.created), 4 + 2 * len(PIPELINE.LAYOUT.ASSET))
+        self.assertTrue(os.path.isdir(PC.get_path('as_geo_abc_dir', drive=self.drive,
+                                                  project='avengers', asset_type='props',
+                                                  asset='sphere')))
+        report = PC.create_paths(PIPELINE.LAYOUT.ASSET, rows, drive=self.drive,
+                                 project='avengers', asset_type='props')
+        self.assertEqual((len(report.created), len(report.existing)),
+                         (0, 2 * len(PIPELINE.LAYOUT.ASSET)))
+
+    def test_failed_parent(self):
+        blocker = os.path.join(self.drive, 'blocker')
+        open(blocker, 'w').close()
+        other = os.path.join(self.drive, 'other')
+        report = pipe_fs.materialize([os.path.join(blocker, 'x', 'y'), other])
+        self.assertEqual(report.created, [other])
+        self.assertEqual(sorted(report.failed), [os.path.join(blocker, 'x'),
+                                                 os.path.join(blocker, 'x', 'y')])
+
+
+class StatCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.drive = tempfile.mkdtemp()
+        self.cache = pipe_fs.StatCache(ttl=60, negative_ttl=60)
+        self.now = 1000.0
+        patcher = mock.patch.object(pipe_fs.time, 'monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(pipe_fs.get_stat_cache().clear)
+
+    def tearDown(self):
+        shutil.rmtree(self.drive)
+
+    def test_ttl(self):
+        path = os.path.join(self.drive, 'cube.dna')
+        self.assertFalse(self.cache.exists(path))
+        open(path, 'w').close()
+        # Negative entries are served until they expire
+        self.assertFalse(self.cache.exists(path))
+        self.now += 61
+        self.assertTrue(self.cache.isfile(path))
+        os.remove(path)
+        self.assertTrue(self.cache.exists(path))
+        self.cache.invalidate(self.drive)
+        self.assertFalse(self.cache.exists(path))
+        self.assertTrue(self.cache.isdir(self.drive))
+
+    def test_exists_many(self):
+        names = ['a', 'b', 'c', 'd']
+        for name in names[:3]:
+            os.mkdir(os.path.join(self.drive, name))
+        paths = [os.path.join(self.drive, name) for name in names]
+        paths.append(os.path.join(self.drive, 'a', 'missing'))
+        with mock.patch.object(pipe_fs.os, 'scandir', wraps=os.scandir) as scandir, \
+                mock.patch.object(pipe_fs.os, 'stat', wraps=os.stat) as stat:
+            self.assertEqual(self.cache.exists_many(paths), [True, True, True, False, False])
+            self.assertEqual((scandir.call_count, stat.call_count), (1, 1))
+            self.assertEqual(self.cache.exists_many(paths + [self.drive]), [True] * 3 + [False] * 2 + [True])
+            self.assertEqual((scandir.call_count, stat.call_count), (1, 1))
+
+    def test_create_path(self):
+        cache = pipe_fs.get_stat_cache()
+        path = PC.get_path('as_geo_abc_dir', drive=self.drive, project='avengers',
+                           asset_type='props', asset='cube')
+        self.assertEqual(cache.exists_many([path, os.path.dirname(path)]), [False, False])
+        PathContext.create_path(path)
+        self.assertEqual(cache.exists_many([path, os.path.dirname(path)]), [True, True])
+        other = PC.get_path('as_geo_abc_dir', drive=self.drive, project='avengers',
+                            asset_type='props', asset='sphere')
+        self.assertFalse(pipe_fs.exists(other))
+        PC.create_paths(['as_geo_abc_dir'], [{'asset': 'sphere'}], drive=self.drive,
+                        project='avengers', asset_type='props')
+        self.assertTrue(pipe_fs.isdir(other))
+
+
+class DiskTest(unittest.TestCase):
+    def setUp(self):
+        self.drive = tempfile.mkdtemp()
+        self.config = os.path.join(self.drive, 'config')
+
+    def tearDown(self):
+        pipe_fs.configure_disk('config', root=None)
+        pipe_fs.configure_disk('render', max_workers=pipe_fs.MAX_WORKERS)
+        shutil.rmtree(self.drive)
+
+    def test_disk_roots(self):
+        data_dir = PC.get_path('pipe_data_dir', drive=self.drive)
+        config_dir = PC.get_path('pipe_config_dir', drive=self.drive)
+        self.assertEqual(config_dir, os.path.join(data_dir, '.config'))
+
+        pipe_fs.configure_disk('config', root=self.config)
+        config_dir = PC.get_path('pipe_config_dir', drive=self.drive)
+        self.assertEqual(config_dir, os.path.join(self.config, '.data', '.config'))
+        self.assertEqual(PC.get_path('pipe_data_dir', drive=self.drive), data_dir)
+        self.assertEqual(PC.bind(drive=self.drive).get_path('pipe_config_dir'), config_dir)
+        self.assertEqual(pipe_fs.path_disk(config_dir), 'config')
+        self.assertEqual(pipe_fs.path_disk(data_dir), 'work')
+
+        report = PC.create_paths(['pipe_config_dir', 'pipe_data_dir'], [{}], drive=self.drive)
+        self.assertTrue(report.ok)
+        self.assertEqual(pipe_fs.exists_many([config_dir, data_dir]), [True, True])
+
+    def test_disk_root_parity(self):
+        # Every resolution API points the drive of a config formula at the config root
+        pipe_fs.configure_disk('config', root=self.config)
+        expected = os.path.join(self.config, '.data', '.config')
+        self.assertEqual(PC.get_path('pipe_config_dir', drive=self.drive), expected)
+        self.assertEqual(PC.get_paths('pipe_config_dir', [{'drive': self.drive}], as_list=True),
+                         [expected])
+        self.assertEqual(PC.get_paths('pipe_config_dir', {'drive': [self.drive]}, as_list=True),
+                         [expected])
+        self.assertEqual(PC.bind(drive=self.drive).get_path('pipe_config_dir'), expected)
+        self.assertEqual(asyncio.run(PC.aget_path('pipe_config_dir', drive=self.drive)), expected)
+        records = pipe_resolve.resolve_stream([{'drive': self.drive}], formula='pipe_config_dir')
+        self.assertEqual([record['path'] for chunk in records for record in chunk], [expected])
+
+    def test_disk_roots_env(self):
+        # Read at import time, so a bad entry is skipped instead of raising
+        value = os.pathsep.join(['scratch=/mnt/scratch', 'config=' + self.config])
+        with mock.patch.dict(os.environ, {'PIPE_DISK_ROOTS': value}):
+            pipe_fs._load_disk_roots()
+        self.assertEqual(pipe_fs.get_disk_root('config'), self.config)
+
+    def test_separate_queues(self):
+        pipe_fs.configure_disk('render', max_workers=1)
+        release = threading.Event()
+        stalled = pipe_fs.get_disk_queue('render').submit(release.wait, 10)
+        try:
+            # Work traffic goes through while the render disk is stuck
+            paths = [os.path.join(self.drive, name) for name in ('a', 'b', 'c')]
+            report = pipe_fs.materialize(paths, disk='work')
+            self.assertEqual(sorted(report.created), paths)
+            self.assertEqual(pipe_fs.exists_many(paths, disk='work'), [True] * 3)
+            self.assertFalse(stalled.done())
+        finally:
+            release.set()
+        self.assertTrue(stalled.result())
+        with self.assertRaises(ValueError):
+            pipe_fs.get_disk_queue('scratch')
+
+
+if __name__ == '__main__':
+    unittest.main()
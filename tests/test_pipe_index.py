@@ -0,0 +1,105 @@
+# ----------------------------------------------------------------------------#
+# ------------------------------------------------------------------ HEADER --#
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Test: Asset Index
+
+:description:
+    This test suite evaluates the SQLite asset index: population from formula
+    scans and examined paths, queries, and incremental refreshes that only list
+    directories whose mtime changed.
+
+"""
+
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- IMPORTS ----#
+import unittest, os, shutil, tempfile
+from unittest import mock
+import pipe_scan
+from pipe_index import AssetIndex
+from pipe_context import PipeContext as PC
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- FUNCTIONS --#
+class AssetIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.drive = tempfile.mkdtemp()
+        rows = [{'project': project, 'asset_type': asset_type, 'asset': asset}
+                for project in ('avengers', 'xmen')
+                for asset_type in ('props', 'characters')
+                for asset in ('cube', 'sphere')]
+        PC.create_paths(['as_base_dir'], rows, drive=self.drive)
+        self.index = AssetIndex(drive=self.drive)
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.drive)
+
+    def refresh(self, formula, **bound):
+        with mock.patch.object(pipe_scan, 'scandir_lister', wraps=pipe_scan.scandir_lister) as lister:
+            count = self.index.refresh(formula, **bound)
+        return count, sorted(call.args[0] for call in lister.call_args_list)
+
+    def test_default_location(self):
+        self.assertEqual(self.index.index_file,
+                         os.path.join(PC.get_path('pipe_data_dir', drive=self.drive), 'asset_index.sqlite'))
+        self.assertTrue(os.path.isfile(self.index.index_file))
+
+    def test_journal_mode(self):
+        # The data dir may be network storage, WAL is opt-in
+        journal_mode = lambda index: index._db.execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(journal_mode(self.index), 'delete')
+        self.index.close()
+        self.index = AssetIndex(drive=self.drive, wal=True)
+        self.assertEqual(journal_mode(self.index), 'wal')
+        self.index.close()
+        self.index = AssetIndex(drive=self.drive)
+        self.assertEqual(journal_mode(self.index), 'delete')
+
+    def test_query(self):
+        self.assertEqual(self.refresh('as_base_dir')[0], 8)
+        self.assertEqual(self.index.values('project'), ['avengers', 'xmen'])
+        self.assertEqual(self.index.count('as_base_dir', project='xmen'), 4)
+        contexts = self.index.query('as_base_dir', project='avengers', asset_type='char*')
+        self.assertEqual([context['asset'] for context in contexts], ['cube', 'sphere'])
+        self.assertEqual(contexts[0]['path'], PC.get_path('as_base_dir', drive=self.drive, **{
+            key: contexts[0][key] for key in ('project', 'asset_type', 'asset')}))
+        self.assertIsNotNone(contexts[0]['mtime'])
+        # A class pattern selects the same contexts as a scan with it
+        bound = {'project': '[!x]*', 'asset_type': '[cp]*', 'asset': '[s]*'}
+        self.assertEqual([context['path'] for context in self.index.query('as_base_dir', **bound)],
+                         [context['path'] for context in PC.find('as_base_dir', drive=self.drive, **bound)])
+        self.assertEqual(self.index.count('as_base_dir', **bound), 2)
+
+    def test_incremental_refresh(self):
+        self.refresh('as_base_dir')
+        count, listed = self.refresh('as_base_dir')
+        self.assertEqual((count, listed), (8, []))
+
+        props = PC.get_path('pr_as_type_dir', drive=self.drive, project='xmen', asset_type='props')
+        os.mkdir(os.path.join(props, 'cone'))
+        shutil.rmtree(os.path.join(props, 'cube'))
+        count, listed = self.refresh('as_base_dir')
+        self.assertEqual((count, listed), (8, [props]))
+        self.assertEqual([context['asset'] for context in self.index.query(project='xmen', asset_type='props')],
+                         ['cone', 'sphere'])
+
+    def test_partial_refresh(self):
+        self.refresh('as_base_dir')
+        shutil.rmtree(PC.get_path('pr_base_dir', drive=self.drive, project='xmen'))
+        self.refresh('as_base_dir', project='avengers')
+        self.assertEqual(self.index.count('as_base_dir', project='xmen'), 4)
+        self.refresh('as_base_dir', project='xmen')
+        self.assertEqual(self.index.count('as_base_dir', project='xmen'), 0)
+
+    def test_add_paths(self):
+        path = PC.get_path('as_base_dir', drive=self.drive, project='avengers',
+                           asset_type='props', asset='cube')
+        self.assertEqual(self.index.add_paths([path, os.path.join(self.drive, 'misc')]), 1)
+        self.assertEqual(self.index.query(asset='cube')[0]['formula'], 'as_base_dir')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# ----------------------------------------------------------------------------#
+# ------------------------------------------------------------------ HEADER --#
+"""
+:author:
+    Jared Webber
+    
+:synopsis:
+    Test: Resolution Metrics
+
+:description:
+    This test suite evaluates the opt-in instrumentation of path resolution.
+
+"""
+
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- IMPORTS ----#
+import unittest
+import pipe_metrics
+import path_cache
+from pipe_context import PipeContext as PC
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- FUNCTIONS --#
+class PipeMetricsTest(unittest.TestCase):
+    def setUp(self):
+        pipe_metrics.reset()
+        path_cache.get_resolution_cache().clear()
+
+    def tearDown(self):
+        pipe_metrics.disable()
+        pipe_metrics.reset()
+
+    def test_disabled(self):
+        PC.get_path('pr_as_dir', drive='pipe', project='avengers')
+        self.assertEqual(pipe_metrics.snapshot()['latency'], {})
+
+    def test_get_path_metrics(self):
+        pipe_metrics.enable()
+        for _ in range(4):
+            PC.get_path('pr_as_dir', drive='pipe', project='avengers')
+        data = pipe_metrics.snapshot()
+        self.assertEqual(data['latency']['pipe_context_get_path']['pr_as_dir']['count'], 4)
+        self.assertEqual(data['counters']['cache_misses']['pr_as_dir'], 1)
+        self.assertEqual(data['cache_hit_rate']['pr_as_dir'], 0.75)
+        text = pipe_metrics.to_prometheus()
+        self.assertIn('asset_engine_cache_hits_total{formula="pr_as_dir"} 3', text)
+        self.assertIn('asset_engine_path_context_get_path_seconds_count{formula="pr_as_dir"} 4', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
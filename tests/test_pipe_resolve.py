@@ -0,0 +1,81 @@
+# ----------------------------------------------------------------------------#
+# ------------------------------------------------------------------ HEADER --#
+"""
+:author:
+    Jared Webber
+    
+:synopsis:
+    Test: Command-Line Resolver
+
+:description:
+    This test suite evaluates the streaming resolver behind `python -m pipe_resolve`.
+
+"""
+
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- IMPORTS ----#
+import unittest, os, io, shutil, contextlib, tempfile
+import pipe_resolve
+from pipe_context import PipeContext as PC
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- FUNCTIONS --#
+class PipeResolveTest(unittest.TestCase):
+    def setUp(self):
+        self.drive = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.drive)
+
+    def test_resolve_stream(self):
+        rows = [{'project': 'avengers', 'asset_type': 'props', 'asset': 'cube'},
+                {'formula': 'pr_base_dir', 'project': 'avengers'},
+                {'formula': 'as_base_dir', 'project': 'avengers'}]
+        records = [record for chunk in pipe_resolve.resolve_stream(
+                   rows, 'as_tex_dir', {'drive': self.drive}, exists=True, create='dir')
+                   for record in chunk]
+        self.assertEqual(records[0]['path'], PC.get_path('as_tex_dir', drive=self.drive, **rows[0]))
+        self.assertTrue(records[0]['created'])
+        self.assertTrue(os.path.isdir(records[0]['path']))
+        self.assertTrue(records[1]['exists'])
+        self.assertIsNone(records[2]['path'])
+        self.assertIn('asset_type', records[2]['error'])
+
+        # Directories that were already there are not reported as created
+        records = [record for chunk in pipe_resolve.resolve_stream(
+                   rows[:2], 'as_tex_dir', {'drive': self.drive}, exists=True, create='dir')
+                   for record in chunk]
+        self.assertEqual([record['created'] for record in records], [False, False])
+        self.assertEqual([record['exists'] for record in records], [True, True])
+
+    def test_json_values(self):
+        rows = [{'formula': 'pr_base_dir', 'project': 2024},
+                {'formula': 'pr_base_dir', 'project': None},
+                {'formula': 'pr_base_dir', 'project': ['avengers']},
+                {'formula': 5}]
+        records = [record for chunk in pipe_resolve.resolve_stream(rows, defaults={'drive': self.drive})
+                   for record in chunk]
+        self.assertEqual(records[0]['path'], os.path.join(self.drive, 'projects', '2024'))
+        self.assertIn('project', records[1]['error'])
+        self.assertIn('must be a string', records[2]['error'])
+        self.assertIn('Undefined formula', records[3]['error'])
+        self.assertEqual([record['path'] for record in records[1:]], [None] * 3)
+
+    def test_bad_set(self):
+        with contextlib.redirect_stderr(io.StringIO()) as err, self.assertRaises(SystemExit) as raised:
+            pipe_resolve.main(['--set', 'project'])
+        self.assertEqual(raised.exception.code, 2)
+        self.assertIn('VAR=VALUE', err.getvalue())
+
+    def test_csv_to_paths(self):
+        source = os.path.join(self.drive, 'rows.csv')
+        output = os.path.join(self.drive, 'paths.txt')
+        with open(source, 'w') as fh:
+            fh.write("formula,project\npr_base_dir,avengers\npr_as_dir,avengers\n")
+        pipe_resolve.main([source, '-o', output, '-f', 'paths', '--drive', self.drive])
+        with open(output) as fh:
+            self.assertEqual(fh.read().splitlines(),
+                             [os.path.join(self.drive, 'projects', 'avengers'),
+                              os.path.join(self.drive, 'projects', 'avengers', 'assets')])
+
+if __name__ == '__main__':
+    unittest.main()
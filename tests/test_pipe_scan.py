@@ -0,0 +1,86 @@
+# ----------------------------------------------------------------------------#
+# ------------------------------------------------------------------ HEADER --#
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Test: Formula Directory Scans
+
+:description:
+    This test suite evaluates how existing contexts are found on disk from a
+    formula and partially bound variables.
+
+"""
+
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- IMPORTS ----#
+import unittest, os, shutil, tempfile
+import pipe_scan
+from pipe_context import PipeContext as PC
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- FUNCTIONS --#
+class FindContextsTest(unittest.TestCase):
+    def setUp(self):
+        self.drive = tempfile.mkdtemp()
+        self.rows = [{'project': project, 'asset_type': asset_type, 'asset': asset}
+                     for project in ('avengers', 'xmen')
+                     for asset_type in ('props', 'characters')
+                     for asset in ('cube', 'sphere')]
+        PC.create_paths(['as_thumb_dir'], self.rows, drive=self.drive)
+        os.makedirs(os.path.join(self.drive, 'projects', '.snapshot'))
+        open(os.path.join(self.drive, 'projects', 'notes.txt'), 'w').close()
+        self.listed = []
+
+    def tearDown(self):
+        shutil.rmtree(self.drive)
+
+    def lister(self, path):
+        self.listed.append(path)
+        return pipe_scan.scandir_lister(path)
+
+    def find(self, formula, **kwargs):
+        return pipe_scan.find_contexts(formula, lister=self.lister, drive=self.drive, **kwargs)
+
+    def test_all_projects(self):
+        contexts = self.find('pr_base_dir')
+        self.assertEqual([context['project'] for context in contexts], ['avengers', 'xmen'])
+        self.assertEqual(contexts[0]['path'], os.path.join(self.drive, 'projects', 'avengers'))
+
+    def test_bound_prefix(self):
+        contexts = self.find('as_base_dir', project='avengers', asset_type='props')
+        self.assertEqual([context['asset'] for context in contexts], ['cube', 'sphere'])
+        # Only the directory holding the unbound asset level is listed
+        self.assertEqual(self.listed, [PC.get_path('pr_as_type_dir', drive=self.drive,
+                                                   project='avengers', asset_type='props')])
+
+    def test_glob(self):
+        contexts = self.find('as_base_dir', project='*', asset_type='char*', asset='s?here')
+        self.assertEqual([(context['project'], context['asset_type'], context['asset'])
+                          for context in contexts],
+                         [('avengers', 'characters', 'sphere'), ('xmen', 'characters', 'sphere')])
+        # Character classes, plain and negated
+        contexts = self.find('as_base_dir', project='[!x]*', asset_type='[cp]*', asset='[s]*')
+        self.assertEqual([(context['asset_type'], context['asset']) for context in contexts],
+                         [('characters', 'sphere'), ('props', 'sphere')])
+        self.assertEqual([context['project'] for context in self.find('pr_base_dir', project='[ab-z]*')],
+                         ['avengers', 'xmen'])
+
+    def test_trailing_literals(self):
+        contexts = self.find('as_thumb_dir', project='xmen')
+        self.assertEqual(len(contexts), 4)
+        shutil.rmtree(contexts[0]['path'])
+        self.assertEqual(len(self.find('as_thumb_dir', project='xmen')), 3)
+        self.assertEqual(self.find('as_thumb_dir', project='xmen', asset_type='props', asset='cone'), [])
+
+    def test_files(self):
+        row = self.rows[0]
+        thumb = PC.get_path('as_thumb_file', drive=self.drive, **row)
+        open(thumb, 'w').close()
+        open(os.path.join(os.path.dirname(thumb), 'sphere.jpg'), 'w').close()
+        contexts = PC.find('as_thumb_file', drive=self.drive)
+        self.assertEqual([context['path'] for context in contexts], [thumb])
+
+
+if __name__ == '__main__':
+    unittest.main()
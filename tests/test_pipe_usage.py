@@ -0,0 +1,107 @@
+# ----------------------------------------------------------------------------#
+# ------------------------------------------------------------------ HEADER --#
+"""
+:author:
+    Jared Webber
+
+:synopsis:
+    Test: Disk Usage
+
+:description:
+    This test suite evaluates disk usage accounting per context and subdirectory
+    formula, and reruns that only list directories whose mtime changed.
+
+"""
+
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- IMPORTS ----#
+import unittest, os, io, shutil, contextlib, tempfile
+import pipe_usage
+from pipe_usage import DiskUsage
+from pipe_enums import PIPELINE
+from pipe_context import PipeContext as PC
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- FUNCTIONS --#
+class DiskUsageTest(unittest.TestCase):
+    def setUp(self):
+        self.drive = tempfile.mkdtemp()
+        for project in ('avengers', 'xmen'):
+            PC.create_paths(PIPELINE.LAYOUT.ASSET, [{'asset': 'cube'}, {'asset': 'sphere'}],
+                            drive=self.drive, project=project, asset_type='props')
+        self.write('as_geo_abc_dir', 'cube', 'cube.abc', 3000)
+        self.write('as_tex_dir', 'cube', 'diffuse.png', 500)
+        self.write('as_data_dir', 'sphere', 'sphere.dna', 20)
+        self.usage = DiskUsage(drive=self.drive)
+
+    def tearDown(self):
+        self.usage.close()
+        shutil.rmtree(self.drive)
+
+    def path(self, formula, asset, project='avengers'):
+        return PC.get_path(formula, drive=self.drive, project=project, asset_type='props', asset=asset)
+
+    def write(self, formula, asset, name, size):
+        directory = self.path(formula, asset)
+        with open(os.path.join(directory, name), 'wb') as fh:
+            fh.write(b'\0' * size)
+        self.touch(directory)
+
+    def touch(self, directory):
+        # Make sure the directory mtime changes even on coarse mtime filesystems
+        st = os.stat(directory)
+        os.utime(directory, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+
+    def test_child_formulas(self):
+        self.assertEqual(sorted(pipe_usage.child_formulas('as_base_dir')),
+                         ['as_ass_dir', 'as_data_dir', 'as_dyn_dir', 'as_geo_dir', 'as_surf_dir'])
+
+    def test_scan(self):
+        report = self.usage.scan('as_base_dir', project='avengers')
+        self.assertEqual([row['asset'] for row in report], ['cube', 'sphere'])
+        cube, sphere = report.rows
+        self.assertEqual((cube['bytes'], cube['files'], sphere['bytes']), (3500, 2, 20))
+        self.assertEqual(cube['subdirs']['as_geo_dir'], {'bytes': 3000, 'files': 1, 'dirs': 3})
+        self.assertEqual(cube['subdirs']['as_surf_dir']['bytes'], 500)
+        self.assertEqual(sphere['subdirs']['as_data_dir']['files'], 1)
+
+        report = self.usage.scan('as_base_dir', asset_type='props')
+        self.assertEqual(report.totals('project'), {('avengers',): {'bytes': 3520, 'files': 3},
+                                                    ('xmen',): {'bytes': 0, 'files': 0}})
+        text = report.format('project')
+        self.assertIn('3 KB', text.splitlines()[0])
+        self.assertIn('as_geo_dir', report.format())
+
+    def test_incremental(self):
+        first = self.usage.scan('as_base_dir', project='avengers')
+        self.assertEqual(first.rescanned, first.visited)
+        second = self.usage.scan('as_base_dir', project='avengers')
+        self.assertEqual((second.rescanned, second.bytes), (0, first.bytes))
+
+        self.write('as_geo_obj_dir', 'sphere', 'sphere.obj', 100)
+        shutil.rmtree(self.path('as_tex_dir', 'cube'))
+        self.touch(self.path('as_surf_dir', 'cube'))
+        third = self.usage.scan('as_base_dir', project='avengers')
+        self.assertEqual(third.rescanned, 2)
+        self.assertEqual([row['bytes'] for row in third], [3000, 120])
+        self.assertEqual(third.visited, first.visited - 1)
+
+    def test_full(self):
+        first = self.usage.scan('as_base_dir', project='avengers')
+        # Rewriting a file in place leaves its directory's mtime alone
+        directory = self.path('as_tex_dir', 'cube')
+        st = os.stat(directory)
+        with open(os.path.join(directory, 'diffuse.png'), 'wb') as fh:
+            fh.write(b'\0' * 800)
+        os.utime(directory, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertEqual(self.usage.scan('as_base_dir', project='avengers').bytes, first.bytes)
+        full = self.usage.scan('as_base_dir', project='avengers', full=True)
+        self.assertEqual((full.rescanned, full.bytes), (full.visited, first.bytes + 300))
+
+    def test_bad_set(self):
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit) as raised:
+            pipe_usage.main(['as_base_dir', '--set', 'project'])
+        self.assertEqual(raised.exception.code, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# ----------------------------------------------------------------------------#
+# ------------------------------------------------------------------ HEADER --#
+"""
+:author:
+    Jared Webber
+    
+:synopsis:
+    Test: Pipeline Utilities
+
+:description:
+    This test suite evaluates the leveled output of the IO class.
+
+"""
+
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- IMPORTS ----#
+import unittest, io, json, contextlib, logging
+from pipe_utils import IO
+# ----------------------------------------------------------------------------#
+# --------------------------------------------------------------- FUNCTIONS --#
+class Explosive(object):
+    def __str__(self):
+        raise AssertionError("Disabled messages must not be formatted")
+
+
+class IOTest(unittest.TestCase):
+    def setUp(self):
+        self.level = IO.logger.level
+
+    def tearDown(self):
+        IO.configure(level=self.level, fmt='text')
+
+    def test_disabled_level(self):
+        IO.configure(level='INFO')
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            IO.debug("Keyword Arguments : %s", Explosive())
+        self.assertEqual(out.getvalue(), '')
+        self.assertFalse(IO.enabled(IO.DEBUG))
+
+    def test_json_format(self):
+        IO.configure(level='DEBUG', fmt='json')
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            IO.debug("Formula : %s", 'pr_base_dir')
+        entry = json.loads(out.getvalue())
+        self.assertEqual((entry['level'], entry['message']), ('DEBUG', 'Formula : pr_base_dir'))
+
+    def test_unknown_level(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            IO.configure(level='LOUD')
+        self.assertEqual(IO.logger.level, logging.INFO)
+        self.assertIn("Unknown log level 'LOUD'", out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()